@@ -0,0 +1,102 @@
+#################################################################
+# Description: Project - Batch plot rendering
+# Usage: This module render many box plots and line plots into
+#        image files without a display, spreading the jobs over
+#        a process pool.
+#        python batch_render.py <start year> <end year> <directory>
+#################################################################
+"""This module render many box plots and line plots into image files
+   without a display, spreading the jobs over a process pool."""
+import os
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from db_operations import open_database
+from plot_cache import IMAGE_ATTEMPTS, process_cache
+from plot_operations import PlotOperations
+from stations import DEFAULT_STATION_ID
+
+
+def render_job(db_name, job, cache_dir=None):
+    """
+    Render one job in a worker process. A job is a dictionary with
+    "type" "box" and "start_year"/"end_year", or "type" "line" and
+    "year"/"month", plus "path" and optionally "station_id". With a
+    cache_dir, the image is taken from the plot cache when it is there,
+    and rendered again if another process evicts it before it is copied.
+    Returns:
+        True if the image was written.
+    """
+    weather_db = open_database(db_name)
+    station_id = job.get("station_id", DEFAULT_STATION_ID)
+    if job["type"] not in ("box", "line"):
+        print(f"Unknown plot type {job['type']} for {job['path']}.")
+        return False
+    if cache_dir is not None:
+        plot_cache = process_cache(cache_dir)
+        image_format = os.path.splitext(job["path"])[1][1:]
+        for _ in range(IMAGE_ATTEMPTS):
+            if job["type"] == "box":
+                image_path = plot_cache.boxplot(weather_db, job["start_year"], job["end_year"],
+                                                station_id, image_format)
+            else:
+                image_path = plot_cache.lineplot(weather_db, job["year"], job["month"],
+                                                 station_id, image_format)
+            if image_path is None:
+                return False
+            try:
+                shutil.copyfile(image_path, job["path"])
+                return True
+            except FileNotFoundError:
+                pass
+        print(f"Error copying the plot for {job['path']}: evicted from the cache.")
+        return False
+    if job["type"] == "box":
+        monthly_stats = weather_db.fetch_monthly_stats(job["start_year"], job["end_year"],
+                                                       station_id)
+        return PlotOperations(monthly_stats).render_boxplot(job["path"], job["start_year"],
+                                                            job["end_year"])
+    year_month = f"{int(job['year']):04d}-{int(job['month']):02d}"
+    frame = weather_db.fetch_frame(f"{year_month}-01", f"{year_month}-31", station_id)
+    return PlotOperations(frame).render_lineplot(job["path"], job["year"], job["month"])
+
+
+def render_batch(db_name, jobs, processes=None, cache_dir=None):
+    """
+    Render a list of jobs across a process pool.
+    Args:
+        db_name: The database to read.
+        jobs: The jobs, see render_job.
+        processes: Number of worker processes, the CPU count if None.
+        cache_dir: Directory of the plot cache, no cache if None.
+    Returns:
+        A list of True/False, one per job in order.
+    """
+    jobs = list(jobs)
+    if not jobs:
+        return []
+    workers = processes or os.cpu_count() or 1
+    chunksize = max(1, len(jobs) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(partial(render_job, db_name, cache_dir=cache_dir), jobs,
+                                 chunksize=chunksize))
+
+
+def month_jobs(start_year, end_year, directory, image_format="png",
+               station_id=DEFAULT_STATION_ID):
+    """
+    Build a line plot job for every month from start_year to end_year.
+    """
+    return [{"type": "line", "year": year, "month": month, "station_id": station_id,
+             "path": os.path.join(directory, f"{station_id}_{year:04d}-{month:02d}.{image_format}")}
+            for year in range(int(start_year), int(end_year) + 1) for month in range(1, 13)]
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 4:
+        print("Usage: python batch_render.py <start year> <end year> <directory>")
+        sys.exit(1)
+    os.makedirs(sys.argv[3], exist_ok=True)
+    results = render_batch("weather_data", month_jobs(sys.argv[1], sys.argv[2], sys.argv[3]))
+    print(f"{sum(results)} of {len(results)} plots rendered into {sys.argv[3]}.")
@@ -0,0 +1,34 @@
+#################################################################
+# Description: Benchmarks - Batch plot rendering
+# Usage: python benchmarks/bench_batch_render.py [plot count]
+#        Time rendering line plots with 1 worker process and with
+#        one worker process per core.
+#################################################################
+"""Time rendering line plots with 1 worker process and with one worker
+   process per core."""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+from batch_render import month_jobs, render_batch
+from db_operations import DBOperations
+from synthetic import daily_weather
+
+if __name__ == '__main__':
+    plot_count = int(sys.argv[1]) if len(sys.argv) > 1 else 240
+    with tempfile.TemporaryDirectory() as work_dir:
+        db_name = os.path.join(work_dir, "weather.db")
+        DBOperations(db_name).save_data(daily_weather(27174, 1900, 124))
+        jobs = month_jobs(1900, 2023, work_dir)[:plot_count]
+        base_time = None
+        for processes in sorted({1, 2, os.cpu_count() or 1}):
+            start = time.perf_counter()
+            results = render_batch(db_name, jobs, processes)
+            elapsed = time.perf_counter() - start
+            base_time = base_time or elapsed
+            print(f"{processes:2d} processes: {sum(results)} plots in {elapsed:.2f}s, "
+                  f"{len(jobs) / elapsed:.1f} plots/s, speedup {base_time / elapsed:.1f}x")
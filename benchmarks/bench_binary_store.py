@@ -0,0 +1,85 @@
+#################################################################
+# Description: Benchmarks - Binary day files against SQLite
+# Usage: python benchmarks/bench_binary_store.py [--years 100]
+#        Save Y years of synthetic days of one station into the
+#        SQLite backend and the binary backend, then time the full
+#        history and single month reads of both, as frames and as
+#        dictionaries, and check they return the same data.
+#################################################################
+"""Save a station into the SQLite and binary backends and time the full
+   history and single month reads of both."""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+from db_operations import open_database
+from run_benchmarks import measure
+from synthetic import FIRST_STATION_ID, daily_weather
+
+
+def save_years(weather_db, weather):
+    """Save the days a year at a time, newest first as a scrape does."""
+    years = sorted({sample_date[:4] for sample_date in weather}, reverse=True)
+    start = time.perf_counter()
+    for year in years:
+        weather_db.save_data({sample_date: daily_temps for sample_date, daily_temps
+                              in weather.items() if sample_date.startswith(year)},
+                             FIRST_STATION_ID)
+    return time.perf_counter() - start
+
+
+def month_range(year_month):
+    """The first and last date of a (year, month) pair, as range ends are given."""
+    year, month = year_month
+    return f"{year:04d}-{month:02d}-01", f"{year:04d}-{month:02d}-31"
+
+
+def main():
+    """Build both backends and compare their reads."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--years", type=int, default=100)
+    parser.add_argument("--first-year", type=int, default=1925)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    weather = daily_weather(FIRST_STATION_ID, args.first_year, args.years)
+    rng = random.Random(0)
+    months = [(rng.randint(args.first_year, args.first_year + args.years - 1),
+               rng.randint(1, 12)) for _ in range(args.repeat)]
+    with tempfile.TemporaryDirectory() as work_dir:
+        results, stored = {}, {}
+        for backend in ("sqlite", "binary"):
+            weather_db = open_database(os.path.join(work_dir, f"{backend}.db"), backend)
+            weather_db.add_station(FIRST_STATION_ID, "Synthetic")
+            elapsed = save_years(weather_db, weather)
+            print(f"{backend:6s} save {len(weather)} days a year at a time: {elapsed:.2f}s")
+            month_index = iter(range(10 ** 9))
+            reads = {
+                "full history frame": lambda db=weather_db: db.fetch_frame(
+                    station_id=FIRST_STATION_ID),
+                "full history dict": lambda db=weather_db: db.fetch_data(FIRST_STATION_ID),
+                "single month frame": lambda db=weather_db: db.fetch_frame(
+                    *month_range(months[next(month_index) % len(months)]), FIRST_STATION_ID),
+                "single month dict": lambda db=weather_db: db.fetch_month(
+                    *months[next(month_index) % len(months)], FIRST_STATION_ID),
+            }
+            for label, read in reads.items():
+                timing = measure(read, args.repeat)
+                results.setdefault(label, {})[backend] = timing["seconds"]
+            stored[backend] = weather_db.fetch_data(FIRST_STATION_ID)
+
+        print("same data" if stored["sqlite"] == stored["binary"] else "DIFFERENT data")
+        for label, seconds in results.items():
+            print(f"{label:18s}: sqlite {seconds['sqlite'] * 1000:9.3f} ms, "
+                  f"binary {seconds['binary'] * 1000:9.3f} ms, "
+                  f"{seconds['sqlite'] / seconds['binary']:7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
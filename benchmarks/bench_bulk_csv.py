@@ -0,0 +1,138 @@
+#################################################################
+# Description: Benchmarks - Bulk CSV backfill
+# Usage: python benchmarks/bench_bulk_csv.py [--first-year 1975]
+#        Check the bulk CSV parser against the saved CSV and HTML
+#        fixtures, then backfill a station from the local stub
+#        server into a new database with the monthly HTML pages and
+#        with the bulk CSV years, and compare the time and the data.
+#        The fetch and parse are also timed without the database
+#        writes, which both engines share. The stub responses are
+#        generated and compressed before the timing.
+#################################################################
+"""Check the bulk CSV parser against the fixtures, then time a multi
+   decade backfill with the monthly HTML pages and the bulk CSV years."""
+import argparse
+import glob
+import io
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+# pylint: disable=wrong-import-position
+import synthetic
+from csv_scraper import BulkCsvScraper, parse_bulk_csv, response_lines
+from db_operations import open_database
+from scrape_weather import StreamingWeatherScraper
+from station_scraper import stream_station
+from stub_server import NO_DATA_PAGE, StubClimateServer, encoded_page
+
+
+def check_fixtures(fixtures_dir):
+    """
+    Parse every bulk CSV fixture whole and in small chunks, and compare
+    its month of the HTML fixture of the same year with the HTML parse.
+    Returns:
+        True if every fixture matches.
+    """
+    all_same = True
+    for path in sorted(glob.glob(os.path.join(fixtures_dir, "bulk_*.csv"))):
+        with open(path, "rb") as fixture:
+            body = fixture.read()
+        whole = parse_bulk_csv(io.StringIO(body.decode("utf-8-sig"), newline=""))
+        # Tiny chunks split lines, the byte order mark and the degree signs.
+        chunked = parse_bulk_csv(response_lines(io.BytesIO(body), chunk_size=7))
+        same = whole is not None and whole == chunked
+        year = os.path.basename(path)[len("bulk_"):-len(".csv")]
+        for page_path in glob.glob(os.path.join(fixtures_dir, f"daily_{year}_*.html")):
+            month = page_path[-len("MM.html"):-len(".html")]
+            page_parser = StreamingWeatherScraper()
+            with open(page_path, encoding="utf-8") as page:
+                page_parser.feed(page.read())
+            same = same and page_parser.weather == {
+                sample_date: daily_temps for sample_date, daily_temps in whole.items()
+                if sample_date[5:7] == month}
+        print(f"{os.path.basename(path)}: {len(whole or ())} days, "
+              f"{'same as the HTML fixture' if same else 'DIFFERENT'}")
+        all_same = all_same and same
+    return all_same
+
+
+def generate_responses(first_year):
+    """
+    Generate and compress every page and CSV of the stub server up front,
+    they are cached, so the backfills measure the scraper and not the
+    generator.
+    """
+    today = date.today()
+    encoded_page(NO_DATA_PAGE, True)
+    for year in range(first_year - 1, today.year + 1):
+        encoded_page(synthetic.daily_csv(year, 0, synthetic.FIRST_STATION_ID,
+                                         year < first_year), True)
+        for month in range(1, 13):
+            encoded_page(synthetic.daily_page(year, month, 0, synthetic.FIRST_STATION_ID), True)
+
+
+def backfill(scraper_class, db_path, first_year, workers):
+    """Backfill the stub station into a new database, return the time, requests and data."""
+    weather_db = open_database(db_path)
+    weather_db.add_station(synthetic.FIRST_STATION_ID, "Synthetic")
+    with StubClimateServer(first_year=first_year) as server:
+        scraper = scraper_class(synthetic.FIRST_STATION_ID)
+        scraper.base_url = server.base_url
+        start = time.perf_counter()
+        stream_station(weather_db, scraper, max_workers=workers)
+        elapsed = time.perf_counter() - start
+        scraper.session.close()
+        return elapsed, server.requests, weather_db.fetch_data(synthetic.FIRST_STATION_ID)
+
+
+def ingest(scraper_class, first_year, workers):
+    """Fetch and parse the stub station without saving it, return the time and day count."""
+    with StubClimateServer(first_year=first_year) as server:
+        scraper = scraper_class(synthetic.FIRST_STATION_ID)
+        scraper.base_url = server.base_url
+        start = time.perf_counter()
+        days = sum(len(month_weather) for _, _, month_weather in scraper.scrape_weather_batches(
+            max_workers=workers, per_host_limit=workers))
+        elapsed = time.perf_counter() - start
+        scraper.session.close()
+        return elapsed, days
+
+
+def main():
+    """Check the fixtures and compare the backfills."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--first-year", type=int, default=1975)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--fixtures", default=os.path.join(BENCHMARK_DIR, "fixtures"))
+    args = parser.parse_args()
+
+    check_fixtures(args.fixtures)
+    generate_responses(args.first_year)
+    ingest_times = {}
+    for label, scraper_class in (("html", StreamingWeatherScraper), ("csv", BulkCsvScraper)):
+        ingest_times[label], days = ingest(scraper_class, args.first_year, args.workers)
+        print(f"{label:4s} fetch and parse from {args.first_year}: "
+              f"{ingest_times[label]:6.2f}s, {days} days")
+    print(f"speedup {ingest_times['html'] / ingest_times['csv']:.1f}x")
+    with tempfile.TemporaryDirectory() as work_dir:
+        results = {}
+        for label, scraper_class in (("html", StreamingWeatherScraper),
+                                     ("csv", BulkCsvScraper)):
+            elapsed, requests, stored = backfill(scraper_class,
+                                                 os.path.join(work_dir, f"{label}.db"),
+                                                 args.first_year, args.workers)
+            results[label] = (elapsed, stored)
+            print(f"{label:4s} backfill from {args.first_year}: {elapsed:6.2f}s, "
+                  f"{requests} requests, {len(stored)} days")
+        print(f"speedup {results['html'][0] / results['csv'][0]:.1f}x, "
+              f"{'same data' if results['html'][1] == results['csv'][1] else 'DIFFERENT data'}")
+
+
+if __name__ == '__main__':
+    main()
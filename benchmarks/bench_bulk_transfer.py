@@ -0,0 +1,116 @@
+#################################################################
+# Description: Benchmarks - Bulk export and import
+# Usage: python benchmarks/bench_bulk_transfer.py [--stations N]
+#                                                 [--years Y]
+#        Round-trip N stations over Y years of synthetic days through
+#        the CSV and columnar formats. Each step runs in a fresh
+#        process, so its peak memory is reported on its own. The
+#        peak includes the database pages SQLite maps into memory.
+#################################################################
+"""Round-trip synthetic stations through the CSV and columnar formats,
+   timing each step and reporting its peak memory."""
+import argparse
+import multiprocessing
+import os
+import resource
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+import bulk_transfer
+from db_operations import DBOperations
+from synthetic import station_ids, daily_weather
+
+
+def build_database(db_name, stations, first_year, years):
+    """Save the synthetic stations one at a time."""
+    weather_db = DBOperations(db_name)
+    for station_id in station_ids(stations):
+        weather_db.add_station(station_id, f"Station {station_id}")
+        weather_db.save_data(daily_weather(station_id, first_year, years), station_id)
+    return 0
+
+
+def export_step(db_name, path, file_format):
+    """Export the whole database into one file."""
+    export_function = bulk_transfer.export_columnar if file_format == "columnar" \
+        else bulk_transfer.export_csv
+    return export_function(DBOperations(db_name), path)
+
+
+def import_step(db_name, path):
+    """Import one file into a new database, return the rows saved."""
+    row_count, _ = bulk_transfer.import_file(DBOperations(db_name), path)
+    return row_count
+
+
+def in_fresh_process(function, *args):
+    """
+    Run a function in a new spawned process.
+    Returns:
+        Its result, the elapsed seconds and the peak memory of the process in MB.
+    """
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        # Start the process before the clock.
+        executor.submit(int).result()
+        start = time.perf_counter()
+        result = executor.submit(function, *args).result()
+        elapsed = time.perf_counter() - start
+        peak_mb = executor.submit(peak_memory).result()
+    return result, elapsed, peak_mb
+
+
+def peak_memory():
+    """Peak resident memory of this process in MB."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def same_rows(db_name, other_db_name):
+    """Check two databases hold the same days and the same monthly aggregates."""
+    with sqlite3.connect(db_name) as db_conn:
+        db_conn.execute("ATTACH DATABASE ? AS other", (other_db_name,))
+        for table, columns in (("weather_data", "station_id, sample_date, location, "
+                                                "min_temp, max_temp, avg_temp"),
+                               ("monthly_stats", "*")):
+            for first, second in (("main", "other"), ("other", "main")):
+                difference = db_conn.execute(
+                    f"SELECT count(*) FROM (SELECT {columns} FROM {first}.{table} "
+                    f"EXCEPT SELECT {columns} FROM {second}.{table})").fetchone()[0]
+                if difference:
+                    return False
+    return True
+
+
+def main():
+    """Build the database, then export and import it in both formats."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--stations", type=int, default=10)
+    parser.add_argument("--years", type=int, default=100)
+    parser.add_argument("--first-year", type=int, default=1925)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        db_name = os.path.join(work_dir, "source.db")
+        _, elapsed, peak_mb = in_fresh_process(build_database, db_name, args.stations,
+                                               args.first_year, args.years)
+        print(f"build with save_data: {elapsed:.2f}s, peak {peak_mb:.0f} MB")
+        for file_format in ("csv", "columnar"):
+            path = os.path.join(work_dir, f"weather.{file_format}")
+            rows, elapsed, peak_mb = in_fresh_process(export_step, db_name, path, file_format)
+            print(f"export {file_format:8s}: {rows} rows in {elapsed:.2f}s "
+                  f"({rows / elapsed:,.0f} rows/s), {os.path.getsize(path) / 2 ** 20:.1f} MB "
+                  f"file, peak {peak_mb:.0f} MB")
+            imported_db_name = os.path.join(work_dir, f"imported_{file_format}.db")
+            rows, elapsed, peak_mb = in_fresh_process(import_step, imported_db_name, path)
+            print(f"import {file_format:8s}: {rows} rows in {elapsed:.2f}s "
+                  f"({rows / elapsed:,.0f} rows/s), peak {peak_mb:.0f} MB, "
+                  f"{'result same' if same_rows(db_name, imported_db_name) else 'DIFFERENT'}")
+
+
+if __name__ == '__main__':
+    main()
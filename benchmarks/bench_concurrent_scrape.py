@@ -0,0 +1,43 @@
+#################################################################
+# Description: Benchmarks - Concurrent scraping
+# Usage: python benchmarks/bench_concurrent_scrape.py
+#        Time a full backfill against the local stub server with
+#        the sequential and the concurrent scrape modes.
+#################################################################
+"""Time a full backfill against the local stub server with the
+   sequential and the concurrent scrape modes."""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scrape_weather import WeatherScraper  # pylint: disable=wrong-import-position
+from stub_server import StubClimateServer  # pylint: disable=wrong-import-position
+
+LATENCY = 0.1
+FIRST_YEAR = 2010
+
+
+def timed_scrape(base_url, workers=None):
+    """Run one backfill and return the elapsed seconds and the data."""
+    scraper = WeatherScraper()
+    scraper.base_url = base_url
+    start = time.perf_counter()
+    if workers is None:
+        weather = scraper.scrape_weather()
+    else:
+        weather = scraper.scrape_weather_concurrent(max_workers=workers,
+                                                    per_host_limit=workers)
+    return time.perf_counter() - start, weather
+
+
+if __name__ == '__main__':
+    with StubClimateServer(first_year=FIRST_YEAR, latency=LATENCY) as server:
+        base_time, expected = timed_scrape(server.base_url)
+        print(f"sequential: {base_time:.2f}s, {len(expected)} days")
+        for worker_count in (1, 2, 4, 8, 16):
+            elapsed, weather = timed_scrape(server.base_url, worker_count)
+            same = "same" if list(weather.items()) == list(expected.items()) else "DIFFERENT"
+            print(f"{worker_count:2d} workers: {elapsed:.2f}s "
+                  f"speedup {base_time / elapsed:.1f}x, result {same}")
@@ -0,0 +1,56 @@
+#################################################################
+# Description: Benchmarks - Pooled database connections
+# Usage: python benchmarks/bench_db_pool.py
+#        Compare a new connection per call against the pooled WAL
+#        connections for DBOperations.save_data and fetch_data.
+#################################################################
+"""Compare a new connection per call against the pooled WAL connections
+   for DBOperations.save_data and fetch_data."""
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+from db_operations import DBOperations
+
+CALLS = 300
+
+
+def month_of_weather(index):
+    """Build the weather dictionary of one 30 day batch."""
+    first_day = date(1950, 1, 1) + timedelta(days=30 * index)
+    return {(first_day + timedelta(days=day)).isoformat():
+            {"Max": 10.0 + day, "Min": -5.0 + day, "Mean": 2.5 + day}
+            for day in range(30)}
+
+
+def run(db_name, pooled):
+    """Time CALLS saves of one batch and CALLS fetches of a station."""
+    weather_db = DBOperations(db_name, pooled)
+    batches = [month_of_weather(index) for index in range(CALLS)]
+    start = time.perf_counter()
+    for weather in batches:
+        weather_db.save_data(weather)
+    save_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(CALLS):
+        weather_db.get_lastest_date()
+    latest_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(20):
+        weather_db.fetch_data()
+    fetch_time = time.perf_counter() - start
+    return save_time / CALLS, latest_time / CALLS, fetch_time / 20
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as work_dir:
+        for label, pooled in (("per-call connect", False), ("pooled WAL", True)):
+            save, latest, fetch = run(os.path.join(work_dir, f"{pooled}.db"), pooled)
+            print(f"{label:17s} save_data {save * 1000:.3f} ms, "
+                  f"get_lastest_date {latest * 1000:.3f} ms, "
+                  f"fetch_data ({CALLS * 30} rows) {fetch * 1000:.3f} ms")
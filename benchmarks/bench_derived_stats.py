@@ -0,0 +1,118 @@
+#################################################################
+# Description: Benchmarks - Derived statistics
+# Usage: python benchmarks/bench_derived_stats.py [--years 100]
+#        Compute every derived statistic of Y years of synthetic
+#        days, check them against plain Python loops over the daily
+#        dictionary and compare the times.
+#################################################################
+"""Compute every derived statistic of a century of synthetic days and
+   check them against plain Python loops over the daily dictionary."""
+import argparse
+import calendar
+import os
+import sys
+from datetime import date, timedelta
+
+import numpy as np
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+# pylint: disable=wrong-import-position
+import derived_stats
+from derived_stats import DerivedStats
+from run_benchmarks import measure
+from synthetic import FIRST_STATION_ID, daily_weather
+from weather_frame import WeatherFrame
+
+
+def all_stats(frame, key=None):
+    """Compute every statistic, as the /derived endpoint does."""
+    stats = DerivedStats(frame, key)
+    return (stats.rolling_mean(30), stats.anomalies(), stats.degree_days(),
+            stats.yearly_extremes())
+
+
+def loop_stats(weather, window=30, base=18.0):
+    """The same statistics with loops over the daily dictionary."""
+    means = {date.fromisoformat(day): temps["Mean"] for day, temps in weather.items()}
+    rolling = {}
+    for day in sorted(means):
+        values = [means.get(day - timedelta(days=offset)) for offset in range(window)]
+        values = [value for value in values if value is not None]
+        rolling[day] = sum(values) / len(values) if len(values) >= (window + 1) // 2 else None
+
+    sums, counts = [0.0] * 366, [0] * 366
+    for day, mean in means.items():
+        if mean is not None:
+            index = day.timetuple().tm_yday - 1
+            if not calendar.isleap(day.year) and index >= 59:
+                index += 1
+            sums[index] += mean
+            counts[index] += 1
+    anomalies = {}
+    for day, mean in means.items():
+        index = day.timetuple().tm_yday - 1
+        if not calendar.isleap(day.year) and index >= 59:
+            index += 1
+        window_sum = sum(sums[(index + offset) % 366] for offset in range(-7, 8))
+        window_count = sum(counts[(index + offset) % 366] for offset in range(-7, 8))
+        anomalies[day] = None if mean is None else mean - window_sum / window_count
+
+    degree_days, extremes = {}, {}
+    for day, temps in weather.items():
+        year = int(day[:4])
+        heating, cooling = degree_days.get(year, (0.0, 0.0))
+        if temps["Mean"] is not None:
+            heating += max(base - temps["Mean"], 0.0)
+            cooling += max(temps["Mean"] - base, 0.0)
+        degree_days[year] = (heating, cooling)
+        if temps["Max"] is not None and temps["Max"] > extremes.get(year, -1000.0):
+            extremes[year] = temps["Max"]
+    return rolling, anomalies, degree_days, extremes
+
+
+def same_stats(frame, vectorized, loops):
+    """Check the vectorized statistics against the loops."""
+    rolling, anomalies, (years, heating, cooling), extremes = vectorized
+    loop_rolling, loop_anomalies, loop_degree_days, loop_extremes = loops
+    days = [date.fromisoformat(day) for day in np.datetime_as_string(frame.dates).tolist()]
+
+    def as_array(values):
+        return np.array([np.nan if values[day] is None else values[day] for day in days])
+    return (np.allclose(rolling, as_array(loop_rolling), atol=1e-4, equal_nan=True)
+            and np.allclose(anomalies, as_array(loop_anomalies), atol=1e-4, equal_nan=True)
+            and np.allclose(heating, [loop_degree_days[year][0] for year in years.tolist()],
+                            atol=1e-2)
+            and np.allclose(cooling, [loop_degree_days[year][1] for year in years.tolist()],
+                            atol=1e-2)
+            and np.allclose(extremes["max_temp"], [loop_extremes[year]
+                                                   for year in years.tolist()]))
+
+
+def main():
+    """Time the derived statistics of one station."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--years", type=int, default=100)
+    parser.add_argument("--first-year", type=int, default=1925)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    weather = daily_weather(FIRST_STATION_ID, args.first_year, args.years)
+    frame = WeatherFrame.from_dict(weather)
+    print(f"{len(frame)} days of {args.years} years")
+
+    for label, key in (("cold baseline", None), ("memoized baseline", ("bench", 1))):
+        timing = measure(lambda key=key: all_stats(frame, key), args.repeat)
+        print(f"vectorized, {label:17s}: median {timing['seconds'] * 1000:.1f} ms, "
+              f"best {timing['best'] * 1000:.1f} ms")
+    derived_stats.BASELINE_CACHE.clear()
+
+    loop_timing = measure(lambda: loop_stats(weather), 1)
+    print(f"python loops                 : {loop_timing['seconds'] * 1000:.1f} ms")
+    print("results same" if same_stats(frame, all_stats(frame), loop_stats(weather))
+          else "results DIFFERENT")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+#################################################################
+# Description: Benchmarks - Kept-alive compressed HTTP session
+# Usage: python benchmarks/bench_http_session.py [--first-year 1990]
+#        Run a full backfill against the local stub server with a
+#        new connection and an uncompressed page per request, as
+#        urlopen does, then with the HTTP session, and compare the
+#        wall time, bytes sent and connections opened. A last run
+#        makes the server fail some requests to show the retries.
+#################################################################
+"""Run a full backfill against the local stub server with urlopen and
+   with the kept-alive gzip HTTP session, and compare them."""
+import argparse
+import os
+import sys
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+from http_session import HttpSession
+from scrape_weather import StreamingWeatherScraper
+from stub_server import StubClimateServer
+
+
+class UrlopenSession:
+    """The scraper requests as they were, one urlopen call per page."""
+    def get(self, url, headers=None):
+        """Open the url on a new connection, without asking for compression."""
+        return urllib.request.urlopen(urllib.request.Request(url, headers=headers or {}))
+
+    def close(self):
+        """Nothing is kept open."""
+
+
+def backfill(server, session, workers):
+    """Scrape every month of the stub server, and return the time and the data."""
+    scraper = StreamingWeatherScraper()
+    scraper.base_url = server.base_url
+    scraper.session = session
+    start = time.perf_counter()
+    if workers == 1:
+        weather = scraper.scrape_weather()
+    else:
+        weather = scraper.scrape_weather_concurrent(max_workers=workers,
+                                                    per_host_limit=workers)
+    session.close()
+    return time.perf_counter() - start, weather
+
+
+def main():
+    """Compare the backfills."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--first-year", type=int, default=1990)
+    parser.add_argument("--connect-latency", type=float, default=0.02,
+                        help="seconds the server sleeps per new connection, like a handshake")
+    args = parser.parse_args()
+
+    expected = None
+    for workers in (1, 4):
+        for label, session in (("urlopen", UrlopenSession()), ("session", HttpSession())):
+            with StubClimateServer(first_year=args.first_year,
+                                   connect_latency=args.connect_latency) as server:
+                elapsed, weather = backfill(server, session, workers)
+                expected = expected or weather
+                same = "same" if weather == expected else "DIFFERENT"
+                print(f"{label:8s} {workers} worker(s): {elapsed:6.2f}s, "
+                      f"{server.requests} requests, {server.connections:4d} connections, "
+                      f"{server.bytes_sent / 1e6:6.2f} MB sent, {len(weather)} days {same}")
+
+    session = HttpSession(backoff=0.01)
+    with StubClimateServer(first_year=args.first_year, connect_latency=args.connect_latency,
+                           fail_every=25) as server:
+        elapsed, weather = backfill(server, session, 1)
+        stats = session.stats()
+        print(f"session, every 25th request failing: {elapsed:.2f}s, "
+              f"{stats['retries']} retries, {stats['failures']} failures, "
+              f"{stats['reused']} of {stats['requests']} requests reused a connection, "
+              f"{stats['wire_bytes']} bytes for {stats['body_bytes']} bytes of pages, "
+              f"{len(weather)} days {'same' if weather == expected else 'DIFFERENT'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+#################################################################
+# Description: Benchmarks - Monthly aggregates
+# Usage: python benchmarks/bench_monthly_stats.py
+#        Compare the box plot inputs computed from the daily rows
+#        and from the monthly_stats table on 150 years of data.
+#################################################################
+"""Compare the box plot inputs computed from the daily rows and from
+   the monthly_stats table on 150 years of data."""
+import os
+import sys
+import tempfile
+import time
+
+from matplotlib import cbook
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+from db_operations import DBOperations
+from plot_operations import PlotOperations
+from synthetic import daily_weather
+
+FIRST_YEAR = 1874
+YEARS = 150
+
+
+def same_stats(daily_stats, monthly_stats):
+    """
+    Compare the statistics of one month. The mean is summed in another
+    order and the fliers are listed in another order, neither changes
+    the drawing.
+    """
+    return (all(str(daily_stats[key]) == str(monthly_stats[key])
+                for key in monthly_stats if key not in ("mean", "fliers")) and
+            abs(daily_stats["mean"] - monthly_stats["mean"]) < 1e-9 and
+            sorted(daily_stats["fliers"]) == sorted(monthly_stats["fliers"]))
+
+
+def timed(function, repeat=5):
+    """Return the result and the mean seconds of calling function."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return result, (time.perf_counter() - start) / repeat
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as work_dir:
+        weather_db = DBOperations(os.path.join(work_dir, "weather.db"))
+        _, save_time = timed(lambda: weather_db.save_data(daily_weather(27174, FIRST_YEAR, YEARS)), repeat=1)
+        print(f"save_data of {YEARS} years with aggregates: {save_time:.2f}s")
+        for start_year, end_year in ((FIRST_YEAR, FIRST_YEAR + YEARS - 1), (2000, 2020)):
+            daily, daily_time = timed(lambda: cbook.boxplot_stats(
+                PlotOperations(weather_db.fetch_data()).monthly_mean_temps(start_year, end_year)))
+            monthly, monthly_time = timed(lambda: weather_db.fetch_monthly_stats(
+                start_year, end_year).boxplot_stats(start_year, end_year))
+            same = all(same_stats(daily_month, monthly_month)
+                       for daily_month, monthly_month in zip(daily, monthly))
+            print(f"{start_year}-{end_year}: daily rows {daily_time * 1000:.1f} ms, "
+                  f"monthly_stats {monthly_time * 1000:.1f} ms, "
+                  f"{daily_time / monthly_time:.0f}x, result {'same' if same else 'DIFFERENT'}")
@@ -0,0 +1,45 @@
+#################################################################
+# Description: Benchmarks - Daily table parser
+# Usage: python benchmarks/bench_parser.py [fixtures directory]
+#        Compare the per page parse time of WeatherScraper and
+#        StreamingWeatherScraper on saved HTML pages.
+#################################################################
+"""Compare the per page parse time of WeatherScraper and
+   StreamingWeatherScraper on saved HTML pages."""
+import glob
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+from scrape_weather import StreamingWeatherScraper, WeatherScraper
+
+REPEAT = 200
+
+
+def parse_page(parser_class, html_data):
+    """Parse one page with a fresh parser and return the weather data."""
+    parser = parser_class()
+    parser.feed(html_data)
+    return parser.weather
+
+
+if __name__ == '__main__':
+    fixtures_dir = sys.argv[1] if len(sys.argv) > 1 else \
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+    pages = []
+    for path in sorted(glob.glob(os.path.join(fixtures_dir, "*.html"))):
+        with open(path, encoding="utf-8") as fixture:
+            pages.append((os.path.basename(path), fixture.read()))
+
+    for name, page in pages:
+        same = parse_page(WeatherScraper, page) == parse_page(StreamingWeatherScraper, page)
+        base = timeit.timeit(lambda page=page: parse_page(WeatherScraper, page),
+                             number=REPEAT) / REPEAT
+        fast = timeit.timeit(lambda page=page: parse_page(StreamingWeatherScraper, page),
+                             number=REPEAT) / REPEAT
+        print(f"{name}: WeatherScraper {base * 1000:.3f} ms/page, "
+              f"StreamingWeatherScraper {fast * 1000:.3f} ms/page, "
+              f"{base / fast:.2f}x, result {'same' if same else 'DIFFERENT'}")
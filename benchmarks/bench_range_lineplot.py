@@ -0,0 +1,79 @@
+#################################################################
+# Description: Benchmarks - Multi-year line plots
+# Usage: python benchmarks/bench_range_lineplot.py [--years 100]
+#        Render a one month line plot, then a Y year line plot with
+#        every day drawn and with the days downsampled to the plot
+#        width, compare the times and check the downsampled points
+#        keep the highest and lowest day.
+#################################################################
+"""Render a month line plot and a century line plot, with and without
+   downsampling, and check the downsampling keeps the extremes."""
+import argparse
+import os
+import sys
+import tempfile
+
+import numpy as np
+from matplotlib.figure import Figure
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+import downsample
+from plot_operations import PlotOperations
+from run_benchmarks import measure
+from synthetic import FIRST_STATION_ID, daily_weather
+from weather_frame import WeatherFrame
+
+
+def render_every_day(frame, path):
+    """Render the range as a plain line of every day, as before downsampling."""
+    figure = Figure(figsize=(8, 6), dpi=100)
+    axes = figure.add_subplot()
+    axes.plot(frame.dates, frame.mean_temps, linewidth=0.8)
+    axes.grid(True)
+    figure.savefig(path)
+
+
+def main():
+    """Time the line plots of one station."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--years", type=int, default=100)
+    parser.add_argument("--first-year", type=int, default=1925)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    frame = WeatherFrame.from_dict(daily_weather(FIRST_STATION_ID, args.first_year,
+                                                 args.years))
+    last_year = args.first_year + args.years - 1
+    month = frame.year_slice(last_year, last_year)
+    month = month.take(np.flatnonzero(month.months() == 5))
+    with tempfile.TemporaryDirectory() as work_dir:
+        path = os.path.join(work_dir, "plot.png")
+        renders = {
+            "one month": lambda: PlotOperations(month).render_lineplot(
+                path, last_year, 5),
+            f"{args.years} years, every day": lambda: render_every_day(frame, path),
+            f"{args.years} years, downsampled": lambda: PlotOperations(frame)
+            .render_range_lineplot(path, args.first_year, last_year,
+                                   pyramid_key=("bench", FIRST_STATION_ID)),
+        }
+        for label, render in renders.items():
+            timing = measure(render, args.repeat)
+            print(f"{label:26s}: median {timing['seconds'] * 1000:7.1f} ms, "
+                  f"best {timing['best'] * 1000:7.1f} ms")
+
+    axes = Figure(figsize=(8, 6), dpi=100).add_subplot()
+    plotter = PlotOperations(frame)
+    plotter.draw_range_lineplot(axes, args.first_year, last_year)
+    days, values = axes.lines[0].get_xydata().T
+    print(f"{len(frame)} days drawn as {len(days)} points")
+    means = frame.mean_temps.astype(np.float64)
+    kept = (np.isclose(values.max(), np.nanmax(means))
+            and np.isclose(values.min(), np.nanmin(means)))
+    print("extremes kept" if kept else "extremes LOST")
+    downsample.PYRAMID_CACHE.clear()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+#################################################################
+# Description: Benchmarks - Response cache
+# Usage: python benchmarks/bench_response_cache.py
+#        Time a full backfill against the local stub server with
+#        an empty response cache and again with a warm one.
+#################################################################
+"""Time a full backfill against the local stub server with an empty
+   response cache and again with a warm one."""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+from response_cache import ResponseCache
+from scrape_weather import StreamingWeatherScraper
+from stub_server import StubClimateServer
+
+LATENCY = 0.05
+FIRST_YEAR = 2000
+
+
+def timed_backfill(base_url, cache):
+    """Run one full backfill through the cache and return the elapsed seconds."""
+    scraper = StreamingWeatherScraper()
+    scraper.base_url = base_url
+    scraper.cache = cache
+    start = time.perf_counter()
+    weather = scraper.scrape_weather_concurrent()
+    return time.perf_counter() - start, weather
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as cache_dir, \
+            StubClimateServer(first_year=FIRST_YEAR, latency=LATENCY) as server:
+        cold_time, cold_weather = timed_backfill(server.base_url, ResponseCache(cache_dir))
+        cold_requests = server.requests
+        warm_cache = ResponseCache(cache_dir)
+        warm_time, warm_weather = timed_backfill(server.base_url, warm_cache)
+        print(f"cold cache: {cold_time:.2f}s, {cold_requests} requests")
+        print(f"warm cache: {warm_time:.2f}s, {server.requests - cold_requests} requests, "
+              f"{warm_cache.stats()}, result "
+              f"{'same' if warm_weather == cold_weather else 'DIFFERENT'}")
@@ -0,0 +1,58 @@
+#################################################################
+# Description: Benchmarks - Startup time
+# Usage: python benchmarks/bench_startup.py [--frozen <exe>]
+#                                           [--max-seconds <s>]
+#        Time starting the menu and quitting it right away, from
+#        the source entry point and optionally the frozen build.
+#        Exits with 1 when the median is over --max-seconds.
+#################################################################
+"""Time starting the menu and quitting it right away, from the source
+   entry point and optionally the frozen build."""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPEAT = 7
+SOURCE_ENTRY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            "weather_processor.py")
+
+
+def time_startup(command, work_dir):
+    """Start the menu, choose Quit, and return the elapsed seconds."""
+    start = time.perf_counter()
+    subprocess.run(command, input="5\n", text=True, cwd=work_dir, check=True,
+                   stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def main():
+    """Time the entry points and compare with the limit."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--frozen", help="path of the frozen weather_processor executable")
+    parser.add_argument("--max-seconds", type=float, help="fail when a median is slower")
+    args = parser.parse_args()
+
+    entry_points = [("source", [sys.executable, SOURCE_ENTRY])]
+    if args.frozen:
+        entry_points.append(("frozen", [os.path.abspath(args.frozen)]))
+
+    too_slow = False
+    # A scratch directory, so the menu creates its database there.
+    with tempfile.TemporaryDirectory() as work_dir:
+        for label, command in entry_points:
+            time_startup(command, work_dir)
+            timings = [time_startup(command, work_dir) for _ in range(REPEAT)]
+            median = statistics.median(timings)
+            print(f"{label}: median {median * 1000:.0f} ms, best {min(timings) * 1000:.0f} ms")
+            if args.max_seconds is not None and median > args.max_seconds:
+                print(f"{label} startup is over the limit of {args.max_seconds}s")
+                too_slow = True
+    return 1 if too_slow else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,53 @@
+#################################################################
+# Description: Benchmarks - WeatherFrame
+# Usage: python benchmarks/bench_weather_frame.py
+#        Compare the memory use and filter time of a century of
+#        daily data as a dictionary and as a WeatherFrame.
+#################################################################
+"""Compare the memory use and filter time of a century of daily data as
+   a dictionary and as a WeatherFrame."""
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+from plot_operations import PlotOperations
+from synthetic import daily_weather
+from weather_frame import WeatherFrame
+
+YEARS = 100
+
+
+def century_rows():
+    """Build a century of (date, min, max, mean) rows."""
+    return [(date, daily_temps["Min"], daily_temps["Max"], daily_temps["Mean"])
+            for date, daily_temps in daily_weather(27174, 1924, YEARS).items()]
+
+
+def measured(build):
+    """Build a value and return it with the bytes it allocated."""
+    tracemalloc.start()
+    value = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return value, size
+
+
+if __name__ == '__main__':
+    rows = century_rows()
+    weather, dict_bytes = measured(
+        lambda: {row[0]: {"Min": row[1], "Max": row[2], "Mean": row[3]} for row in rows})
+    frame, frame_bytes = measured(lambda: WeatherFrame.from_rows(rows))
+    print(f"{len(rows)} days: dict {dict_bytes / 1e6:.2f} MB, "
+          f"WeatherFrame {frame_bytes / 1e6:.2f} MB ({dict_bytes / frame_bytes:.0f}x less)")
+    print(f"from_rows {timeit.timeit(lambda: WeatherFrame.from_rows(rows), number=5) / 5 * 1000:.1f} ms")
+
+    for label, data in (("dict", weather), ("WeatherFrame", frame)):
+        plotter = PlotOperations(data)
+        box = timeit.timeit(lambda: plotter.monthly_mean_temps(1950, 1990), number=10) / 10
+        line = timeit.timeit(lambda: plotter.month_mean_temps("1997-06"), number=10) / 10
+        print(f"{label:12s} box plot filter {box * 1000:8.3f} ms, "
+              f"line plot filter {line * 1000:8.3f} ms")
@@ -0,0 +1,171 @@
+#################################################################
+# Description: Benchmarks - HTTP service load test
+# Usage: python benchmarks/load_test.py [--url http://host:port]
+#            [--connections 200] [--requests 5000]
+#        Send a mix of daily, box plot statistics and plot requests
+#        from many concurrent keep-alive connections and report the
+#        throughput and latency percentiles. Without --url a service
+#        is started on a synthetic database.
+#################################################################
+"""Send a mix of requests from many concurrent keep-alive connections to
+   the HTTP service and report the throughput and latency percentiles."""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlsplit
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+# pylint: disable=wrong-import-position
+from db_operations import DBOperations
+from synthetic import daily_weather, station_ids
+
+
+def request_paths(stations, first_year, last_year, seed=0):
+    """
+    Build the request mix: mostly daily ranges and box plot statistics,
+    with a few plots, over a limited set of hot queries.
+    """
+    rng = random.Random(seed)
+    paths = []
+    for _ in range(200):
+        station_id = rng.choice(stations)
+        year = rng.randint(first_year, last_year)
+        kind = rng.random()
+        if kind < 0.5:
+            month = rng.randint(1, 12)
+            paths.append(f"/daily?station={station_id}&start={year}-{month:02d}-01"
+                         f"&end={year}-{month:02d}-31")
+        elif kind < 0.9:
+            start_year = rng.randint(first_year, year)
+            paths.append(f"/boxplot?station={station_id}&start_year={start_year}"
+                         f"&end_year={year}")
+        else:
+            paths.append(f"/plot/line?station={station_id}&year={year}"
+                         f"&month={rng.randint(1, 12)}&format=svg")
+    return paths
+
+
+async def client(host, port, paths, request_count, latencies, errors):
+    """Send request_count requests over one keep-alive connection."""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for index in range(request_count):
+            path = paths[index % len(paths)]
+            start = time.perf_counter()
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode("latin-1"))
+            status_line = await reader.readline()
+            content_length = 0
+            while True:
+                header_line = await reader.readline()
+                if header_line in (b"\r\n", b""):
+                    break
+                name, _, value = header_line.decode("latin-1").partition(":")
+                if name.lower() == "content-length":
+                    content_length = int(value)
+            await reader.readexactly(content_length)
+            latencies.append(time.perf_counter() - start)
+            if b" 200 " not in status_line:
+                errors.append(status_line)
+    finally:
+        writer.close()
+
+
+async def run_load(url, connections, total_requests, paths):
+    """Run all clients together and return the latencies and errors."""
+    address = urlsplit(url)
+    latencies, errors = [], []
+    per_client = max(1, total_requests // connections)
+    rng = random.Random(1)
+    await asyncio.gather(*(client(address.hostname, address.port,
+                                  rng.sample(paths, len(paths)), per_client, latencies, errors)
+                           for _ in range(connections)))
+    return latencies, errors
+
+
+def build_database(db_name, stations, first_year, years):
+    """Save the synthetic stations."""
+    weather_db = DBOperations(db_name)
+    for station_id in station_ids(stations):
+        weather_db.add_station(station_id, f"Station {station_id}")
+        weather_db.save_data(daily_weather(station_id, first_year, years), station_id)
+
+
+def free_port():
+    """Find a free local port for the service."""
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    """Wait until the service accepts connections."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"The service did not start on port {port}")
+
+
+def report(label, latencies, errors, elapsed):
+    """Print the throughput and latency percentiles of a run."""
+    latencies = sorted(latencies)
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(f"{label}: {len(latencies)} requests in {elapsed:.2f}s, "
+          f"{len(latencies) / elapsed:,.0f} req/s, p50 {quantiles[49] * 1000:.1f} ms, "
+          f"p95 {quantiles[94] * 1000:.1f} ms, p99 {quantiles[98] * 1000:.1f} ms, "
+          f"{len(errors)} errors")
+
+
+def main():
+    """Start a service unless a URL is given, then run a cold and a warm round."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", help="URL of a running service")
+    parser.add_argument("--connections", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--stations", type=int, default=3)
+    parser.add_argument("--years", type=int, default=30)
+    parser.add_argument("--first-year", type=int, default=1990)
+    args = parser.parse_args()
+    last_year = args.first_year + args.years - 1
+    paths = request_paths(station_ids(args.stations), args.first_year, last_year)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        service = None
+        url = args.url
+        if url is None:
+            db_name = os.path.join(work_dir, "weather.db")
+            build_database(db_name, args.stations, args.first_year, args.years)
+            port = free_port()
+            service = subprocess.Popen(
+                [sys.executable, os.path.join(os.path.dirname(BENCHMARK_DIR), "weather_cli.py"),
+                 "--db", db_name, "serve", "--port", str(port),
+                 "--plot-cache-dir", os.path.join(work_dir, "plot_cache")],
+                stdout=subprocess.DEVNULL)
+            url = f"http://127.0.0.1:{port}"
+        try:
+            wait_for_port(urlsplit(url).port)
+            for label in ("cold", "warm"):
+                start = time.perf_counter()
+                latencies, errors = asyncio.run(run_load(url, args.connections, args.requests,
+                                                         paths))
+                report(label, latencies, errors, time.perf_counter() - start)
+        finally:
+            if service is not None:
+                service.terminate()
+                service.wait()
+
+
+if __name__ == '__main__':
+    main()
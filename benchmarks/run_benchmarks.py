@@ -0,0 +1,164 @@
+#################################################################
+# Description: Benchmarks - Benchmark suite
+# Usage: python benchmarks/run_benchmarks.py [--stations N]
+#            [--years Y] [--output file] [--compare file]
+#        Time the hot paths of the project on synthetic data and
+#        write the results as JSON, so runs of two commits can be
+#        compared with --compare.
+#################################################################
+"""Time the hot paths of the project on synthetic data and write the
+   results as JSON, so runs of two commits can be compared."""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+# pylint: disable=wrong-import-position
+from db_operations import DBOperations
+from plot_operations import PlotOperations
+from scrape_weather import StreamingWeatherScraper, WeatherScraper
+from synthetic import daily_page, station_ids, stations_weather
+
+
+def measure(function, repeat, items=1):
+    """
+    Call function repeat times.
+    Returns:
+        The median and best seconds per call, and the seconds per item.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    median = statistics.median(timings)
+    return {"seconds": median, "best": min(timings), "repeat": repeat,
+            "items": items, "seconds_per_item": median / items}
+
+
+def parse_pages(parser_class, pages):
+    """Parse every page with a fresh parser."""
+    for page in pages:
+        parser = parser_class()
+        parser.feed(page)
+
+
+def run_suite(args, work_dir):
+    """Run every benchmark and return the results by name."""
+    results = {}
+    weather_by_station = stations_weather(args.stations, args.first_year, args.years)
+    first_station = station_ids(args.stations)[0]
+    last_year = args.first_year + args.years - 1
+    day_count = sum(len(weather) for weather in weather_by_station.values())
+
+    pages = [daily_page(year, month, 0, first_station)
+             for year in range(last_year - 1, last_year + 1) for month in range(1, 13)]
+    for parser_class in (WeatherScraper, StreamingWeatherScraper):
+        results[f"parse.{parser_class.__name__}.feed"] = measure(
+            lambda parser_class=parser_class: parse_pages(parser_class, pages),
+            args.repeat, len(pages))
+
+    def save_all():
+        weather_db = DBOperations(os.path.join(work_dir, f"save_{time.perf_counter_ns()}.db"))
+        for station_id, weather in weather_by_station.items():
+            weather_db.add_station(station_id, f"Station {station_id}")
+            weather_db.save_data(weather, station_id)
+    results["db.save_data"] = measure(save_all, max(1, args.repeat // 2), day_count)
+
+    weather_db = DBOperations(os.path.join(work_dir, "weather.db"))
+    for station_id, weather in weather_by_station.items():
+        weather_db.add_station(station_id, f"Station {station_id}")
+        weather_db.save_data(weather, station_id)
+    station_days = len(weather_by_station[first_station])
+    results["db.fetch_data"] = measure(lambda: weather_db.fetch_data(first_station),
+                                       args.repeat, station_days)
+    results["db.fetch_frame"] = measure(lambda: weather_db.fetch_frame(station_id=first_station),
+                                        args.repeat, station_days)
+    results["db.fetch_month"] = measure(
+        lambda: weather_db.fetch_month(last_year, 6, first_station), args.repeat * 20)
+    results["db.get_lastest_date"] = measure(
+        lambda: weather_db.get_lastest_date(first_station), args.repeat * 20)
+    results["db.fetch_monthly_stats"] = measure(
+        lambda: weather_db.fetch_monthly_stats(args.first_year, last_year, first_station),
+        args.repeat)
+
+    weather = weather_db.fetch_data(first_station)
+    frame = weather_db.fetch_frame(station_id=first_station)
+    monthly_stats = weather_db.fetch_monthly_stats(args.first_year, last_year, first_station)
+    for label, data in (("dict", weather), ("frame", frame)):
+        plotter = PlotOperations(data)
+        results[f"plot.boxplot_aggregation.{label}"] = measure(
+            lambda plotter=plotter: plotter.monthly_mean_temps(args.first_year, last_year),
+            args.repeat, station_days)
+        results[f"plot.lineplot_aggregation.{label}"] = measure(
+            lambda plotter=plotter: plotter.month_mean_temps(f"{last_year}-06"), args.repeat)
+    results["plot.boxplot_aggregation.monthly_stats"] = measure(
+        lambda: monthly_stats.boxplot_stats(args.first_year, last_year), args.repeat,
+        station_days)
+    return results
+
+
+def git_commit():
+    """The commit of the working tree, or None outside of git."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True, cwd=BENCHMARK_DIR).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    """Print the ratio of every result to the same result of a baseline file."""
+    with open(baseline_path, encoding="utf-8") as baseline_file:
+        baseline = json.load(baseline_file)
+    print(f"compared with {baseline_path} ({baseline['meta'].get('commit')}):")
+    for name, result in results.items():
+        if name in baseline["results"]:
+            ratio = result["seconds"] / baseline["results"][name]["seconds"]
+            print(f"  {name:45s} {ratio:6.2f}x the baseline time")
+
+
+def main():
+    """Run the suite and write the JSON results."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--stations", type=int, default=3)
+    parser.add_argument("--years", type=int, default=30)
+    parser.add_argument("--first-year", type=int, default=1990)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="JSON file to write, under benchmarks/results by default")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare with")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        results = run_suite(args, work_dir)
+    commit = git_commit()
+    report = {"meta": {"commit": commit, "created": datetime.now().isoformat(timespec="seconds"),
+                       "python": platform.python_version(), "platform": platform.platform(),
+                       "stations": args.stations, "years": args.years,
+                       "first_year": args.first_year, "repeat": args.repeat},
+              "results": results}
+
+    output = args.output or os.path.join(
+        BENCHMARK_DIR, "results", f"{datetime.now():%Y%m%d-%H%M%S}-{commit or 'nogit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as output_file:
+        json.dump(report, output_file, indent=2)
+    for name, result in results.items():
+        print(f"{name:45s} {result['seconds'] * 1000:10.3f} ms "
+              f"({result['seconds_per_item'] * 1e6:9.2f} us per item)")
+    print(f"results written to {output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
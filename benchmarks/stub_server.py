@@ -0,0 +1,131 @@
+#################################################################
+# Description: Benchmarks - Stub climate server
+# Usage: This module start a local HTTP server which answer the
+#        daily data requests of scrape_weather.py with generated
+#        pages, and the bulk CSV requests of csv_scraper.py with
+#        generated years, so the scrapers can be measured without
+#        network.
+#################################################################
+"""This module start a local HTTP server which answer the daily data
+   requests of scrape_weather.py with generated pages, and the bulk CSV
+   requests of csv_scraper.py with generated years."""
+import gzip
+import threading
+import time
+import zlib
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from synthetic import daily_csv, daily_page
+
+NO_DATA_PAGE = "<html><body><p>We're sorry we were unable to satisfy " \
+               "your request.</p></body></html>"
+
+
+@lru_cache(maxsize=4096)
+def encoded_page(page, compress):
+    """
+    Encode a generated page once, gzip compressed if asked, so the server
+    thread does not spend the CPU of the measured client on it per request.
+    Returns:
+        The body and its ETag.
+    """
+    body = page.encode("utf-8")
+    etag = f'"{zlib.crc32(body):08x}"'
+    return (gzip.compress(body, compresslevel=6) if compress else body), etag
+
+
+class StubClimateServer:
+    """Local threaded HTTP server serving generated monthly pages.
+       Months before first_year answer with the no data page, and years
+       before it with a CSV without values. Pages are
+       gzip encoded for clients asking for it, connect_latency is slept
+       once per new connection like a handshake, and every fail_every-th
+       request answers 503."""
+    def __init__(self, first_year=1950, latency=0.0, seed=0, connect_latency=0.0,
+                 fail_every=0):
+        self.first_year = first_year
+        self.latency = latency
+        self.seed = seed
+        self.connect_latency = connect_latency
+        self.fail_every = fail_every
+        self.requests = 0
+        self.connections = 0
+        self.bytes_sent = 0
+        self.server = None
+        self.thread = None
+
+    def __enter__(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            """Request handler of the stub server."""
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in two writes, which Nagle would hold
+            # back on a kept-alive connection until the client's delayed ACK.
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                """Count the connection and pay its handshake."""
+                super().setup()
+                stub.connections += 1
+                if stub.connect_latency:
+                    time.sleep(stub.connect_latency)
+
+            def do_GET(self):
+                """Answer one daily data request."""
+                stub.requests += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                if stub.fail_every and stub.requests % stub.fail_every == 0:
+                    self.send_response(503)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                url = urlsplit(self.path)
+                query = parse_qs(url.query)
+                year = int(query.get("Year", ["1950"])[0])
+                month = int(query.get("Month", ["1"])[0])
+                station_id = int(query.get("StationID", query.get("stationID", ["27174"]))[0])
+                if url.path.endswith("/bulk_data_e.html"):
+                    page = daily_csv(year, stub.seed, station_id, year < stub.first_year)
+                elif year < stub.first_year:
+                    page = NO_DATA_PAGE
+                else:
+                    page = daily_page(year, month, stub.seed, station_id)
+                compress = "gzip" in self.headers.get("Accept-Encoding", "")
+                body, etag = encoded_page(page, compress)
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("ETag", etag)
+                if compress:
+                    self.send_header("Content-Encoding", "gzip")
+                stub.bytes_sent += len(body)
+                self.send_header("Content-Type", "text/csv; charset=utf-8"
+                                 if page.startswith("\ufeff") else "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                """Keep the benchmark output quiet."""
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    @property
+    def base_url(self):
+        """Daily data URL of the stub server."""
+        host, port = self.server.server_address
+        return f"http://{host}:{port}/climate_data/daily_data_e.html"
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.server.shutdown()
+        self.server.server_close()
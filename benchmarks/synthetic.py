@@ -0,0 +1,153 @@
+#################################################################
+# Description: Benchmarks - Synthetic weather generator
+# Usage: This module generate deterministic daily weather for N
+#        stations over Y years, as the weather dictionaries the
+#        project stores and as Environment Canada style pages.
+#################################################################
+"""This module generate deterministic daily weather for N stations over
+   Y years, as the weather dictionaries the project stores and as
+   Environment Canada style pages."""
+import calendar
+import csv
+import io
+import math
+import random
+from datetime import date
+from functools import lru_cache
+
+FIRST_STATION_ID = 27174
+
+
+def station_ids(station_count):
+    """The ids of the synthetic stations, the first one is Winnipeg."""
+    return [FIRST_STATION_ID + index for index in range(station_count)]
+
+
+def daily_weather(station_id, first_year, years, seed=0):
+    """
+    Generate the daily weather of one station from January 1 of first_year.
+    Returns:
+        A dictionary of "YYYY-MM-DD" to {"Max", "Min", "Mean"}, in date order.
+    """
+    weather = {}
+    for year in range(first_year, first_year + years):
+        for month in range(1, 13):
+            weather.update(month_weather(station_id, year, month, seed))
+    return weather
+
+
+def stations_weather(station_count, first_year, years, seed=0):
+    """
+    Generate the daily weather of station_count stations.
+    Returns:
+        A dictionary of station id to its weather dictionary.
+    """
+    return {station_id: daily_weather(station_id, first_year, years, seed)
+            for station_id in station_ids(station_count)}
+
+
+def format_cell(temp):
+    """Format a temperature the way the site does, blank when missing."""
+    return "&nbsp;" if temp is None else f"{temp}"
+
+
+@lru_cache(maxsize=4096)
+def daily_page(year, month, seed=0, station_id=FIRST_STATION_ID):
+    """
+    Build an Environment Canada style daily data page for one month.
+    """
+    weather = month_weather(station_id, year, month, seed)
+    rows = []
+    for day, (date_text, daily_temps) in enumerate(weather.items(), start=1):
+        title = f"{calendar.month_name[month]} {day}, {year}"
+        rows.append(
+            f'<tr><th scope="row"><abbr title="{title}">{date_text[8:]}</abbr></th>\n'
+            f'<td>{format_cell(daily_temps["Max"])}</td>\n'
+            f'<td>{format_cell(daily_temps["Min"])}</td>\n'
+            f'<td>{format_cell(daily_temps["Mean"])}</td>\n'
+            '<td>0.0</td>\n<td>0.0</td>\n<td>&nbsp;</td>\n</tr>\n')
+    return (
+        "<html><head><title>Daily Data Report</title></head><body>\n"
+        '<div id="dynamicDataTable"><table><thead><tr><th>DAY</th>'
+        "<th>Max Temp</th><th>Min Temp</th><th>Mean Temp</th></tr></thead>\n"
+        f"<tbody>\n{''.join(rows)}</tbody>\n"
+        '<tfoot><tr><th scope="row">Avg</th><td>&nbsp;</td><td>&nbsp;</td>'
+        "<td>&nbsp;</td></tr></tfoot></table></div>\n</body></html>")
+
+
+# Columns of the bulk daily CSV of the site, a year of a station per file.
+BULK_CSV_HEADER = [
+    "Longitude (x)", "Latitude (y)", "Station Name", "Climate ID", "Date/Time", "Year",
+    "Month", "Day", "Data Quality", "Max Temp (\u00b0C)", "Max Temp Flag",
+    "Min Temp (\u00b0C)", "Min Temp Flag", "Mean Temp (\u00b0C)", "Mean Temp Flag",
+    "Heat Deg Days (\u00b0C)", "Heat Deg Days Flag", "Cool Deg Days (\u00b0C)",
+    "Cool Deg Days Flag", "Total Rain (mm)", "Total Rain Flag", "Total Snow (cm)",
+    "Total Snow Flag", "Total Precip (mm)", "Total Precip Flag", "Snow on Grnd (cm)",
+    "Snow on Grnd Flag", "Dir of Max Gust (10s deg)", "Dir of Max Gust Flag",
+    "Spd of Max Gust (km/h)", "Spd of Max Gust Flag"]
+
+
+def bulk_csv(weather, station_id=FIRST_STATION_ID):
+    """
+    Format a weather dictionary in the bulk daily CSV layout of the site,
+    every field quoted, blank and flagged "M" when missing, with a BOM.
+    """
+    output = io.StringIO()
+    writer = csv.writer(output, quoting=csv.QUOTE_ALL, lineterminator="\r\n")
+    writer.writerow(BULK_CSV_HEADER)
+    for date_text, daily_temps in weather.items():
+        temps = []
+        for name in ("Max", "Min", "Mean"):
+            temps += ["", "M"] if daily_temps[name] is None else [daily_temps[name], ""]
+        writer.writerow([-97.24, 49.92, f"SYNTHETIC, STATION {station_id}", station_id,
+                         date_text, date_text[:4], date_text[5:7], date_text[8:], "",
+                         *temps] + [""] * 16)
+    return "\ufeff" + output.getvalue()
+
+
+@lru_cache(maxsize=256)
+def daily_csv(year, seed=0, station_id=FIRST_STATION_ID, empty=False):
+    """
+    Build the bulk daily CSV of one year of a station. An empty year has
+    its rows without values, as the site answers for a year the station
+    did not report.
+    """
+    weather = {}
+    for month in range(1, 13):
+        weather.update(month_weather(station_id, year, month, seed))
+    if empty:
+        weather = {date_text: {"Max": None, "Min": None, "Mean": None} for date_text in weather}
+    return bulk_csv(weather, station_id)
+
+
+def month_weather(station_id, year, month, seed=0, missing_rate=0.02):
+    """
+    Generate the daily weather of one month of a station, with a seasonal
+    cycle, day to day noise and some missing means. Every month has its
+    own random stream, so any month can be generated on its own.
+    """
+    rng = random.Random(f"{seed}-{station_id}-{year}-{month}")
+    station_offset = (station_id % 7) - 3
+    weather = {}
+    for day in range(1, calendar.monthrange(year, month)[1] + 1):
+        day_of_year = date(year, month, day).timetuple().tm_yday
+        seasonal = station_offset - 17 * math.cos(2 * math.pi * (day_of_year - 15) / 365.25)
+        max_temp = round(seasonal + 5 + rng.gauss(0, 4), 1)
+        min_temp = round(max_temp - rng.uniform(4, 14), 1)
+        mean_temp = round((max_temp + min_temp) / 2, 1)
+        if rng.random() < missing_rate:
+            mean_temp = None
+        weather[f"{year:04d}-{month:02d}-{day:02d}"] = \
+            {"Max": max_temp, "Min": min_temp, "Mean": mean_temp}
+    return weather
+
+
+def station_pages(station_id, first_year, years, seed=0):
+    """
+    Generate the monthly pages of one station, newest first like the scraper.
+    Yields:
+        (year, month, page) tuples.
+    """
+    for year in range(first_year + years - 1, first_year - 1, -1):
+        for month in range(12, 0, -1):
+            yield year, month, daily_page(year, month, seed, station_id)
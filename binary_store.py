@@ -0,0 +1,538 @@
+#################################################################
+# Description: Project - Binary day file backend
+# Usage: This module keep the daily temperatures of every station
+#        in a memory mapped file of fixed width float32 records,
+#        one per day from the first day of the file, behind the
+#        DBOperations interface. Range reads are slices of the
+#        mapped file. Stations, aggregates, data versions and the
+#        scrape progress stay in the SQLite database.
+#        python weather_processor.py --backend binary ...
+#################################################################
+"""This module keep the daily temperatures of every station in a memory
+   mapped file of fixed width float32 records, one per day from the first
+   day of the file, behind the DBOperations interface. Range reads are
+   slices of the mapped file. Stations, aggregates, data versions and the
+   scrape progress stay in the SQLite database."""
+import calendar
+import mmap
+import os
+import struct
+import threading
+import time
+from datetime import date
+import numpy as np
+from db_operations import DBOperations
+from dbcm import DBCM
+from instrumentation import INSTRUMENTATION
+from monthly_stats import summarize_month
+from stations import DEFAULT_STATION_ID
+from weather_frame import WeatherFrame
+
+# A day file is the header, the magic, the day number since 1970-01-01 of
+# the first record and the number of committed records, followed by one
+# record per day of the min, max and mean temperatures as little endian
+# float32, NaN when missing. A day without any value is not stored.
+DAY_FILE_MAGIC = b"WXDAYS1\n"
+HEADER = struct.Struct("<8siI")
+RECORD_SIZE = 12
+RECORD_COLUMNS = ("Min", "Max", "Mean")
+# A journal is the commit token and record count, then the days as int32
+# and their records.
+JOURNAL_HEADER = struct.Struct("<qI")
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def day_number(sample_date, is_end=False):
+    """
+    Get the day number since 1970-01-01 of a "YYYY-MM-DD" date. Range ends
+    such as "2020-06-31" may name a day past the end of their month, which
+    is taken as the last day of the month for an end and as the first day
+    of the next month for a start.
+    """
+    year, month, day = int(sample_date[:4]), int(sample_date[5:7]), int(sample_date[8:10])
+    month_start = date(year, month, 1).toordinal() - EPOCH_ORDINAL
+    month_days = calendar.monthrange(year, month)[1]
+    if day > month_days:
+        return month_start + month_days - (1 if is_end else 0)
+    return month_start + day - 1
+
+
+def rounded(temps):
+    """Round float32 temperatures back to the one decimal the site publishes."""
+    # Adding 0.0 turns -0.0 into 0.0, as SQLite stores it.
+    return np.round(temps.astype(np.float64), 1) + 0.0
+
+
+def sync_directory(path):
+    """Make a rename in a directory durable, where the system allows it."""
+    if hasattr(os, "O_DIRECTORY"):
+        directory = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+
+
+class DayFile:
+    """ Class for read and write the day file of one station. Records past
+        the committed count are written and synced before the header counts
+        them, so a crash never shows half an append to a reader, and a file
+        which has to start earlier is rewritten beside the old one and
+        renamed over it. Committed records which change are overwritten in
+        place, so a reader of those days during the write may see their old
+        and new values mixed. Their months get a new data version in the
+        same transaction, so a result keyed by the data version read before
+        the records is never served once the write is committed."""
+    def __init__(self, path):
+        """ Constructor for initialize the path of the file."""
+        self.path = path
+        self.journal_path = f"{path}.journal"
+        # Guards the mapping, which the threads reading the file share.
+        self.lock = threading.Lock()
+        self.mapping = None
+        self.mapped_file = None
+
+    def records(self):
+        """
+        Map the committed records of the file, without copying them.
+        Returns:
+            The day number of the first record and a read-only (days, 3)
+            float32 array of min, max and mean, or None and an empty array
+            if the file does not exist.
+        """
+        with self.lock:
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                return None, np.empty((0, 3), np.float32)
+            # Appends change the size and a rewrite the inode, both need a new map.
+            if self.mapping is None or (stat.st_ino, stat.st_size) != self.mapped_file:
+                with open(self.path, "rb") as day_file:
+                    opened = os.fstat(day_file.fileno())
+                    self.mapping = mmap.mmap(day_file.fileno(), 0, access=mmap.ACCESS_READ)
+                self.mapped_file = (opened.st_ino, opened.st_size)
+            # Arrays of an older mapping keep it open until they are dropped.
+            mapping = self.mapping
+        magic, first_day, day_count = HEADER.unpack_from(mapping)
+        if magic != DAY_FILE_MAGIC:
+            raise ValueError(f"{self.path} is not a day file")
+        day_count = min(day_count, (len(mapping) - HEADER.size) // RECORD_SIZE)
+        return first_day, np.frombuffer(mapping, "<f4", day_count * 3,
+                                        HEADER.size).reshape(day_count, 3)
+
+    def merge(self, days, values):
+        """
+        Merge new values into the stored records, a missing value never
+        replacing a stored one.
+        Args:
+            days: int32 array of day numbers, without duplicates.
+            values: (days, 3) float32 array of min, max and mean, NaN when missing.
+        Returns:
+            The days and merged records which differ from the stored ones.
+        """
+        first_day, records = self.records()
+        stored = np.full(values.shape, np.nan, np.float32)
+        if first_day is not None:
+            offsets = days - first_day
+            inside = (offsets >= 0) & (offsets < len(records))
+            stored[inside] = records[offsets[inside]]
+        merged = np.where(np.isnan(values), stored, values)
+        same = (merged == stored) | (np.isnan(merged) & np.isnan(stored))
+        changed = ~same.all(axis=1)
+        return days[changed], merged[changed]
+
+    def write(self, days, values):
+        """
+        Write records, the days between the end of the file and them as
+        missing. The header is only updated once the records are synced.
+        Records before the committed count are overwritten in place, see
+        the class description for readers of those days.
+        """
+        first_day, records = self.records()
+        if first_day is None or days.min() < first_day:
+            first_day, records = self.extend_back(first_day, records, int(days.min()))
+        day_count = len(records)
+        offsets = days - first_day
+        start = min(int(offsets.min()), day_count)
+        end = int(offsets.max()) + 1
+        block = np.full((end - start, 3), np.nan, "<f4")
+        kept = records[start:min(end, day_count)]
+        block[:len(kept)] = kept
+        block[offsets - start] = values
+        with open(self.path, "r+b") as day_file:
+            day_file.seek(HEADER.size + start * RECORD_SIZE)
+            day_file.write(block.tobytes())
+            day_file.flush()
+            os.fsync(day_file.fileno())
+            if end > day_count:
+                day_file.seek(0)
+                day_file.write(HEADER.pack(DAY_FILE_MAGIC, first_day, end))
+                day_file.flush()
+                os.fsync(day_file.fileno())
+
+    def extend_back(self, first_day, records, day):
+        """
+        Start the file at or before day, copying the records into a new file
+        renamed over the old one. The file grows back by at least its length,
+        so a scrape going back a year at a time copies it only a few times.
+        Returns:
+            The new first day and records.
+        """
+        new_first_day = day if first_day is None else \
+            min(day, first_day - max(len(records), 366))
+        shift = 0 if first_day is None else first_day - new_first_day
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "wb") as temp_file:
+            temp_file.write(HEADER.pack(DAY_FILE_MAGIC, new_first_day, shift + len(records)))
+            temp_file.write(np.full((shift, 3), np.nan, "<f4").tobytes())
+            temp_file.write(records.tobytes())
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        with self.lock:
+            self.mapping = self.mapped_file = None
+        os.replace(temp_path, self.path)
+        sync_directory(os.path.dirname(os.path.abspath(self.path)))
+        return self.records()
+
+    def write_journal(self, token, days, values):
+        """Save the records about to be written with the token of their commit."""
+        temp_path = f"{self.journal_path}.tmp"
+        with open(temp_path, "wb") as journal_file:
+            journal_file.write(JOURNAL_HEADER.pack(token, len(days)))
+            journal_file.write(np.asarray(days, "<i4").tobytes())
+            journal_file.write(np.asarray(values, "<f4").tobytes())
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+        os.replace(temp_path, self.journal_path)
+
+    def journal_token(self):
+        """The commit token of the journal, or None if there is no journal."""
+        try:
+            with open(self.journal_path, "rb") as journal_file:
+                return JOURNAL_HEADER.unpack(journal_file.read(JOURNAL_HEADER.size))[0]
+        except FileNotFoundError:
+            return None
+
+    def read_journal(self):
+        """
+        Read the journal of the last write.
+        Returns:
+            The token, days and records, or None if there is no journal.
+        """
+        try:
+            with open(self.journal_path, "rb") as journal_file:
+                token, day_count = JOURNAL_HEADER.unpack(journal_file.read(JOURNAL_HEADER.size))
+                days = np.frombuffer(journal_file.read(day_count * 4), "<i4")
+                values = np.frombuffer(journal_file.read(day_count * RECORD_SIZE),
+                                       "<f4").reshape(day_count, 3)
+                return token, days, values
+        except FileNotFoundError:
+            return None
+
+    def remove(self):
+        """Delete the file and its journal."""
+        with self.lock:
+            self.mapping = self.mapped_file = None
+        for path in (self.path, self.journal_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class BinaryStore(DBOperations):
+    """ Class for keep the daily data in day files under store_dir, the
+        database name with ".days" by default, and everything else in the
+        SQLite database. Writers are serialized by the SQLite write lock.
+        Every write is journaled and its token committed with the monthly
+        aggregates and data versions, so a write cut short on either side
+        is completed by the next write of the station."""
+    def __init__(self, db_name, pooled=True, store_dir=None):
+        """ Constructor for initialize the database and the day files."""
+        self.store_dir = store_dir or f"{db_name}.days"
+        self.day_files = {}
+        self.day_files_lock = threading.Lock()
+        super().__init__(db_name, pooled)
+
+    def initialize_db(self):
+        """
+        Create the tables and the store directory, record the backend in the
+        database and move the rows of a SQLite database into day files.
+        """
+        super().initialize_db()
+        try:
+            os.makedirs(self.store_dir, exist_ok=True)
+            with DBCM(self.db_name, self.pooled) as cursor:
+                cursor.execute('''CREATE TABLE IF NOT EXISTS settings (
+                                      name TEXT PRIMARY KEY,
+                                      value TEXT
+                                  )''')
+                cursor.execute("INSERT OR REPLACE INTO settings (name, value) "
+                               "VALUES ('backend', 'binary')")
+                cursor.execute('''CREATE TABLE IF NOT EXISTS day_files (
+                                      station_id INTEGER PRIMARY KEY,
+                                      journal INTEGER
+                                  )''')
+                self.move_rows(cursor)
+                for station_id in self.stored_station_ids():
+                    self.recover(cursor, station_id)
+        except Exception as init_error:
+            print(f"Error initializing the day files: {init_error}")
+
+    def move_rows(self, cursor):
+        """Move the daily rows of the SQLite tables into day files."""
+        cursor.execute('SELECT DISTINCT station_id FROM weather_data')
+        for station_id, in cursor.fetchall():
+            cursor.execute('''SELECT sample_date, min_temp, max_temp, avg_temp FROM weather_data
+                              WHERE station_id = ?''', (station_id,))
+            frame = WeatherFrame.from_rows(cursor.fetchall())
+            self.lock_for_writing(cursor)
+            days, values = self.day_file(station_id).merge(frame.days, np.column_stack(
+                (frame.min_temps, frame.max_temps, frame.mean_temps)))
+            if len(days):
+                self.commit_records(cursor, station_id, days, values, time.time_ns())
+            cursor.execute('DELETE FROM weather_data WHERE station_id = ?', (station_id,))
+
+    def day_file(self, station_id):
+        """The DayFile of a station, kept mapped between reads."""
+        with self.day_files_lock:
+            day_file = self.day_files.get(station_id)
+            if day_file is None:
+                day_file = DayFile(os.path.join(self.store_dir, f"{int(station_id)}.days"))
+                self.day_files[station_id] = day_file
+            return day_file
+
+    def stored_station_ids(self):
+        """The stations which have a day file or a journal."""
+        return sorted({int(file_name.split(".")[0]) for file_name in os.listdir(self.store_dir)
+                       if file_name.split(".")[0].isdigit()})
+
+    def lock_for_writing(self, cursor):
+        """Take the SQLite write lock before touching a day file."""
+        if not cursor.connection.in_transaction:
+            cursor.execute('BEGIN IMMEDIATE')
+
+    def insert_weather(self, cursor, weather, station_id):
+        """
+        Merge the days of a weather dictionary into the day file of the
+        station, then refresh the aggregates and data versions of the months
+        which changed, inside the caller's transaction. A missing value never
+        replaces a stored one.
+        """
+        self.lock_for_writing(cursor)
+        self.recover(cursor, station_id)
+        days = np.array(list(weather), dtype="datetime64[D]").astype(np.int32)
+        values = np.array([(daily_temps['Min'], daily_temps['Max'], daily_temps['Mean'])
+                           for daily_temps in weather.values()], dtype=np.float32)
+        changed_days, changed_values = self.day_file(station_id).merge(days, values)
+        INSTRUMENTATION.count("db.rows_written", len(changed_days))
+        INSTRUMENTATION.count("db.rows_unchanged", len(days) - len(changed_days))
+        if len(changed_days):
+            self.commit_records(cursor, station_id, changed_days, changed_values,
+                                time.time_ns())
+
+    def commit_records(self, cursor, station_id, days, values, token):
+        """
+        Journal and write merged records, then refresh the months they fall
+        in and record the journal token in the caller's transaction.
+        """
+        day_file = self.day_file(station_id)
+        day_file.write_journal(token, days, values)
+        day_file.write(days, values)
+        month_numbers = np.unique(np.asarray(days).astype("datetime64[D]")
+                                  .astype("datetime64[M]").astype(np.int64))
+        year_months = [(int(number) // 12 + 1970, int(number) % 12 + 1)
+                       for number in month_numbers]
+        self.refresh_monthly_stats(cursor, station_id, year_months)
+        self.bump_data_versions(cursor, station_id, year_months)
+        cursor.execute('''INSERT INTO day_files (station_id, journal) VALUES (?, ?)
+                          ON CONFLICT(station_id) DO UPDATE SET journal = excluded.journal''',
+                       (station_id, token))
+
+    def recover(self, cursor, station_id):
+        """
+        Finish the last write of a station if its commit did not make it
+        into the database. The journal is kept until the next write replaces
+        it: deleting it before the caller's transaction commits would lose
+        the write if the commit did not happen, and a journal whose token is
+        committed is skipped.
+        """
+        day_file = self.day_file(station_id)
+        token = day_file.journal_token()
+        if token is None:
+            return
+        self.lock_for_writing(cursor)
+        cursor.execute('SELECT journal FROM day_files WHERE station_id = ?', (station_id,))
+        if (cursor.fetchone() or (None,))[0] == token:
+            return
+        _, days, values = day_file.read_journal()
+        if len(days):
+            print(f"Completing an interrupted write of station {station_id}.")
+            self.commit_records(cursor, station_id, days, values, token)
+
+    def refresh_monthly_stats(self, cursor, station_id, year_months):
+        """
+        Recompute the monthly aggregates of the given (year, month) pairs of
+        a station from its day file, inside the caller's transaction.
+        """
+        for year, month in year_months:
+            year_month = f"{year:04d}-{month:02d}"
+            frame = self.fetch_frame(f"{year_month}-01", f"{year_month}-31", station_id)
+            stored = ~np.isnan(np.column_stack((frame.min_temps, frame.max_temps,
+                                                frame.mean_temps))).all(axis=1)
+            mean_temps = [None if temp != temp else temp
+                          for temp in rounded(frame.mean_temps[stored]).tolist()]
+            cursor.execute('''INSERT OR REPLACE INTO monthly_stats
+                              (station_id, year, month, day_count, mean_sum,
+                               mean_min, mean_max, mean_sketch)
+                              VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                           (station_id, year, month) + summarize_month(mean_temps))
+
+    def rebuild_monthly_stats(self, cursor):
+        """
+        Recompute every monthly aggregate from the day files.
+        """
+        cursor.execute('DELETE FROM monthly_stats')
+        if not os.path.isdir(self.store_dir):
+            return
+        for station_id in self.stored_station_ids():
+            frame = self.fetch_frame(station_id=station_id)
+            month_numbers = np.unique(frame.dates.astype("datetime64[M]").astype(np.int64))
+            self.refresh_monthly_stats(cursor, station_id,
+                                       [(int(number) // 12 + 1970, int(number) % 12 + 1)
+                                        for number in month_numbers])
+
+    def purge_data(self, station_id=None):
+        """
+        Delete the data of one station, or of all stations if none is given.
+        """
+        super().purge_data(station_id)
+        try:
+            with DBCM(self.db_name, self.pooled) as cursor:
+                self.lock_for_writing(cursor)
+                station_ids = self.stored_station_ids() if station_id is None else [station_id]
+                for purged_station_id in station_ids:
+                    self.day_file(purged_station_id).remove()
+                    cursor.execute('DELETE FROM day_files WHERE station_id = ?',
+                                   (purged_station_id,))
+        except Exception as purge_error:
+            print(f"Error purging the day files: {purge_error}")
+
+    def stored_rows(self, records):
+        """Indexes of the records which hold at least one value."""
+        return np.flatnonzero(~np.isnan(records).all(axis=1))
+
+    def latest_sample_date(self, cursor, station_id):
+        """The latest "YYYY-MM-DD" date stored for a station, or None."""
+        first_day, records = self.day_file(station_id).records()
+        stored = self.stored_rows(records)
+        if not len(stored):
+            return None
+        return str(np.datetime64(first_day + int(stored[-1]), "D"))
+
+    def month_day_counts(self, cursor, station_id, start_date):
+        """
+        Count the stored days of each month of a station from start_date.
+        Returns:
+            A dictionary of "YYYY-MM" to the number of days and the number
+            of days with all three temperatures.
+        """
+        frame = self.fetch_frame(start_date, station_id=station_id)
+        values = np.column_stack((frame.min_temps, frame.max_temps, frame.mean_temps))
+        months = frame.dates.astype("datetime64[M]")
+        stored = ~np.isnan(values).all(axis=1)
+        complete = ~np.isnan(values).any(axis=1)
+        counts = {}
+        for year_month in np.unique(months[stored]):
+            in_month = months == year_month
+            counts[str(year_month)] = (int(np.count_nonzero(stored & in_month)),
+                                       int(np.count_nonzero(complete & in_month)))
+        return counts
+
+    def get_refresh_states(self):
+        """
+        Retrieve what a refresh needs to know of every registered station.
+        Returns:
+            A dictionary of station id to (latest date, scrape interrupted).
+        """
+        return {station_id: (self.latest_sample_date(None, station_id), interrupted)
+                for station_id, (_, interrupted) in super().get_refresh_states().items()}
+
+    def record_range(self, start_date, end_date, station_id):
+        """
+        Find the records of a station from the first to the last stored day
+        between two optional dates.
+        Returns:
+            The day number of the first record and a view of the mapped
+            records, None and an empty array if no day is stored.
+        """
+        first_day, records = self.day_file(station_id).records()
+        if first_day is None:
+            return None, records
+        start = 0 if start_date is None else max(day_number(start_date) - first_day, 0)
+        end = len(records) if end_date is None else \
+            max(min(day_number(end_date, True) - first_day + 1, len(records)), start)
+        stored = self.stored_rows(records[start:end])
+        if not len(stored):
+            return None, records[:0]
+        start, end = start + int(stored[0]), start + int(stored[-1]) + 1
+        INSTRUMENTATION.count("db.rows_fetched", end - start)
+        return first_day + start, records[start:end]
+
+    def fetch_frame(self, start_date=None, end_date=None, station_id=DEFAULT_STATION_ID):
+        """
+        Retrieve the data of a station between two dates as a WeatherFrame
+        whose temperature columns are views of the mapped file. The frame
+        runs from the first to the last stored day of the range, days in
+        between without data have NaN for every value.
+        Returns:
+            A WeatherFrame, empty if there is no data or the read failed.
+        """
+        try:
+            first_day, records = self.record_range(start_date, end_date, station_id)
+            if first_day is None:
+                return WeatherFrame.empty()
+            return WeatherFrame(np.arange(first_day, first_day + len(records), dtype=np.int32),
+                                records[:, 0], records[:, 1], records[:, 2])
+        except Exception as fetch_error:
+            print(f"Error fetching data from the day files: {fetch_error}")
+            return WeatherFrame.empty()
+
+    def fetch_range(self, start_date=None, end_date=None, station_id=DEFAULT_STATION_ID,
+                    columns=("Min", "Max", "Mean")):
+        """
+        Retrieve the data of a station between two dates.
+        Returns:
+            A dictionary of date to the requested daily temperatures.
+        """
+        weather_data = {}
+        try:
+            first_day, records = self.record_range(start_date, end_date, station_id)
+            if first_day is None:
+                return weather_data
+            stored = self.stored_rows(records)
+            dates = np.datetime_as_string((first_day + stored).astype("datetime64[D]")).tolist()
+            temps = rounded(records[stored]).T.tolist()
+            values = [[None if temp != temp else temp
+                       for temp in temps[RECORD_COLUMNS.index(column)]] for column in columns]
+            weather_data = {sample_date: dict(zip(columns, day_temps))
+                            for sample_date, *day_temps in zip(dates, *values)}
+            return weather_data
+        except Exception as fetch_error:
+            print(f"Error fetching data from the day files: {fetch_error}")
+            return weather_data
+
+    def fetch_chunks(self, station_ids=None, start_date=None, end_date=None,
+                     chunk_rows=100000):
+        """
+        Stream the daily rows of the given or all stations between two
+        optional dates, ordered by station and date, chunk_rows at a time.
+        Yields:
+            Lists of (station_id, sample_date, max_temp, min_temp, avg_temp) rows.
+        """
+        for station_id in sorted(station_ids or self.stored_station_ids()):
+            weather = self.fetch_range(start_date, end_date, station_id, ("Max", "Min", "Mean"))
+            rows = [(station_id, sample_date, daily_temps["Max"], daily_temps["Min"],
+                     daily_temps["Mean"]) for sample_date, daily_temps in weather.items()]
+            for start in range(0, len(rows), chunk_rows):
+                yield rows[start:start + chunk_rows]
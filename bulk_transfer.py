@@ -0,0 +1,175 @@
+#################################################################
+# Description: Project - Bulk export and import
+# Usage: This module copy the daily data out of the database into
+#        CSV or a compact columnar binary file, and load such files
+#        back, a chunk of rows at a time so memory stays bounded.
+#################################################################
+"""This module copy the daily data out of the database into CSV or a
+   compact columnar binary file, and load such files back, a chunk of
+   rows at a time so memory stays bounded."""
+import csv
+import json
+import struct
+import numpy as np
+
+CSV_HEADER = ["station_id", "sample_date", "location", "max_temp", "min_temp", "avg_temp"]
+
+# The columnar file is the magic, a JSON header of the stations with its
+# length, then chunks of a row count followed by one little endian array
+# per column: station ids and days since 1970-01-01 as int32, and the max,
+# min and mean temperatures as float32 with NaN for missing values.
+COLUMNAR_MAGIC = b"WXCOLS1\n"
+COLUMNAR_COLUMNS = (("station_id", "<i4"), ("day", "<i4"), ("max_temp", "<f4"),
+                    ("min_temp", "<f4"), ("avg_temp", "<f4"))
+LENGTH = struct.Struct("<I")
+
+
+def export_csv(weather_db, path, station_ids=None, start_date=None, end_date=None,
+               chunk_rows=100000):
+    """
+    Write the daily rows of the given or all stations to a CSV file.
+    Returns:
+        The number of rows written.
+    """
+    stations = weather_db.get_stations()
+    row_count = 0
+    with open(path, "w", newline="", encoding="utf-8") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(CSV_HEADER)
+        for rows in weather_db.fetch_chunks(station_ids, start_date, end_date, chunk_rows):
+            writer.writerows((station_id, sample_date, stations.get(station_id), *temps)
+                             for station_id, sample_date, *temps in rows)
+            row_count += len(rows)
+    return row_count
+
+
+def export_columnar(weather_db, path, station_ids=None, start_date=None, end_date=None,
+                    chunk_rows=100000):
+    """
+    Write the daily rows of the given or all stations to a columnar file.
+    Returns:
+        The number of rows written.
+    """
+    stations = weather_db.get_stations()
+    if station_ids:
+        stations = {station_id: stations.get(station_id) for station_id in station_ids}
+    header = json.dumps({"columns": [name for name, _ in COLUMNAR_COLUMNS],
+                         "stations": stations}).encode("utf-8")
+    row_count = 0
+    with open(path, "wb") as columnar_file:
+        columnar_file.write(COLUMNAR_MAGIC + LENGTH.pack(len(header)) + header)
+        for rows in weather_db.fetch_chunks(station_ids, start_date, end_date, chunk_rows):
+            station_column, dates, max_temps, min_temps, mean_temps = zip(*rows)
+            columns = (station_column,
+                       np.array(dates, dtype="datetime64[D]").astype(np.int32),
+                       max_temps, min_temps, mean_temps)
+            columnar_file.write(LENGTH.pack(len(rows)))
+            for column, (_, dtype) in zip(columns, COLUMNAR_COLUMNS):
+                columnar_file.write(np.asarray(column, dtype=dtype).tobytes())
+            row_count += len(rows)
+    return row_count
+
+
+def read_csv(path, stations, chunk_rows=100000):
+    """
+    Read a CSV file written by export_csv, chunk_rows at a time. The
+    location of every station is added to the stations dictionary.
+    Yields:
+        Lists of (station_id, sample_date, max_temp, min_temp, avg_temp) rows.
+    """
+    with open(path, newline="", encoding="utf-8") as csv_file:
+        reader = csv.reader(csv_file)
+        if next(reader, None) != CSV_HEADER:
+            raise ValueError(f"{path} does not start with the header {','.join(CSV_HEADER)}")
+        rows = []
+        for station_id, sample_date, location, max_temp, min_temp, mean_temp in reader:
+            station_id = int(station_id)
+            if station_id not in stations:
+                stations[station_id] = location
+            rows.append((station_id, sample_date, float(max_temp) if max_temp else None,
+                         float(min_temp) if min_temp else None,
+                         float(mean_temp) if mean_temp else None))
+            if len(rows) >= chunk_rows:
+                yield rows
+                rows = []
+        if rows:
+            yield rows
+
+
+def read_columnar_header(columnar_file):
+    """Read the magic and JSON header of a columnar file."""
+    if columnar_file.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+        raise ValueError(f"{columnar_file.name} is not a columnar weather file")
+    header_length, = LENGTH.unpack(columnar_file.read(LENGTH.size))
+    header = json.loads(columnar_file.read(header_length))
+    return {int(station_id): location for station_id, location in header["stations"].items()}
+
+
+def read_columnar(path):
+    """
+    Read a columnar file written by export_columnar, one chunk at a time.
+    Temperatures are rounded back to the one decimal the site publishes.
+    Yields:
+        Lists of (station_id, sample_date, max_temp, min_temp, avg_temp) rows.
+    """
+    with open(path, "rb") as columnar_file:
+        read_columnar_header(columnar_file)
+        while True:
+            length = columnar_file.read(LENGTH.size)
+            if not length:
+                return
+            row_count, = LENGTH.unpack(length)
+            columns = [np.frombuffer(columnar_file.read(row_count * 4), dtype=dtype)
+                       for _, dtype in COLUMNAR_COLUMNS]
+            if any(len(column) != row_count for column in columns):
+                raise ValueError(f"{path} ends in the middle of a chunk")
+            station_column, days = columns[0].tolist(), columns[1].astype("datetime64[D]")
+            temps = [[None if temp != temp else temp
+                      for temp in np.round(column.astype(np.float64), 1).tolist()]
+                     for column in columns[2:]]
+            yield list(zip(station_column, np.datetime_as_string(days).tolist(), *temps))
+
+
+def import_rows(weather_db, row_chunks, stations):
+    """
+    Save chunks of (station_id, sample_date, max_temp, min_temp, avg_temp)
+    rows, one transaction per chunk. Every station is registered with its
+    location in stations before its first rows are saved. The import
+    stops at the first chunk which cannot be saved.
+    Returns:
+        The number of rows saved, and True if every chunk was saved.
+    """
+    registered_stations = set()
+    row_count = 0
+    for rows in row_chunks:
+        weather_by_station = {}
+        for station_id, sample_date, max_temp, min_temp, mean_temp in rows:
+            weather = weather_by_station.get(station_id)
+            if weather is None:
+                weather = weather_by_station[station_id] = {}
+                if station_id not in registered_stations:
+                    registered_stations.add(station_id)
+                    weather_db.add_station(station_id, stations.get(station_id)
+                                           or f"Station {station_id}")
+            weather[sample_date] = {"Max": max_temp, "Min": min_temp, "Mean": mean_temp}
+        if not weather_db.save_stations_data(weather_by_station):
+            return row_count, False
+        row_count += len(rows)
+    return row_count, True
+
+
+def import_file(weather_db, path, chunk_rows=100000):
+    """
+    Load a CSV or columnar file into the database, told apart by the
+    magic of the columnar format.
+    Returns:
+        The number of rows saved, and True if every row was saved.
+    """
+    with open(path, "rb") as data_file:
+        is_columnar = data_file.read(len(COLUMNAR_MAGIC)) == COLUMNAR_MAGIC
+    if not is_columnar:
+        stations = {}
+        return import_rows(weather_db, read_csv(path, stations, chunk_rows), stations)
+    with open(path, "rb") as columnar_file:
+        stations = read_columnar_header(columnar_file)
+    return import_rows(weather_db, read_columnar(path), stations)
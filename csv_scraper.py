@@ -0,0 +1,197 @@
+#################################################################
+# Description: Project - Scraping - Bulk CSV
+# Usage: This module read the daily data of a station a year at a
+#        time from the bulk CSV download of the Environment Canada
+#        website, instead of one HTML page per month. Closed months
+#        of years with enough of them to fetch come from the CSV,
+#        the rest from the monthly pages.
+#################################################################
+"""This module read the daily data of a station a year at a time from the
+   bulk CSV download of the Environment Canada website, instead of one
+   HTML page per month."""
+import codecs
+import csv
+import http.client
+import itertools
+import threading
+import urllib.error
+import zlib
+from urllib.parse import urljoin
+from instrumentation import INSTRUMENTATION
+from scrape_weather import StreamingWeatherScraper, to_float
+from stations import DEFAULT_STATION_ID
+
+# Leading text of the bulk CSV columns read, the units differ in encoding.
+BULK_CSV_COLUMNS = ("Date/Time", "Max Temp (", "Min Temp (", "Mean Temp (")
+HEADER_SEARCH_ROWS = 50
+
+
+def response_lines(response, chunk_size=65536):
+    """
+    Decode a response a chunk at a time into lines, ending with their
+    line breaks as the csv module expects. A byte order mark is dropped.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    tail = ""
+    while True:
+        chunk = response.read(chunk_size)
+        INSTRUMENTATION.count("scrape.bytes", len(chunk))
+        lines = (tail + decoder.decode(chunk, final=not chunk)).splitlines(keepends=True)
+        # The last line may go on in the next chunk.
+        tail = lines.pop() if lines and chunk and not lines[-1].endswith(("\n", "\r")) else ""
+        yield from lines
+        if not chunk:
+            return
+
+
+def parse_bulk_csv(lines):
+    """
+    Parse the lines of a bulk daily CSV into the records of the HTML
+    scrapers.
+    Returns:
+        A dictionary of "YYYY-MM-DD" to {"Max", "Min", "Mean"} in file
+        order, or None if the header is not the bulk CSV layout.
+    """
+    reader = csv.reader(lines)
+    indexes = []
+    # Older files have some rows of station details before the header.
+    for header in itertools.islice(reader, HEADER_SEARCH_ROWS):
+        indexes = [next((index for index, name in enumerate(header) if name.startswith(prefix)),
+                        None) for prefix in BULK_CSV_COLUMNS]
+        if None not in indexes:
+            break
+    if not indexes or None in indexes:
+        return None
+    date_index, max_index, min_index, mean_index = indexes
+    row_length = max(indexes) + 1
+    weather = {}
+    for row in reader:
+        # Skip short rows and notes, a date is "YYYY-MM-DD".
+        if len(row) >= row_length and len(row[date_index]) == 10 and row[date_index][4] == "-":
+            weather[row[date_index]] = {"Max": to_float(row[max_index]),
+                                        "Min": to_float(row[min_index]),
+                                        "Mean": to_float(row[mean_index])}
+    return weather
+
+
+class BulkCsvScraper(StreamingWeatherScraper):
+    """
+    A WeatherScraper which fetches a year of a station in one bulk CSV
+    request. scrape_months picks the source of every month: a closed
+    month of a year with at least min_csv_months months to fetch comes
+    from the CSV, other months and years whose CSV could not be read from
+    the monthly pages. A year without any value in its CSV has no data,
+    like the no data page of a month.
+    """
+    min_csv_months = 3
+
+    def __init__(self, station_id=DEFAULT_STATION_ID, session=None):
+        super().__init__(station_id, session)
+        # Months each CSV year of the running scrape_months call still has
+        # to hand out, and the months read.
+        self.csv_months_left = {}
+        self.csv_years = {}
+        self.year_locks = {}
+        self.csv_lock = threading.Lock()
+
+    def year_url(self, year):
+        """
+        Build the bulk daily CSV URL of the given year, next to the daily
+        data page of base_url.
+        """
+        return f"{urljoin(self.base_url, 'bulk_data_e.html')}?format=csv" \
+               f"&stationID={self.station_id}&Year={year}&Month=1&Day=1&timeframe=2" \
+               f"&submit=Download+Data"
+
+    def is_closed(self, year, month):
+        """Check the month ended before the current date of the scraper."""
+        return (year, month) < (self.current_date.year, self.current_date.month)
+
+    def scrape_months(self, year_months, max_workers=8, per_host_limit=4,
+                      stop_at_missing=False):
+        """
+        Generate the given months in order as (year, month, weather) tuples,
+        reading the years with enough closed months as bulk CSV. The CSV
+        years are only kept for this call, they are dropped when it ends or
+        is closed early.
+        """
+        year_months = list(year_months)
+        csv_months = {}
+        for year, month in year_months:
+            if self.is_closed(year, month):
+                csv_months[year] = csv_months.get(year, 0) + 1
+        with self.csv_lock:
+            self.csv_months_left = {year: month_count for year, month_count
+                                    in csv_months.items() if month_count >= self.min_csv_months}
+            self.csv_years = {}
+            self.year_locks = {}
+        try:
+            # The months pool waits for its workers when it ends.
+            yield from super().scrape_months(year_months, max_workers, per_host_limit,
+                                             stop_at_missing)
+        finally:
+            with self.csv_lock:
+                self.csv_months_left = {}
+                self.csv_years = {}
+                self.year_locks = {}
+
+    def scrape_month(self, year, month):
+        """
+        Get a single month from the CSV of its year, or fetch and parse its
+        page if the year is not read as CSV.
+        Returns:
+            The weather dictionary of the month, None if the site has no
+            data, or FETCH_FAILED if its page could not be fetched.
+        """
+        with self.csv_lock:
+            if year not in self.csv_months_left or not self.is_closed(year, month):
+                year_lock = None
+            else:
+                year_lock = self.year_locks.setdefault(year, threading.Lock())
+        if year_lock is None:
+            return super().scrape_month(year, month)
+        # The first month of a year fetches the CSV, the others wait for it.
+        with year_lock:
+            if year not in self.csv_years:
+                self.csv_years[year] = self.fetch_year(year)
+            months = self.csv_years[year]
+        with self.csv_lock:
+            self.csv_months_left[year] -= 1
+            if not self.csv_months_left[year]:
+                del self.csv_months_left[year]
+                self.csv_years.pop(year, None)
+                self.year_locks.pop(year, None)
+        if months is None:
+            return super().scrape_month(year, month)
+        return months.get(month)
+
+    def fetch_year(self, year):
+        """
+        Fetch and parse the bulk CSV of one year while it downloads.
+        Returns:
+            A dictionary of month number to its weather dictionary, empty if
+            the year has no values, or None if the CSV could not be read.
+        """
+        url = self.year_url(year)
+        try:
+            self.start_request()
+            with INSTRUMENTATION.span("scrape.csv"), self.session.get(url) as response:
+                weather = parse_bulk_csv(response_lines(response))
+        except urllib.error.URLError as url_exception:
+            print(f"Error fetching data from {url}: {url_exception}")
+            return None
+        except (OSError, http.client.HTTPException, zlib.error, csv.Error) as read_error:
+            # The download broke off or the body is corrupt, the year is read
+            # from its pages instead.
+            print(f"Error reading data from {url}: {read_error}")
+            return None
+        if weather is None:
+            print(f"Error reading data from {url}: not a bulk CSV.")
+            return None
+        INSTRUMENTATION.count("parse.rows", len(weather))
+        months = {}
+        if any(value is not None for daily_temps in weather.values()
+               for value in daily_temps.values()):
+            for sample_date, daily_temps in weather.items():
+                months.setdefault(int(sample_date[5:7]), {})[sample_date] = daily_temps
+        return months
@@ -11,98 +11,662 @@
     This database will be used to store the weather information
     sracped in scrape_weather.py and also implement the
     fetch, save and purge function."""
+import calendar
+import os
+from datetime import date
 from dbcm import DBCM  # Import the DBCM context manager from dbcm.py
+from instrumentation import INSTRUMENTATION
+from stations import DEFAULT_STATION_ID, DEFAULT_STATIONS
+from monthly_stats import MonthlyStats, summarize_month
+
+# Table columns of the temperatures in the weather dictionaries.
+COLUMN_NAMES = {"Min": "min_temp", "Max": "max_temp", "Mean": "avg_temp"}
+# Storage of the daily rows: SQLite tables, or the memory mapped day files
+# of binary_store.
+BACKENDS = ("sqlite", "binary")
+
+
+def open_database(db_name, backend=None):
+    """
+    Open a database with the backend it was created with. The given
+    backend is only used for a new database, or to convert a SQLite one
+    to the binary backend; a binary database stays binary.
+    Returns:
+        A DBOperations, or a BinaryStore for the binary backend.
+    """
+    stored = stored_backend(db_name)
+    if stored == "binary" and backend == "sqlite":
+        print(f"{db_name} uses the binary backend, it is opened with it.")
+    if stored == "binary" or backend == "binary":
+        # Imported here as binary_store builds on this module.
+        from binary_store import BinaryStore  # pylint: disable=import-outside-toplevel
+        return BinaryStore(db_name)
+    return DBOperations(db_name)
+
+
+def stored_backend(db_name):
+    """The backend recorded in a database, "sqlite" if none is."""
+    try:
+        with DBCM(db_name) as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'settings'")
+            if cursor.fetchone() is None:
+                return "sqlite"
+            cursor.execute("SELECT value FROM settings WHERE name = 'backend'")
+            return (cursor.fetchone() or ("sqlite",))[0]
+    except Exception as backend_error:
+        print(f"Error reading the backend of {db_name}: {backend_error}")
+        return "sqlite"
 
 class DBOperations:
     """This class handled all database related functions. Other
     modules/functions requrie talk to database are require to talk
     throught this class.
     """
-    def __init__(self, db_name):
+    # Databases already initialized by this process, see initialized_key.
+    initialized_dbs = set()
+
+    def __init__(self, db_name, pooled=True):
         self.db_name = db_name
-        self.initialize_db()
+        self.pooled = pooled
+        if self.initialized_key() not in DBOperations.initialized_dbs:
+            self.initialize_db()
+
+    def initialized_key(self):
+        """
+        Identify the database file for initialized_dbs. The inode is part of
+        it, so a file deleted or recreated in this process is initialized
+        again, and a missing file never counts as initialized.
+        """
+        try:
+            inode = os.stat(self.db_name).st_ino
+        except OSError:
+            inode = None
+        return os.path.abspath(self.db_name), inode, os.getpid(), type(self)
 
     def initialize_db(self):
         """
-        Create the database and the required table if it doesn't already exist.
+        Create the database and the required tables if they don't already exist.
+        A weather_data table of the single station schema is migrated to the
+        station keyed schema.
         """
         try:
-            with DBCM(self.db_name) as cursor:
+            with DBCM(self.db_name, self.pooled) as cursor:
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS stations (
+                        station_id INTEGER PRIMARY KEY,
+                        location TEXT
+                    )
+                ''')
+                cursor.executemany('''INSERT OR IGNORE INTO stations
+                                      (station_id, location) VALUES (?, ?)''',
+                                   DEFAULT_STATIONS.items())
+                columns = [row[1] for row in cursor.execute('PRAGMA table_info(weather_data)')]
+                if columns and 'station_id' not in columns:
+                    cursor.execute('ALTER TABLE weather_data RENAME TO weather_data_single')
                 cursor.execute('''
                     CREATE TABLE IF NOT EXISTS weather_data (
                         id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        sample_date TEXT UNIQUE,
+                        station_id INTEGER NOT NULL,
+                        sample_date TEXT NOT NULL,
                         location TEXT,
                         min_temp REAL,
                         max_temp REAL,
-                        avg_temp REAL
+                        avg_temp REAL,
+                        UNIQUE (station_id, sample_date)
+                    )
+                ''')
+                if columns and 'station_id' not in columns:
+                    cursor.execute('''INSERT INTO weather_data
+                                      (station_id, sample_date, location,
+                                       min_temp, max_temp, avg_temp)
+                                      SELECT ?, sample_date, location,
+                                             min_temp, max_temp, avg_temp
+                                      FROM weather_data_single''', (DEFAULT_STATION_ID,))
+                    cursor.execute('DROP TABLE weather_data_single')
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'monthly_stats'")
+                new_monthly_stats = cursor.fetchone() is None
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS monthly_stats (
+                        station_id INTEGER NOT NULL,
+                        year INTEGER NOT NULL,
+                        month INTEGER NOT NULL,
+                        day_count INTEGER,
+                        mean_sum REAL,
+                        mean_min REAL,
+                        mean_max REAL,
+                        mean_sketch TEXT,
+                        PRIMARY KEY (station_id, year, month)
+                    )
+                ''')
+                if new_monthly_stats:
+                    self.rebuild_monthly_stats(cursor)
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'data_versions'")
+                new_data_versions = cursor.fetchone() is None
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS data_versions (
+                        station_id INTEGER NOT NULL,
+                        year INTEGER NOT NULL,
+                        month INTEGER NOT NULL,
+                        version INTEGER NOT NULL,
+                        PRIMARY KEY (station_id, year, month)
+                    )
+                ''')
+                if new_data_versions:
+                    cursor.execute('''INSERT INTO data_versions (station_id, year, month, version)
+                                      SELECT station_id, year, month, 1 FROM monthly_stats''')
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS scrape_runs (
+                        station_id INTEGER PRIMARY KEY,
+                        latest_date TEXT
                     )
                 ''')
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS scrape_progress (
+                        station_id INTEGER NOT NULL,
+                        year INTEGER NOT NULL,
+                        month INTEGER NOT NULL,
+                        PRIMARY KEY (station_id, year, month)
+                    )
+                ''')
+            DBOperations.initialized_dbs.add(self.initialized_key())
         except Exception as init_error:
             print(f"Error initializing database: {init_error}")
 
-    def save_data(self, weather):
+    def add_station(self, station_id, location):
+        """
+        Register a station, or rename the location of a registered one.
+        """
+        try:
+            with DBCM(self.db_name, self.pooled) as cursor:
+                cursor.execute('''INSERT INTO stations (station_id, location) VALUES (?, ?)
+                                  ON CONFLICT(station_id) DO UPDATE SET location = excluded.location''',
+                               (station_id, location))
+        except Exception as station_error:
+            print(f"Error registering station {station_id}: {station_error}")
+
+    def get_stations(self):
+        """
+        Retrieve the registered stations.
+        Returns:
+            A dictionary of station id to location.
+        """
+        stations = {}
+        try:
+            with DBCM(self.db_name, self.pooled) as cursor:
+                cursor.execute('SELECT station_id, location FROM stations ORDER BY station_id')
+                stations = dict(cursor.fetchall())
+                return stations
+        except Exception as station_error:
+            print(f"Error retrieving stations: {station_error}")
+            return stations
+
+    def get_refresh_states(self):
+        """
+        Retrieve what a refresh needs to know of every registered station
+        in one query.
+        Returns:
+            A dictionary of station id to (latest date, scrape interrupted).
+        """
+        states = {}
+        try:
+            with DBCM(self.db_name, self.pooled) as cursor:
+                cursor.execute('''SELECT station_id,
+                                      (SELECT max(sample_date) FROM weather_data
+                                       WHERE weather_data.station_id = stations.station_id),
+                                      EXISTS (SELECT 1 FROM scrape_runs
+                                              WHERE scrape_runs.station_id = stations.station_id)
+                                  FROM stations ORDER BY station_id''')
+                states = {station_id: (latest_date, bool(interrupted))
+                          for station_id, latest_date, interrupted in cursor.fetchall()}
+                return states
+        except Exception as state_error:
+            print(f"Error retrieving the refresh states: {state_error}")
+            return states
+
+    def save_data(self, weather, station_id=DEFAULT_STATION_ID):
         """
-        Save new data to the database, avoiding duplicates.
+        Save new or corrected data of a station to the database, see
+        insert_weather.
         Args:
-            weather: A list of dictionaries containing weather data.
+            weather: A dictionary of date to daily temperatures.
+            station_id: The station the data was scraped from.
         """
-        location = 'Winnipeg, MB'
-        if weather and location:
+        if weather:
             try:
-                with DBCM(self.db_name) as cursor:
-                    sql = """INSERT OR IGNORE INTO weather_data
-                            (sample_date, location, min_temp, max_temp, avg_temp)
-                            VALUES (?, ?, ?, ?, ?)"""
-                    cursor_data = [(date, location,
-                                    daily_temps['Min'], daily_temps['Max'], daily_temps['Mean'])
-                            for date, daily_temps in weather.items()]
-                    cursor.executemany(sql, cursor_data)
+                with DBCM(self.db_name, self.pooled) as cursor:
+                    self.insert_weather(cursor, weather, station_id)
             except Exception as save_error:
                 print(f"Error saving data to the database: {save_error}")
 
-    def purge_data(self):
+    def save_stations_data(self, weather_by_station):
+        """
+        Save the data of several stations in one transaction, for bulk loads.
+        Args:
+            weather_by_station: A dictionary of station id to its weather dictionary.
+        Returns:
+            True if the data was saved, False if the transaction failed.
+        """
+        try:
+            with DBCM(self.db_name, self.pooled) as cursor:
+                for station_id, weather in weather_by_station.items():
+                    if weather:
+                        self.insert_weather(cursor, weather, station_id)
+            return True
+        except Exception as save_error:
+            print(f"Error saving data to the database: {save_error}")
+            return False
+
+    def insert_weather(self, cursor, weather, station_id):
+        """
+        Upsert the days of a weather dictionary with one executemany per
+        month, then refresh the aggregates and data versions of the months
+        which changed, inside the caller's transaction. A stored day is only
+        written when a value differs, and a missing value never replaces a
+        stored one, so a rescraped month corrects the days which were still
+        in progress without rewriting the others.
+        """
+        cursor.execute('SELECT location FROM stations WHERE station_id = ?', (station_id,))
+        location = (cursor.fetchone() or (None,))[0]
+        sql = """INSERT INTO weather_data
+                (station_id, sample_date, location, min_temp, max_temp, avg_temp)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(station_id, sample_date) DO UPDATE SET
+                    min_temp = coalesce(excluded.min_temp, min_temp),
+                    max_temp = coalesce(excluded.max_temp, max_temp),
+                    avg_temp = coalesce(excluded.avg_temp, avg_temp)
+                WHERE coalesce(excluded.min_temp, min_temp) IS NOT min_temp
+                   OR coalesce(excluded.max_temp, max_temp) IS NOT max_temp
+                   OR coalesce(excluded.avg_temp, avg_temp) IS NOT avg_temp"""
+        cursor_data = [(station_id, date, location,
+                        daily_temps['Min'], daily_temps['Max'], daily_temps['Mean'])
+                for date, daily_temps in weather.items()]
+        rows_by_month = {}
+        for row in cursor_data:
+            rows_by_month.setdefault((int(row[1][:4]), int(row[1][5:7])), []).append(row)
+        changed_months = []
+        for year_month, month_rows in rows_by_month.items():
+            cursor.executemany(sql, month_rows)
+            if cursor.rowcount:
+                changed_months.append(year_month)
+            INSTRUMENTATION.count("db.rows_written", cursor.rowcount)
+            INSTRUMENTATION.count("db.rows_unchanged", len(month_rows) - cursor.rowcount)
+        if changed_months:
+            self.refresh_monthly_stats(cursor, station_id, changed_months)
+            self.bump_data_versions(cursor, station_id, changed_months)
+
+    def months_to_sync(self, station_id=DEFAULT_STATION_ID, recheck_months=2, today=None):
+        """
+        Find the months an incremental sync of a station has to fetch: the
+        months after its latest stored month up to the open one, and the
+        months from recheck_months before the latest stored month which
+        still miss days or values. Older gaps are taken as final.
+        Returns:
+            A list of (year, month) pairs newest first, or None if the
+            station has no data yet.
+        """
+        today = today or date.today()
+        try:
+            with DBCM(self.db_name, self.pooled) as cursor:
+                latest_date = self.latest_sample_date(cursor, station_id)
+                if latest_date is None:
+                    return None
+                month_index = int(latest_date[:4]) * 12 + int(latest_date[5:7]) - 1
+                month_index -= recheck_months
+                first_year, first_month = divmod(month_index, 12)
+                month_counts = self.month_day_counts(
+                    cursor, station_id, f"{first_year:04d}-{first_month + 1:02d}-01")
+                complete_months = {year_month for year_month, (days, value_days)
+                                   in month_counts.items() if value_days == days
+                                   and days >= self.expected_days(year_month, today)}
+        except Exception as sync_error:
+            print(f"Error finding the months to sync: {sync_error}")
+            return None
+        months = []
+        while month_index <= today.year * 12 + today.month - 1:
+            year, month = divmod(month_index, 12)
+            if f"{year:04d}-{month + 1:02d}" not in complete_months:
+                months.append((year, month + 1))
+            month_index += 1
+        return months[::-1]
+
+    def latest_sample_date(self, cursor, station_id):
+        """The latest "YYYY-MM-DD" date stored for a station, or None."""
+        cursor.execute('SELECT max(sample_date) FROM weather_data WHERE station_id = ?',
+                       (station_id,))
+        return cursor.fetchone()[0]
+
+    def month_day_counts(self, cursor, station_id, start_date):
+        """
+        Count the stored days of each month of a station from start_date.
+        Returns:
+            A dictionary of "YYYY-MM" to the number of days and the number
+            of days with all three temperatures.
+        """
+        cursor.execute('''SELECT substr(sample_date, 1, 7), count(*),
+                                 min(count(min_temp), count(max_temp), count(avg_temp))
+                          FROM weather_data
+                          WHERE station_id = ? AND sample_date >= ?
+                          GROUP BY substr(sample_date, 1, 7)''', (station_id, start_date))
+        return {year_month: (days, value_days)
+                for year_month, days, value_days in cursor.fetchall()}
+
+    def expected_days(self, year_month, today):
+        """Number of days a "YYYY-MM" month has had up to yesterday."""
+        year, month = int(year_month[:4]), int(year_month[5:7])
+        if (year, month) == (today.year, today.month):
+            return today.day - 1
+        return calendar.monthrange(year, month)[1]
+
+    def start_scrape(self, station_id=DEFAULT_STATION_ID):
+        """
+        Start a scrape of a station, or resume the one which was interrupted.
+        Returns:
+            The latest date the scrape goes back to, and the set of
+            (year, month) pairs an interrupted scrape already saved.
+        """
+        try:
+            with DBCM(self.db_name, self.pooled) as cursor:
+                cursor.execute('SELECT latest_date FROM scrape_runs WHERE station_id = ?',
+                               (station_id,))
+                run = cursor.fetchone()
+                if run is not None:
+                    cursor.execute('SELECT year, month FROM scrape_progress WHERE station_id = ?',
+                                   (station_id,))
+                    return run[0], set(cursor.fetchall())
+                latest_date = self.latest_sample_date(cursor, station_id)
+                cursor.execute('INSERT INTO scrape_runs (station_id, latest_date) VALUES (?, ?)',
+                               (station_id, latest_date))
+                return latest_date, set()
+        except Exception as start_error:
+            print(f"Error starting the scrape of station {station_id}: {start_error}")
+            return self.get_lastest_date(station_id), set()
+
+    def save_batch(self, weather, year_months, station_id=DEFAULT_STATION_ID):
+        """
+        Save a batch of scraped months and record them as done in one
+        transaction, so an interrupted scrape resumes after the last batch.
+        Args:
+            weather: A dictionary of date to daily temperatures.
+            year_months: The (year, month) pairs to record as done.
+        """
+        try:
+            with DBCM(self.db_name, self.pooled) as cursor:
+                if weather:
+                    self.insert_weather(cursor, weather, station_id)
+                cursor.executemany('''INSERT OR IGNORE INTO scrape_progress
+                                      (station_id, year, month) VALUES (?, ?, ?)''',
+                                   [(station_id, year, month) for year, month in year_months])
+        except Exception as save_error:
+            print(f"Error saving data to the database: {save_error}")
+
+    def finish_scrape(self, station_id=DEFAULT_STATION_ID):
+        """
+        Forget the progress of a finished scrape.
+        """
+        try:
+            with DBCM(self.db_name, self.pooled) as cursor:
+                cursor.execute('DELETE FROM scrape_progress WHERE station_id = ?', (station_id,))
+                cursor.execute('DELETE FROM scrape_runs WHERE station_id = ?', (station_id,))
+        except Exception as finish_error:
+            print(f"Error finishing the scrape of station {station_id}: {finish_error}")
+
+    def purge_data(self, station_id=None):
         """
-        Delete all data from the database.
+        Delete the data of one station, or of all stations if none is given.
         """
         try:
-            with DBCM(self.db_name) as cursor:
-                cursor.execute('DELETE FROM weather_data')
+            with DBCM(self.db_name, self.pooled) as cursor:
+                for table in ('weather_data', 'monthly_stats', 'scrape_runs', 'scrape_progress'):
+                    if station_id is None:
+                        cursor.execute(f'DELETE FROM {table}')
+                    else:
+                        cursor.execute(f'DELETE FROM {table} WHERE station_id = ?', (station_id,))
+                # Versions are bumped rather than deleted, so they never repeat.
+                version = self.next_data_version(cursor)
+                if station_id is None:
+                    cursor.execute('UPDATE data_versions SET version = ?', (version,))
+                else:
+                    cursor.execute('UPDATE data_versions SET version = ? WHERE station_id = ?',
+                                   (version, station_id))
         except Exception as purge_error:
             print(f"Error purging data from the database: {purge_error}")
 
-    def fetch_data(self):
+    def refresh_monthly_stats(self, cursor, station_id, year_months):
+        """
+        Recompute the monthly aggregates of the given (year, month) pairs of
+        a station from their daily rows, inside the caller's transaction.
+        """
+        for year, month in year_months:
+            year_month = f"{year:04d}-{month:02d}"
+            cursor.execute('''SELECT avg_temp FROM weather_data
+                              WHERE station_id = ? AND sample_date BETWEEN ? AND ?''',
+                           (station_id, f"{year_month}-01", f"{year_month}-31"))
+            mean_temps = [row[0] for row in cursor.fetchall()]
+            cursor.execute('''INSERT OR REPLACE INTO monthly_stats
+                              (station_id, year, month, day_count, mean_sum,
+                               mean_min, mean_max, mean_sketch)
+                              VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                           (station_id, year, month) + summarize_month(mean_temps))
+
+    def next_data_version(self, cursor):
+        """Get a data version number higher than every one given out."""
+        cursor.execute('SELECT coalesce(max(version), 0) + 1 FROM data_versions')
+        return cursor.fetchone()[0]
+
+    def bump_data_versions(self, cursor, station_id, year_months):
+        """
+        Give the changed (year, month) pairs of a station a new data version.
+        """
+        version = self.next_data_version(cursor)
+        cursor.executemany('''INSERT INTO data_versions (station_id, year, month, version)
+                              VALUES (?, ?, ?, ?)
+                              ON CONFLICT(station_id, year, month)
+                              DO UPDATE SET version = excluded.version''',
+                           [(station_id, year, month, version) for year, month in year_months])
+
+    def get_data_version(self, start_date=None, end_date=None, station_id=DEFAULT_STATION_ID):
+        """
+        Retrieve the data version of a station between two optional
+        "YYYY-MM-DD" dates. It changes whenever a day in the range is saved
+        or purged, so it can key caches of results computed from the range.
+        Returns:
+            The version number, 0 if the range never had data.
+        """
+        start_date = start_date or "0001-01-01"
+        end_date = end_date or "9999-12-31"
+        try:
+            with DBCM(self.db_name, self.pooled) as cursor:
+                cursor.execute('''SELECT coalesce(max(version), 0) FROM data_versions
+                                  WHERE station_id = ? AND year * 100 + month BETWEEN ? AND ?''',
+                               (station_id, int(start_date[:4]) * 100 + int(start_date[5:7]),
+                                int(end_date[:4]) * 100 + int(end_date[5:7])))
+                return cursor.fetchone()[0]
+        except Exception as version_error:
+            print(f"Error retrieving the data version: {version_error}")
+            return None
+
+    def get_database_version(self):
+        """
+        Retrieve the highest data version of all stations. It changes
+        whenever any day is saved or purged.
+        Returns:
+            The version number, or None if it could not be read.
+        """
+        try:
+            with DBCM(self.db_name, self.pooled) as cursor:
+                cursor.execute('SELECT coalesce(max(version), 0) FROM data_versions')
+                return cursor.fetchone()[0]
+        except Exception as version_error:
+            print(f"Error retrieving the data version: {version_error}")
+            return None
+
+    def rebuild_monthly_stats(self, cursor):
+        """
+        Recompute every monthly aggregate from the daily rows.
+        """
+        cursor.execute('DELETE FROM monthly_stats')
+        cursor.execute('''SELECT DISTINCT station_id,
+                                 CAST(substr(sample_date, 1, 4) AS INTEGER),
+                                 CAST(substr(sample_date, 6, 2) AS INTEGER)
+                          FROM weather_data''')
+        months_by_station = {}
+        for station_id, year, month in cursor.fetchall():
+            months_by_station.setdefault(station_id, []).append((year, month))
+        for station_id, year_months in months_by_station.items():
+            self.refresh_monthly_stats(cursor, station_id, year_months)
+
+    def fetch_monthly_stats(self, start_year, end_year, station_id=DEFAULT_STATION_ID):
+        """
+        Retrieve the monthly aggregates of a station within a year range.
+        Returns:
+            A MonthlyStats, with no rows if the read failed.
+        """
+        try:
+            with DBCM(self.db_name, self.pooled) as cursor:
+                cursor.execute('''SELECT year, month, day_count, mean_sum, mean_min,
+                                         mean_max, mean_sketch
+                                  FROM monthly_stats
+                                  WHERE station_id = ? AND year BETWEEN ? AND ?
+                                  ORDER BY year, month''',
+                               (station_id, int(start_year), int(end_year)))
+                return MonthlyStats(cursor.fetchall())
+        except Exception as fetch_error:
+            print(f"Error fetching monthly statistics from the database: {fetch_error}")
+            return MonthlyStats([])
+
+    def fetch_data(self, station_id=DEFAULT_STATION_ID):
+        """
+        Retrieve data of a station for plotting.
+        Returns:
+            A dictionary of date to daily temperatures.
+        """
+        return self.fetch_range(station_id=station_id)
+
+    def fetch_range(self, start_date=None, end_date=None, station_id=DEFAULT_STATION_ID,
+                    columns=("Min", "Max", "Mean")):
         """
-        Retrieve data for plotting.
+        Retrieve the data of a station between two dates, filtered in SQL
+        with the (station_id, sample_date) index.
+        Args:
+            start_date: First date in "YYYY-MM-DD" format, or None for no bound.
+            end_date: Last date in "YYYY-MM-DD" format, or None for no bound.
+            station_id: The station to read.
+            columns: The temperatures to read, any of "Min", "Max" and "Mean".
         Returns:
-            A list of tuples containing DB records.
+            A dictionary of date to the requested daily temperatures.
         """
         weather_data = {}
         try:
-            with DBCM(self.db_name) as cursor:
-                query = 'SELECT '\
-                        'sample_date, location, min_temp, max_temp, avg_temp '\
-                        'FROM weather_data'
-                cursor_data = cursor.execute(query)
-                weather_data = {row[0]: {"Min": row[2], "Max": row[3], "Mean": row[4]}
-                                for row in cursor_data}
+            query, parameters = self.range_query(start_date, end_date, station_id, columns)
+            with DBCM(self.db_name, self.pooled) as cursor:
+                cursor_data = cursor.execute(query, parameters)
+                weather_data = {row[0]: dict(zip(columns, row[1:])) for row in cursor_data}
+                INSTRUMENTATION.count("db.rows_fetched", len(weather_data))
                 return weather_data
         except Exception as fetch_error:
             print(f"Error fetching data from the database: {fetch_error}")
             return weather_data
 
-    def get_lastest_date(self):
+    def fetch_frame(self, start_date=None, end_date=None, station_id=DEFAULT_STATION_ID):
+        """
+        Retrieve the data of a station between two dates as a WeatherFrame.
+        Returns:
+            A WeatherFrame, empty if there is no data or the read failed.
+        """
+        # Imported here so NumPy is only loaded by the callers using frames.
+        from weather_frame import WeatherFrame  # pylint: disable=import-outside-toplevel
+        try:
+            query, parameters = self.range_query(start_date, end_date, station_id,
+                                                 ("Min", "Max", "Mean"))
+            with DBCM(self.db_name, self.pooled) as cursor:
+                rows = cursor.execute(query, parameters).fetchall()
+                INSTRUMENTATION.count("db.rows_fetched", len(rows))
+                return WeatherFrame.from_rows(rows)
+        except Exception as fetch_error:
+            print(f"Error fetching data from the database: {fetch_error}")
+            return WeatherFrame.empty()
+
+    def fetch_chunks(self, station_ids=None, start_date=None, end_date=None,
+                     chunk_rows=100000):
+        """
+        Stream the daily rows of the given or all stations between two
+        optional dates, ordered by station and date, chunk_rows at a time
+        so memory stays bounded however large the table is.
+        Yields:
+            Lists of (station_id, sample_date, max_temp, min_temp, avg_temp) rows.
+        """
+        query = 'SELECT station_id, sample_date, max_temp, min_temp, avg_temp ' \
+                'FROM weather_data WHERE 1 = 1'
+        parameters = []
+        if station_ids:
+            query += f' AND station_id IN ({", ".join("?" * len(station_ids))})'
+            parameters.extend(station_ids)
+        if start_date is not None:
+            query += ' AND sample_date >= ?'
+            parameters.append(start_date)
+        if end_date is not None:
+            query += ' AND sample_date <= ?'
+            parameters.append(end_date)
+        try:
+            with DBCM(self.db_name, self.pooled) as cursor:
+                cursor.execute(query + ' ORDER BY station_id, sample_date', parameters)
+                while True:
+                    rows = cursor.fetchmany(chunk_rows)
+                    if not rows:
+                        return
+                    INSTRUMENTATION.count("db.rows_fetched", len(rows))
+                    try:
+                        yield rows
+                    except GeneratorExit:
+                        # The reader stopped early, which is not an error.
+                        return
+        except Exception as fetch_error:
+            print(f"Error fetching data from the database: {fetch_error}")
+
+    def range_query(self, start_date, end_date, station_id, columns):
+        """
+        Build the SQL and parameters reading columns of a station between
+        two optional dates, in date order.
+        """
+        select_columns = ", ".join(COLUMN_NAMES[column] for column in columns)
+        query = f'SELECT sample_date, {select_columns} FROM weather_data ' \
+                'WHERE station_id = ?'
+        parameters = [station_id]
+        if start_date is not None:
+            query += ' AND sample_date >= ?'
+            parameters.append(start_date)
+        if end_date is not None:
+            query += ' AND sample_date <= ?'
+            parameters.append(end_date)
+        return query + ' ORDER BY sample_date', parameters
+
+    def fetch_years(self, start_year, end_year, station_id=DEFAULT_STATION_ID,
+                    columns=("Min", "Max", "Mean")):
+        """
+        Retrieve the data of a station from the start of start_year to the
+        end of end_year.
+        """
+        return self.fetch_range(f"{int(start_year):04d}-01-01", f"{int(end_year):04d}-12-31",
+                                station_id, columns)
+
+    def fetch_month(self, year, month, station_id=DEFAULT_STATION_ID,
+                    columns=("Min", "Max", "Mean")):
+        """
+        Retrieve the data of a station for one month.
+        """
+        year_month = f"{int(year):04d}-{int(month):02d}"
+        return self.fetch_range(f"{year_month}-01", f"{year_month}-31", station_id, columns)
+
+    def get_lastest_date(self, station_id=DEFAULT_STATION_ID):
         """
-        Retrieve the lastest date of weather data.
+        Retrieve the lastest date of weather data of a station.
         Returns:
             Latest weather date
         """
         latest_weather_date = ""
         try:
-            with DBCM(self.db_name) as cursor:
-                query = 'SELECT max(sample_date) FROM weather_data'
-                cursor.execute(query)
-                latest_weather_date = cursor.fetchone()[0]
+            with DBCM(self.db_name, self.pooled) as cursor:
+                latest_weather_date = self.latest_sample_date(cursor, station_id)
                 return latest_weather_date
         except Exception as latest_date_error:
             print(f"Error retrieving the latest date: {latest_date_error}")
@@ -9,14 +9,101 @@
 """This module used to manage database connection,
         and cursor. which allow other function to use it by
         context management."""
+import atexit
+import os
 import sqlite3
+import threading
+from instrumentation import INSTRUMENTATION
+
+# Pragmas applied to every pooled connection. WAL lets the plots read while
+# a scraper in another process is writing.
+CONNECTION_PRAGMAS = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("cache_size", -16000),
+    ("mmap_size", 256 * 1024 * 1024),
+    ("busy_timeout", 10000),
+    ("temp_store", "MEMORY"),
+)
+
+
+def file_inode(path):
+    """The inode of a file, or None if it does not exist."""
+    try:
+        return os.stat(path).st_ino
+    except OSError:
+        return None
+
+
+class ConnectionPool:
+    """ Class for keep database connections open and reuse them. A
+        connection is kept for each database, thread and process, as
+        sqlite3 connections must not be shared between them."""
+    def __init__(self):
+        """ Constructor for initialize the pool."""
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.connections = []
+
+    def connect(self, db_name):
+        """
+        Get the open connection of this thread to the database.
+        Returns:
+            A sqlite3 connection with the pool pragmas applied.
+        """
+        pid = os.getpid()
+        if getattr(self.local, "pid", None) != pid:
+            # A forked process must not reuse the connections of its parent.
+            self.local.pid = pid
+            self.local.connections = {}
+        db_conn, inode = self.local.connections.get(db_name, (None, None))
+        if db_conn is not None and inode != file_inode(db_name):
+            # The file was deleted or replaced, the connection still has the old one.
+            self.discard(db_conn)
+            db_conn = None
+        if db_conn is None:
+            db_conn = sqlite3.connect(db_name)
+            for pragma, value in CONNECTION_PRAGMAS:
+                db_conn.execute(f"PRAGMA {pragma} = {value}")
+            self.local.connections[db_name] = (db_conn, file_inode(db_name))
+            with self.lock:
+                self.connections.append((pid, db_conn))
+        return db_conn
+
+    def discard(self, db_conn):
+        """Close a connection of this thread and forget it."""
+        with self.lock:
+            self.connections = [(owner_pid, connection) for owner_pid, connection
+                                in self.connections if connection is not db_conn]
+        db_conn.close()
+
+    def close_all(self):
+        """Close every connection this process opened."""
+        pid = os.getpid()
+        with self.lock:
+            for owner_pid, db_conn in self.connections:
+                if owner_pid == pid:
+                    try:
+                        db_conn.close()
+                    except sqlite3.ProgrammingError:
+                        # Connections of other threads can only be closed by them.
+                        pass
+            self.connections = []
+        self.local.connections = {}
+
+
+POOL = ConnectionPool()
+atexit.register(POOL.close_all)
 
 class DBCM:
     """ Class for manage database connection and cursor, allow
         use it by context management."""
-    def __init__(self, db_name):
-        """ Consturctor for initialize the database name."""
+    def __init__(self, db_name, pooled=True):
+        """ Consturctor for initialize the database name. A pooled
+            connection stays open for the next use, otherwise a new
+            connection is opened and closed each time."""
         self.db_name = db_name
+        self.pooled = pooled
 
     def __enter__(self):
         """
@@ -24,13 +111,20 @@ class DBCM:
         Returns:
             A cursor for executing database operations.
         """
-        self.db_conn = sqlite3.connect(self.db_name)
+        self.span = INSTRUMENTATION.span("db.transaction")
+        self.span.__enter__()
+        if self.pooled:
+            self.db_conn = POOL.connect(self.db_name)
+        else:
+            self.db_conn = sqlite3.connect(self.db_name)
         self.db_cursor = self.db_conn.cursor()
         return self.db_cursor
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         """
-        Exit the context manager, committing changes and closing the connection.
+        Exit the context manager, committing the changes, or rolling them
+        all back if the block raised, and closing the cursor. The
+        connection is closed too unless it is pooled.
         Args:
             exc_type: Type of exception (if any).
             exc_val: Exception value (if any).
@@ -38,9 +132,21 @@ class DBCM:
         """
         if exc_type is not None:
             print(f"An error occurred: {exc_type}: {exc_val}")
-        try:
-            self.db_conn.commit()
-        except Exception as commit_error:
-            print(f"Error while committing changes: {commit_error}")
+            try:
+                self.db_conn.rollback()
+            except Exception as rollback_error:
+                print(f"Error while rolling back changes: {rollback_error}")
+        else:
+            try:
+                self.db_conn.commit()
+            except Exception as commit_error:
+                print(f"Error while committing changes: {commit_error}")
+                # Leave a pooled connection outside the failed transaction.
+                try:
+                    self.db_conn.rollback()
+                except Exception:  # pylint: disable=broad-except
+                    pass
         self.db_cursor.close()
-        self.db_conn.close()
+        if not self.pooled:
+            self.db_conn.close()
+        self.span.__exit__(exc_type, exc_val, exc_tb)
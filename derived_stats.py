@@ -0,0 +1,179 @@
+#################################################################
+# Description: Project - Derived statistics
+# Usage: This module compute rolling means, anomalies against a
+#        climatological baseline, heating and cooling degree days
+#        and yearly extremes over whole arrays of a WeatherFrame.
+#        Baselines are computed once per station data version.
+#################################################################
+"""This module compute rolling means, anomalies against a climatological
+   baseline, heating and cooling degree days and yearly extremes over
+   whole arrays of a WeatherFrame. Baselines are computed once per
+   station data version."""
+from collections import OrderedDict
+import numpy as np
+
+# Index of February 29 in the 366 day calendar the baselines use.
+LEAP_DAY = 59
+# Baselines kept by (station key, years, smoothing), least recently used dropped.
+BASELINE_CACHE = OrderedDict()
+BASELINE_CACHE_SIZE = 64
+
+
+def calendar_days(days):
+    """
+    Map days since 1970-01-01 to a 0-365 day of a leap year, so that a
+    date falls on the same index every year.
+    """
+    dates = np.asarray(days).astype("datetime64[D]")
+    year_starts = dates.astype("datetime64[Y]")
+    day_of_year = (dates - year_starts.astype("datetime64[D]")).astype(np.int32)
+    years = year_starts.astype(np.int32) + 1970
+    leap = (years % 4 == 0) & ((years % 100 != 0) | (years % 400 == 0))
+    return day_of_year + ((~leap) & (day_of_year >= LEAP_DAY))
+
+
+class DerivedStats:
+    """ Class for compute statistics derived from the daily data of one
+        station. The frame should hold the whole history, rolling means and
+        baselines look at the days around and the years before a day.
+        baseline_key identifies the station and its data version, for
+        example (db_name, station_id, data_version), so the baselines are
+        shared by every instance built from the same data."""
+    def __init__(self, frame, baseline_key=None):
+        """ Constructor - initiate with a WeatherFrame."""
+        self.frame = frame.sorted()
+        self.baseline_key = baseline_key
+        self.baselines = {}
+
+    def column(self, name):
+        """The temperatures of "mean", "max" or "min" as float64."""
+        return getattr(self.frame, f"{name}_temps").astype(np.float64)
+
+    def rolling_mean(self, window=30, column="mean", min_days=None):
+        """
+        Average each day with the window - 1 calendar days before it.
+        Missing days are skipped, a day with fewer than min_days values in
+        its window, half the window by default, is NaN.
+        Returns:
+            A float64 array aligned with the days of the frame.
+        """
+        if not len(self.frame):
+            return np.empty(0)
+        min_days = min_days or (window + 1) // 2
+        offsets = self.frame.days - self.frame.days[0]
+        values = self.column(column)
+        valid = ~np.isnan(values)
+        # Running sums over the dense calendar, so missing days take no work.
+        sums = np.zeros(offsets[-1] + 2)
+        counts = np.zeros(offsets[-1] + 2)
+        sums[offsets[valid] + 1] = values[valid]
+        counts[offsets[valid] + 1] = 1
+        sums, counts = np.cumsum(sums), np.cumsum(counts)
+        window_starts = np.maximum(offsets + 1 - window, 0)
+        window_sums = sums[offsets + 1] - sums[window_starts]
+        window_counts = counts[offsets + 1] - counts[window_starts]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(window_counts >= min_days, window_sums / window_counts, np.nan)
+
+    def baseline(self, start_year=None, end_year=None, smooth_days=15):
+        """
+        Compute the climatological mean of every calendar day over the
+        baseline years, all years by default, smoothed over smooth_days.
+        The result is memoized.
+        Returns:
+            A float64 array of 366 values, January 1 first and February 29
+            at index 59.
+        """
+        key = (start_year, end_year, smooth_days)
+        if key in self.baselines:
+            return self.baselines[key]
+        shared_key = None if self.baseline_key is None else (self.baseline_key,) + key
+        if shared_key in BASELINE_CACHE:
+            BASELINE_CACHE.move_to_end(shared_key)
+            self.baselines[key] = BASELINE_CACHE[shared_key]
+            return self.baselines[key]
+
+        frame = self.frame
+        if start_year is not None or end_year is not None:
+            frame = frame.year_slice(start_year or 1, end_year or 9999)
+        values = frame.mean_temps.astype(np.float64)
+        valid = ~np.isnan(values)
+        index = calendar_days(frame.days[valid])
+        sums = np.bincount(index, weights=values[valid], minlength=366)
+        counts = np.bincount(index, minlength=366).astype(np.float64)
+        if smooth_days > 1:
+            # Circular moving sums, December runs into January.
+            kernel = np.ones(smooth_days)
+            half = smooth_days // 2
+            sums = np.convolve(np.concatenate((sums[-half:], sums, sums[:half])), kernel,
+                               "valid")[:366]
+            counts = np.convolve(np.concatenate((counts[-half:], counts, counts[:half])),
+                                 kernel, "valid")[:366]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            baseline = np.where(counts > 0, sums / counts, np.nan)
+
+        self.baselines[key] = baseline
+        if shared_key is not None:
+            BASELINE_CACHE[shared_key] = baseline
+            while len(BASELINE_CACHE) > BASELINE_CACHE_SIZE:
+                BASELINE_CACHE.popitem(last=False)
+        return baseline
+
+    def normals(self, start_year=None, end_year=None, smooth_days=15):
+        """The baseline value of every day of the frame."""
+        return self.baseline(start_year, end_year, smooth_days)[calendar_days(self.frame.days)]
+
+    def anomalies(self, start_year=None, end_year=None, smooth_days=15):
+        """
+        Difference of every daily mean from the baseline of its calendar day.
+        Returns:
+            A float64 array aligned with the days of the frame.
+        """
+        return self.column("mean") - self.normals(start_year, end_year, smooth_days)
+
+    def year_groups(self):
+        """The years of the frame and the index where each one starts."""
+        years = self.frame.years()
+        starts = np.flatnonzero(np.diff(years, prepend=years[0] - 1))
+        return years[starts], starts
+
+    def degree_days(self, base=18.0):
+        """
+        Sum the heating and cooling degree days of every year, from the
+        daily means against base degrees. Days without a mean count as 0.
+        Returns:
+            Arrays of the years, heating degree days and cooling degree days.
+        """
+        if not len(self.frame):
+            return np.empty(0, np.int32), np.empty(0), np.empty(0)
+        years, starts = self.year_groups()
+        means = self.column("mean")
+        heating = np.nan_to_num(np.maximum(base - means, 0.0))
+        cooling = np.nan_to_num(np.maximum(means - base, 0.0))
+        return years, np.add.reduceat(heating, starts), np.add.reduceat(cooling, starts)
+
+    def yearly_extremes(self):
+        """
+        Find the highest maximum and lowest minimum of every year.
+        Returns:
+            A dictionary of arrays "year", "max_temp", "max_day", "min_temp"
+            and "min_day", days since 1970-01-01, NaN and -1 for a year
+            without values.
+        """
+        if not len(self.frame):
+            empty = np.empty(0)
+            return {"year": np.empty(0, np.int32), "max_temp": empty, "max_day": empty,
+                    "min_temp": empty, "min_day": empty}
+        years, starts = self.year_groups()
+        all_years = self.frame.years()
+        extremes = {"year": years}
+        for name, values in (("max", self.column("max")), ("min", -self.column("min"))):
+            values = np.where(np.isnan(values), -np.inf, values)
+            # Within each year, the highest value sorts first.
+            order = np.lexsort((-values, all_years))
+            best = order[starts]
+            found = np.isfinite(values[best])
+            temps = values[best] if name == "max" else -values[best]
+            extremes[f"{name}_temp"] = np.where(found, temps, np.nan)
+            extremes[f"{name}_day"] = np.where(found, self.frame.days[best], -1)
+        return extremes
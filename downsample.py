@@ -0,0 +1,93 @@
+#################################################################
+# Description: Project - Line plot downsampling
+# Usage: This module reduce a long daily series to about as many
+#        points as a plot has pixels across, keeping the lowest and
+#        highest value of every bucket so peaks and troughs stay
+#        visible. The buckets of every zoom level are computed once
+#        per station data version.
+#################################################################
+"""This module reduce a long daily series to about as many points as a
+   plot has pixels across, keeping the lowest and highest value of every
+   bucket so peaks and troughs stay visible. The buckets of every zoom
+   level are computed once per station data version."""
+from collections import OrderedDict
+import numpy as np
+
+# Pyramids kept by (station key, column), least recently used dropped.
+PYRAMID_CACHE = OrderedDict()
+PYRAMID_CACHE_SIZE = 16
+
+
+class MinMaxPyramid:
+    """ Class for hold the min/max buckets of a daily series at every zoom
+        level. Level k has a bucket for every 2**k days from the first day,
+        with the lowest and highest value in it and the days they fell on,
+        each level built from pairs of buckets of the level below. A range
+        is drawn from the finest level with no more buckets than pixels,
+        two points per bucket."""
+    def __init__(self, days, values):
+        """ Constructor - initiate with the sorted day numbers and their
+            values, NaN for missing values."""
+        self.first_day = int(days[0]) if len(days) else 0
+        dense = np.full(int(days[-1]) - self.first_day + 1 if len(days) else 0, np.nan)
+        dense[np.asarray(days) - self.first_day] = values
+        dense_days = np.arange(self.first_day, self.first_day + len(dense), dtype=np.int32)
+        self.levels = [(dense, dense, dense_days, dense_days)]
+        while len(self.levels[-1][0]) > 1:
+            self.levels.append(self.coarser(*self.levels[-1]))
+
+    @staticmethod
+    def coarser(lows, highs, low_days, high_days):
+        """Merge the buckets of a level in pairs."""
+        if len(lows) % 2:
+            lows, highs = np.append(lows, np.nan), np.append(highs, np.nan)
+            low_days, high_days = np.append(low_days, -1), np.append(high_days, -1)
+        # NaN compares False, so a missing value never wins a bucket.
+        first_low = (lows[0::2] <= lows[1::2]) | np.isnan(lows[1::2])
+        first_high = (highs[0::2] >= highs[1::2]) | np.isnan(highs[1::2])
+        return (np.where(first_low, lows[0::2], lows[1::2]),
+                np.where(first_high, highs[0::2], highs[1::2]),
+                np.where(first_low, low_days[0::2], low_days[1::2]),
+                np.where(first_high, high_days[0::2], high_days[1::2]))
+
+    def points(self, start_day, end_day, width):
+        """
+        Pick the points of a plot from start_day to end_day which is width
+        pixels across.
+        Returns:
+            The day numbers and values of the points, in day order.
+        """
+        start = max(int(start_day) - self.first_day, 0)
+        end = min(int(end_day) - self.first_day, len(self.levels[0][0]) - 1)
+        if end < start:
+            return np.empty(0, np.int32), np.empty(0)
+        level = 0
+        while level + 1 < len(self.levels) and (end >> level) - (start >> level) + 1 > width:
+            level += 1
+        lows, highs, low_days, high_days = (column[start >> level:(end >> level) + 1]
+                                            for column in self.levels[level])
+        if level == 0:
+            found = ~np.isnan(lows)
+            return low_days[found], lows[found]
+        days = np.concatenate((low_days, high_days))
+        values = np.concatenate((lows, highs))
+        # A bucket whose low and high fall on the same day gives one point.
+        found = ~np.isnan(values) & (days >= start_day) & (days <= end_day)
+        days, unique = np.unique(days[found], return_index=True)
+        return days, values[found][unique]
+
+
+def pyramid(days, values, key=None):
+    """
+    Get the MinMaxPyramid of a daily series, built once for a key such as
+    (db_name, station_id, data_version, "mean").
+    """
+    if key is None:
+        return MinMaxPyramid(days, values)
+    if key in PYRAMID_CACHE:
+        PYRAMID_CACHE.move_to_end(key)
+        return PYRAMID_CACHE[key]
+    PYRAMID_CACHE[key] = MinMaxPyramid(days, values)
+    while len(PYRAMID_CACHE) > PYRAMID_CACHE_SIZE:
+        PYRAMID_CACHE.popitem(last=False)
+    return PYRAMID_CACHE[key]
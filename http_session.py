@@ -0,0 +1,230 @@
+#################################################################
+# Description: Project - Scraping - HTTP session
+# Usage: This module keep the connections of the scraper alive
+#        between requests, one per host while the requests are
+#        sequential, ask for gzip pages and decompress them as they
+#        stream in, and retry transient failures with backoff.
+#################################################################
+"""This module keep the connections of the scraper alive between
+   requests, ask for gzip pages and decompress them as they stream in,
+   and retry transient failures with backoff."""
+import http.client
+import threading
+import time
+import urllib.error
+import zlib
+from urllib.parse import urljoin, urlsplit
+from instrumentation import INSTRUMENTATION
+
+# Statuses worth asking again after a pause.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+MAX_REDIRECTS = 5
+# A reused connection the server has already closed fails with one of these.
+STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError,
+                           BrokenPipeError, http.client.CannotSendRequest)
+
+
+class SessionResponse:
+    """ Class for read the body of one response, decompressed if it came
+        gzip encoded. The connection goes back to its session when the body
+        has been read to the end and the response is closed."""
+    def __init__(self, session, host_key, connection, response, url):
+        """ Constructor - initiate with the http.client response."""
+        self.session = session
+        self.host_key = host_key
+        self.connection = connection
+        self.response = response
+        self.url = url
+        self.status = response.status
+        self.reason = response.reason
+        self.headers = response.headers
+        encoding = response.headers.get("Content-Encoding", "").lower()
+        # wbits 16 + MAX_WBITS reads the gzip header and trailer.
+        self.decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) \
+            if encoding in ("gzip", "x-gzip") else None
+
+    def read(self, amount=None):
+        """
+        Read up to amount bytes of the decoded body, all of it if None. A
+        connection lost or a corrupt body raises urllib.error.URLError, like
+        a failed request.
+        Returns:
+            The bytes, empty only at the end of the body.
+        """
+        if self.response is None:
+            return b""
+        while True:
+            try:
+                raw = self.response.read(amount) if amount else self.response.read()
+                self.session.count("wire_bytes", len(raw))
+                if self.decompressor is None:
+                    body = raw
+                elif raw:
+                    body = self.decompressor.decompress(raw)
+                else:
+                    body = self.decompressor.flush()
+            except (OSError, http.client.HTTPException, zlib.error) as read_error:
+                self.session.count("failures")
+                raise urllib.error.URLError(read_error) from read_error
+            self.session.count("body_bytes", len(body))
+            # A small compressed chunk may not finish a decoded byte yet.
+            if body or not raw:
+                return body
+
+    def close(self):
+        """Give the connection back to the session, or close it if the body was not read."""
+        if self.response is None:
+            return
+        if self.response.isclosed() and not self.response.will_close:
+            self.session.release(self.host_key, self.connection)
+        else:
+            self.response.close()
+            self.connection.close()
+        self.response = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class HttpSession:
+    """ Class for send the GET requests of a scraper over kept-alive
+        connections. Idle connections are kept per host, so sequential
+        requests reuse one connection and parallel ones at most as many as
+        are in flight. Failures raise urllib.error.HTTPError and URLError
+        like urllib.request.urlopen, after the retries."""
+    def __init__(self, retries=3, backoff=0.5, timeout=30, max_idle_per_host=8):
+        """ Constructor - initiate with the number of retries of a request
+            and the first pause between them in seconds, doubled each time."""
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.max_idle_per_host = max_idle_per_host
+        self.headers = {"Accept-Encoding": "gzip", "Connection": "keep-alive",
+                        "User-Agent": "PythonWeatherProcessing"}
+        self.idle = {}
+        self.lock = threading.Lock()
+        self.counters = {"requests": 0, "connections": 0, "reused": 0, "retries": 0,
+                         "failures": 0, "wire_bytes": 0, "body_bytes": 0}
+
+    def get(self, url, headers=None):
+        """
+        Send a GET request, following redirects and retrying connection
+        errors and the statuses of RETRY_STATUSES.
+        Returns:
+            A SessionResponse with status 200-299, to be closed by the caller.
+        """
+        for _ in range(MAX_REDIRECTS + 1):
+            response = self.get_with_retries(url, headers)
+            if response.status not in REDIRECT_STATUSES or not response.headers.get("Location"):
+                break
+            response.read()
+            response.close()
+            url = urljoin(url, response.headers["Location"])
+        if response.status >= 300:
+            response.read()
+            response.close()
+            self.count("failures")
+            raise urllib.error.HTTPError(url, response.status, response.reason,
+                                         response.headers, None)
+        return response
+
+    def get_with_retries(self, url, headers=None):
+        """Send one GET request, pausing and sending it again while it fails transiently."""
+        attempt = 0
+        while True:
+            pause = self.backoff * 2 ** attempt
+            try:
+                response = self.send(url, headers)
+            except (OSError, http.client.HTTPException) as send_error:
+                if attempt == self.retries:
+                    self.count("failures")
+                    raise urllib.error.URLError(send_error) from send_error
+            else:
+                if response.status not in RETRY_STATUSES or attempt == self.retries:
+                    return response
+                retry_after = response.headers.get("Retry-After", "")
+                if retry_after.isdigit():
+                    pause = int(retry_after)
+                response.read()
+                response.close()
+            self.count("retries")
+            time.sleep(pause)
+            attempt += 1
+
+    def send(self, url, headers=None):
+        """
+        Send one GET request over an idle connection of the host, or a new
+        one. A kept-alive connection the server has closed meanwhile is
+        replaced without counting as a retry.
+        """
+        parts = urlsplit(url)
+        host_key = (parts.scheme, parts.netloc)
+        path = parts.path or "/"
+        if parts.query:
+            path += f"?{parts.query}"
+        request_headers = dict(self.headers, **(headers or {}))
+        while True:
+            connection, reused = self.acquire(host_key)
+            try:
+                connection.request("GET", path, headers=request_headers)
+                response = connection.getresponse()
+            except STALE_CONNECTION_ERRORS:
+                connection.close()
+                if reused:
+                    continue
+                raise
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                raise
+            self.count("requests")
+            if reused:
+                self.count("reused")
+            return SessionResponse(self, host_key, connection, response, url)
+
+    def acquire(self, host_key):
+        """
+        Take an idle connection of a host, or open a new one.
+        Returns:
+            The connection and True if it was used before.
+        """
+        with self.lock:
+            idle = self.idle.get(host_key)
+            if idle:
+                return idle.pop(), True
+        scheme, netloc = host_key
+        connection_class = http.client.HTTPSConnection if scheme == "https" \
+            else http.client.HTTPConnection
+        self.count("connections")
+        return connection_class(netloc, timeout=self.timeout), False
+
+    def release(self, host_key, connection):
+        """Keep a connection whose response was read to the end for the next request."""
+        with self.lock:
+            idle = self.idle.setdefault(host_key, [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def count(self, counter, amount=1):
+        """Add to a counter of this session and its "http." instrumentation counter."""
+        with self.lock:
+            self.counters[counter] += amount
+        INSTRUMENTATION.count(f"http.{counter}", amount)
+
+    def stats(self):
+        """Request, connection and byte counts of this session."""
+        with self.lock:
+            return dict(self.counters)
+
+    def close(self):
+        """Close every idle connection."""
+        with self.lock:
+            idle, self.idle = self.idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
@@ -0,0 +1,188 @@
+#################################################################
+# Description: Project - Instrumentation
+# Usage: This module record how long the scrape, parse, database
+#        and plot stages take, with counters of requests, bytes and
+#        rows. It is off unless WEATHER_PROFILE is set to "json" or
+#        "cprofile", or --profile is given to weather_processor.py.
+#################################################################
+"""This module record how long the scrape, parse, database and plot stages
+   take, with counters of requests, bytes and rows. It is off unless
+   WEATHER_PROFILE is set to "json" or "cprofile"."""
+import cProfile
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+from datetime import datetime
+
+PROFILE_MODES = ("json", "cprofile")
+PROFILE_ENV = "WEATHER_PROFILE"
+PROFILE_DIR_ENV = "WEATHER_PROFILE_DIR"
+
+# Returned by span() while disabled, so an instrumented block costs one call.
+NO_SPAN = nullcontext()
+
+
+class Span:
+    """ Class for time one block of a stage and record it on exit."""
+    def __init__(self, instrumentation, name):
+        """ Constructor for initialize the span name."""
+        self.instrumentation = instrumentation
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.instrumentation.record(self.name, time.perf_counter() - self.start)
+
+
+class Instrumentation:
+    """ Class for collect the spans and counters of this process. Spans
+        are kept as count, total and slowest seconds per name."""
+    def __init__(self, mode=None, profile_dir="profiles"):
+        """ Constructor for initialize the mode, None when disabled."""
+        self.mode = None
+        self.enabled = False
+        self.profile_dir = profile_dir
+        self.lock = threading.Lock()
+        self.spans = {}
+        self.counters = {}
+        self.enable(mode)
+
+    @classmethod
+    def from_environment(cls):
+        """Create the instrumentation configured by the environment."""
+        return cls(os.environ.get(PROFILE_ENV) or None,
+                   os.environ.get(PROFILE_DIR_ENV, "profiles"))
+
+    def enable(self, mode, profile_dir=None):
+        """
+        Turn the instrumentation on with mode "json" or "cprofile", or off
+        with None. The environment is updated too, so worker processes
+        started afterwards record their stages as well.
+        """
+        if mode == "1":
+            mode = "json"
+        if mode is not None and mode not in PROFILE_MODES:
+            print(f"Unknown profile mode {mode}, use one of {', '.join(PROFILE_MODES)}.")
+            mode = None
+        self.mode = mode
+        self.enabled = mode is not None
+        if profile_dir is not None:
+            self.profile_dir = profile_dir
+        if self.enabled:
+            os.environ[PROFILE_ENV] = mode
+            os.environ[PROFILE_DIR_ENV] = self.profile_dir
+        else:
+            os.environ.pop(PROFILE_ENV, None)
+
+    def span(self, name):
+        """Time a block of code with a with statement."""
+        if not self.enabled:
+            return NO_SPAN
+        return Span(self, name)
+
+    def record(self, name, seconds):
+        """Add one timing to a span."""
+        with self.lock:
+            span = self.spans.get(name)
+            if span is None:
+                self.spans[name] = [1, seconds, seconds]
+            else:
+                span[0] += 1
+                span[1] += seconds
+                span[2] = max(span[2], seconds)
+
+    def count(self, name, amount=1):
+        """Add amount to a counter."""
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def summary(self):
+        """
+        Summarize the spans and counters recorded so far.
+        Returns:
+            A dictionary of "spans" and "counters", ready for JSON.
+        """
+        with self.lock:
+            spans = {name: {"count": count, "seconds": total, "max_seconds": slowest,
+                            "mean_seconds": total / count}
+                     for name, (count, total, slowest) in sorted(self.spans.items())}
+            return {"spans": spans, "counters": dict(sorted(self.counters.items()))}
+
+    def take(self):
+        """Return the summary and start recording afresh, for worker processes."""
+        summary = self.summary()
+        self.reset()
+        return summary
+
+    def merge(self, summary):
+        """Add the summary of a worker process to the spans and counters here."""
+        if not self.enabled or not summary:
+            return
+        with self.lock:
+            for name, span in summary["spans"].items():
+                own_span = self.spans.setdefault(name, [0, 0.0, 0.0])
+                own_span[0] += span["count"]
+                own_span[1] += span["seconds"]
+                own_span[2] = max(own_span[2], span["max_seconds"])
+            for name, value in summary["counters"].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def reset(self):
+        """Forget the spans and counters recorded so far."""
+        with self.lock:
+            self.spans = {}
+            self.counters = {}
+
+    def profiled(self, action_name, action):
+        """
+        Wrap a function so each call writes its summary to the profile
+        directory, plus a cProfile file in "cprofile" mode. The function is
+        returned as it is while disabled.
+        """
+        if not self.enabled:
+            return action
+
+        def profiled_action(*args, **kwargs):
+            self.reset()
+            profiler = cProfile.Profile() if self.mode == "cprofile" else None
+            start = time.perf_counter()
+            try:
+                if profiler is not None:
+                    return profiler.runcall(action, *args, **kwargs)
+                return action(*args, **kwargs)
+            finally:
+                self.record(action_name, time.perf_counter() - start)
+                self.write_profile(action_name, profiler)
+        return profiled_action
+
+    def write_profile(self, action_name, profiler=None):
+        """
+        Write the summary, and the cProfile statistics if given, to the
+        profile directory.
+        Returns:
+            The path of the JSON summary, or None if it could not be written.
+        """
+        stem = os.path.join(self.profile_dir,
+                            f"{action_name}-{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}")
+        try:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            with open(f"{stem}.json", "w", encoding="utf-8") as summary_file:
+                json.dump(self.summary(), summary_file, indent=2)
+            if profiler is not None:
+                profiler.dump_stats(f"{stem}.prof")
+        except OSError as write_error:
+            print(f"Error writing the profile of {action_name}: {write_error}")
+            return None
+        print(f"Profile of {action_name} written to {stem}.json")
+        return f"{stem}.json"
+
+
+INSTRUMENTATION = Instrumentation.from_environment()
@@ -0,0 +1,108 @@
+#################################################################
+# Description: Project - Monthly aggregates
+# Usage: This module summarize the mean temperatures of a month
+#        into a small aggregate row, and merge those rows back
+#        into the statistics matplotlib needs to draw box plots.
+#################################################################
+"""This module summarize the mean temperatures of a month into a small
+   aggregate row, and merge those rows back into the statistics
+   matplotlib needs to draw box plots."""
+import json
+from collections import Counter
+
+
+def summarize_month(mean_temps):
+    """
+    Summarize the mean temperatures of one month, None values are skipped.
+    The sketch counts every distinct value, which is exact and small as
+    the temperatures have one decimal.
+    Returns:
+        The count, sum, min, max and the JSON sketch of the values.
+    """
+    values = [temp for temp in mean_temps if temp is not None]
+    if not values:
+        return 0, None, None, None, "{}"
+    sketch = Counter(repr(float(temp)) for temp in values)
+    return len(values), sum(values), min(values), max(values), json.dumps(sketch)
+
+
+class MonthlyStats:
+    """ Class for hold the monthly aggregate rows of one station. It can
+        be plotted by PlotOperations like the daily data."""
+    def __init__(self, rows):
+        """ Constructor - initiate with (year, month, count, sum, min,
+            max, sketch) rows of the monthly_stats table."""
+        self.rows = list(rows)
+
+    def month_sketches(self, start_year, end_year):
+        """
+        Merge the sketches of each month within the year range.
+        Returns:
+            A list of 12 Counters of value to count, January first.
+        """
+        sketches = [Counter() for _ in range(12)]
+        for year, month, count, _, _, _, sketch in self.rows:
+            if count and start_year <= year <= end_year:
+                sketches[month - 1].update(json.loads(sketch))
+        return sketches
+
+    def boxplot_stats(self, start_year, end_year, whis=1.5):
+        """
+        Compute the box plot statistics of each month within the year range,
+        the same way as matplotlib.cbook.boxplot_stats does on daily data.
+        Returns:
+            A list of 12 statistics dictionaries for Axes.bxp.
+        """
+        return [sketch_boxplot_stats(sketch, whis)
+                for sketch in self.month_sketches(int(start_year), int(end_year))]
+
+
+def sketch_boxplot_stats(sketch, whis=1.5):
+    """
+    Compute the box plot statistics of a value to count sketch.
+    """
+    # NumPy is only needed for plotting, the database layer imports this module.
+    import numpy as np  # pylint: disable=import-outside-toplevel
+    if not sketch:
+        nan = np.nan
+        return {"mean": nan, "med": nan, "q1": nan, "q3": nan, "iqr": nan,
+                "cilo": nan, "cihi": nan, "whislo": nan, "whishi": nan,
+                "fliers": np.array([])}
+    values = np.array([float(value) for value in sketch])
+    order = np.argsort(values)
+    values = values[order]
+    counts = np.array(list(sketch.values()), dtype=np.int64)[order]
+    cumulative = np.cumsum(counts)
+    total = int(cumulative[-1])
+
+    def value_at(rank):
+        return values[np.searchsorted(cumulative, rank, side="right")]
+
+    def percentile(fraction):
+        # Linear interpolation between the closest ranks, written the same
+        # way as np.percentile so the results match to the last bit.
+        position = fraction * (total - 1)
+        lower = int(np.floor(position))
+        low_value = value_at(lower)
+        if lower + 1 >= total:
+            return low_value
+        high_value = value_at(lower + 1)
+        weight = position - lower
+        if weight >= 0.5:
+            return high_value - (high_value - low_value) * (1 - weight)
+        return low_value + (high_value - low_value) * weight
+
+    q1, med, q3 = percentile(0.25), percentile(0.5), percentile(0.75)
+    iqr = q3 - q1
+    stats = {"mean": float(np.dot(values, counts)) / total, "med": med,
+             "q1": q1, "q3": q3, "iqr": iqr}
+    notch = 1.57 * iqr / np.sqrt(total)
+    stats["cilo"], stats["cihi"] = med - notch, med + notch
+
+    upper = values[values <= q3 + whis * iqr]
+    stats["whishi"] = q3 if len(upper) == 0 or upper.max() < q3 else upper.max()
+    lower = values[values >= q1 - whis * iqr]
+    stats["whislo"] = q1 if len(lower) == 0 or lower.min() > q1 else lower.min()
+    outside = (values < stats["whislo"]) | (values > stats["whishi"])
+    stats["fliers"] = np.repeat(values[outside], counts[outside])
+    return stats
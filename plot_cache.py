@@ -0,0 +1,204 @@
+#################################################################
+# Description: Project - Rendered plot cache
+# Usage: This module keep the rendered plot images on disk, keyed
+#        by a hash of the plot type, its parameters and the data
+#        version of the rows it shows, so a repeated request for
+#        the same plot of the same data is served without work.
+#################################################################
+"""This module keep the rendered plot images on disk, keyed by a hash of
+   the plot type, its parameters and the data version of the rows it
+   shows, so a repeated request for the same plot of the same data is
+   served without work."""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from derived_stats import DerivedStats
+from plot_operations import PlotOperations
+from stations import DEFAULT_STATION_ID
+
+# The cache of each directory in this process, keyed by directory and pid,
+# so the worker of a pool lists its directory once and not per plot.
+PROCESS_CACHES = OrderedDict()
+PROCESS_CACHES_SIZE = 16
+PROCESS_CACHES_LOCK = threading.Lock()
+# Times an image is looked up again when another process evicted it before
+# it could be read.
+IMAGE_ATTEMPTS = 3
+
+
+def process_cache(cache_dir):
+    """Get the PlotCache of a directory for this process, made on first use."""
+    key = (os.path.abspath(cache_dir), os.getpid())
+    with PROCESS_CACHES_LOCK:
+        if key in PROCESS_CACHES:
+            PROCESS_CACHES.move_to_end(key)
+            return PROCESS_CACHES[key]
+        PROCESS_CACHES[key] = PlotCache(key[0])
+        while len(PROCESS_CACHES) > PROCESS_CACHES_SIZE:
+            PROCESS_CACHES.popitem(last=False)
+        return PROCESS_CACHES[key]
+
+
+class PlotCache:
+    """ Class for store the rendered plots on disk. The least recently
+        used images are evicted when the cache grows over max_bytes."""
+    def __init__(self, cache_dir="plot_cache", max_bytes=256 * 1024 * 1024):
+        """ Constructor for initialize the cache directory and size cap."""
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.entries = {}
+        os.makedirs(self.cache_dir, exist_ok=True)
+        for file_name in os.listdir(self.cache_dir):
+            # Skip the renders in progress or left by a crash, "*.tmp", and
+            # the "*.tmp.<format>" of older versions.
+            if ".tmp" not in file_name:
+                stat = os.stat(os.path.join(self.cache_dir, file_name))
+                self.entries[file_name] = [stat.st_size, stat.st_mtime]
+
+    def image_name(self, plot_type, parameters, data_version, image_format):
+        """Build the content address of a plot."""
+        key = json.dumps([plot_type, parameters, data_version], sort_keys=True)
+        return f"{hashlib.sha256(key.encode('utf-8')).hexdigest()}.{image_format}"
+
+    def get_or_render(self, image_name, render):
+        """
+        Return the cached image, or render it first with render(path,
+        image_format) into a temporary file, which is only renamed to the
+        image name once complete.
+        Returns:
+            The path of the image, or None if render failed.
+        """
+        path = os.path.join(self.cache_dir, image_name)
+        # Other processes sharing the directory render and evict images too,
+        # so the file decides, not the entries listed at the start.
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            size = None
+        with self.lock:
+            if size is not None:
+                self.hits += 1
+                known = image_name in self.entries
+                self.entries[image_name] = [size, time.time()]
+                if not known:
+                    self.evict()
+                return path
+            self.entries.pop(image_name, None)
+            self.misses += 1
+        # Render beside the final name so readers never see half an image,
+        # the name is unique across the processes and threads sharing the cache.
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            if not render(temp_path, os.path.splitext(image_name)[1][1:]):
+                return None
+            os.replace(temp_path, path)
+        finally:
+            try:
+                os.remove(temp_path)
+            except FileNotFoundError:
+                pass
+        with self.lock:
+            self.entries[image_name] = [os.path.getsize(path), time.time()]
+            self.evict()
+        return path
+
+    def boxplot(self, weather_db, start_year, end_year, station_id=DEFAULT_STATION_ID,
+                image_format="png"):
+        """
+        Get the image of the box plot of a year range, rendering it if needed.
+        Returns:
+            The path of the image, or None if it could not be rendered.
+        """
+        start_year, end_year = int(start_year), int(end_year)
+        data_version = weather_db.get_data_version(f"{start_year:04d}-01-01",
+                                                   f"{end_year:04d}-12-31", station_id)
+        image_name = self.image_name("box", {"start_year": start_year, "end_year": end_year,
+                                             "station_id": station_id},
+                                     data_version, image_format)
+        return self.get_or_render(image_name, lambda path, image_format: PlotOperations(
+            weather_db.fetch_monthly_stats(start_year, end_year, station_id)
+        ).render_boxplot(path, start_year, end_year, image_format=image_format))
+
+    def lineplot(self, weather_db, year, month, station_id=DEFAULT_STATION_ID,
+                 image_format="png", overlays=()):
+        """
+        Get the image of the line plot of a month, rendering it if needed.
+        Overlays depend on the whole history, so the version of every month
+        of the station keys them.
+        Returns:
+            The path of the image, or None if there is no data.
+        """
+        year_month = f"{int(year):04d}-{int(month):02d}"
+        overlays = list(overlays)
+        if overlays:
+            data_version = weather_db.get_data_version(station_id=station_id)
+        else:
+            data_version = weather_db.get_data_version(f"{year_month}-01", f"{year_month}-31",
+                                                       station_id)
+        parameters = {"year": int(year), "month": int(month), "station_id": station_id}
+        if overlays:
+            parameters["overlays"] = overlays
+        image_name = self.image_name("line", parameters, data_version, image_format)
+        if not overlays:
+            return self.get_or_render(image_name, lambda path, image_format: PlotOperations(
+                weather_db.fetch_frame(f"{year_month}-01", f"{year_month}-31", station_id)
+            ).render_lineplot(path, year, month, image_format=image_format))
+
+        def render(path, image_format):
+            frame = weather_db.fetch_frame(station_id=station_id)
+            derived_stats = DerivedStats(frame, (weather_db.db_name, station_id, data_version))
+            return PlotOperations(frame, derived_stats).render_lineplot(
+                path, year, month, overlays=overlays, image_format=image_format)
+        return self.get_or_render(image_name, render)
+
+    def range_lineplot(self, weather_db, start_year, end_year, station_id=DEFAULT_STATION_ID,
+                       image_format="png"):
+        """
+        Get the image of the downsampled line plot of a year range, rendering
+        it if needed. The downsampling is built from the whole history of the
+        station once per data version, and serves every range and width.
+        Returns:
+            The path of the image, or None if there is no data.
+        """
+        start_year, end_year = int(start_year), int(end_year)
+        data_version = weather_db.get_data_version(f"{start_year:04d}-01-01",
+                                                   f"{end_year:04d}-12-31", station_id)
+        image_name = self.image_name("line_range", {"start_year": start_year,
+                                                    "end_year": end_year,
+                                                    "station_id": station_id},
+                                     data_version, image_format)
+
+        def render(path, image_format):
+            pyramid_key = (weather_db.db_name, station_id,
+                           weather_db.get_data_version(station_id=station_id), "mean")
+            return PlotOperations(weather_db.fetch_frame(station_id=station_id)) \
+                .render_range_lineplot(path, start_year, end_year, pyramid_key=pyramid_key,
+                                       image_format=image_format)
+        return self.get_or_render(image_name, render)
+
+    def evict(self):
+        """Remove the least recently used images until the cache fits max_bytes."""
+        total_bytes = sum(size for size, _ in self.entries.values())
+        for image_name, (size, _) in sorted(self.entries.items(), key=lambda item: item[1][1]):
+            if total_bytes <= self.max_bytes:
+                break
+            self.entries.pop(image_name)
+            try:
+                os.remove(os.path.join(self.cache_dir, image_name))
+            except OSError:
+                # Already removed, or open in another process where the
+                # system does not allow removing it.
+                pass
+            total_bytes -= size
+
+    def stats(self):
+        """Hit and miss counts of this cache."""
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "images": len(self.entries),
+                    "bytes": sum(size for size, _ in self.entries.values())}
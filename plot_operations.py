@@ -13,13 +13,29 @@
     the database, then it will have functions for plotting.
 """
 import calendar
-import matplotlib.pyplot as plt
+import numpy as np
+from matplotlib.figure import Figure
+from downsample import pyramid
+from instrumentation import INSTRUMENTATION
+from monthly_stats import MonthlyStats
+from weather_frame import WeatherFrame
+
+# Lines a line plot can draw over the daily means, from DerivedStats.
+LINE_OVERLAYS = {
+    "rolling": ("30 day mean", lambda derived_stats: derived_stats.rolling_mean(30)),
+    "normal": ("Normal", lambda derived_stats: derived_stats.normals()),
+}
 
 class PlotOperations:
     """This class will be use for pop up diagrams."""
-    def __init__(self, weather_data_arg):
-        """Constructor - initiate with weather data."""
+    def __init__(self, weather_data_arg, derived_stats=None):
+        """Constructor - initiate with weather data, either a dictionary of
+        date to daily temperatures or a WeatherFrame. MonthlyStats can
+        be used too, but only for box plots. The DerivedStats of the whole
+        history of the station are needed for line plot overlays."""
         self.weather_data = weather_data_arg
+        self.derived_stats = derived_stats
+        self.mean_pyramid = None
 
     def create_boxplot(self, start_year, end_year):
         """
@@ -29,39 +45,107 @@ class PlotOperations:
             end_year (str): The ending year for the date range (e.g., "2020").
         """
         try:
-            # Convert year strings to integers for comparison
-            start_year = int(start_year)
-            end_year = int(end_year)
-
-            # Filter data based on the date range
-            filtered_data = {
-                date: daily_temps
-                for date, daily_temps in self.weather_data.items()
-                    if start_year <= int(date[:4]) <= end_year
-            }
-
-            # Extract mean temperatures for each month
-            monthly_data = {month: [] for month in range(1, 13)}
-
-            for date, daily_temps in filtered_data.items():
-                month = int(date[5:7])  # Extract the month from the date
-                mean_temp = daily_temps["Mean"]
-                if mean_temp is not None:
-                    monthly_data[month].append(mean_temp)
-
-            # Prepare data for boxplot
-            data_to_plot = [monthly_data[month] for month in range(1, 13)]
+            # pyplot is only loaded for windows, rendering to files does not need it.
+            import matplotlib.pyplot as plt  # pylint: disable=import-outside-toplevel
 
             # Create and display the boxplot
-            plt.boxplot(data_to_plot)
-            plt.xticks(range(1, 13), [str(month) for month in range(1, 13)])
-            plt.xlabel("Month")
-            plt.ylabel("Mean Temperature (°C)")
-            plt.title(f"Mean Temperatures by Month ({start_year} to {end_year})")
+            with INSTRUMENTATION.span("plot.draw"):
+                self.draw_boxplot(plt.gca(), start_year, end_year)
             plt.show()
         except Exception as boxplot_error:
             print(f"Error creating boxplot: {boxplot_error}")
 
+    def render_boxplot(self, path, start_year, end_year, figsize=(8, 6), dpi=100,
+                       image_format=None):
+        """
+        Render the boxplot of create_boxplot off-screen into an image file,
+        without the global pyplot state.
+        Args:
+            path (str): The image file to write, PNG or SVG by its extension.
+            image_format (str): "png" or "svg", by the path extension if None.
+        Returns:
+            True if the image was written.
+        """
+        try:
+            figure = Figure(figsize=figsize, dpi=dpi)
+            with INSTRUMENTATION.span("plot.draw"):
+                self.draw_boxplot(figure.add_subplot(), start_year, end_year)
+            with INSTRUMENTATION.span("plot.render"):
+                figure.savefig(path, format=image_format)
+            return True
+        except Exception as boxplot_error:
+            print(f"Error rendering boxplot to {path}: {boxplot_error}")
+            return False
+
+    def draw_boxplot(self, axes, start_year, end_year):
+        """
+        Draw the boxplot of mean temperatures for each month on the given axes.
+        """
+        # Convert year strings to integers for comparison
+        start_year = int(start_year)
+        end_year = int(end_year)
+
+        if isinstance(self.weather_data, MonthlyStats):
+            axes.bxp(self.weather_data.boxplot_stats(start_year, end_year))
+        else:
+            # Prepare data for boxplot
+            data_to_plot = self.monthly_mean_temps(start_year, end_year)
+            axes.boxplot(data_to_plot)
+        axes.set_xticks(range(1, 13), [str(month) for month in range(1, 13)])
+        axes.set_xlabel("Month")
+        axes.set_ylabel("Mean Temperature (°C)")
+        axes.set_title(f"Mean Temperatures by Month ({start_year} to {end_year})")
+
+    def monthly_mean_temps(self, start_year, end_year):
+        """
+        Collect the mean temperatures of each month within the year range.
+        Returns:
+            A list of 12 sequences of mean temperatures, January first.
+        """
+        if isinstance(self.weather_data, WeatherFrame):
+            frame = self.weather_data.year_slice(start_year, end_year)
+            months = frame.months()
+            has_mean = ~np.isnan(frame.mean_temps)
+            return [frame.mean_temps[has_mean & (months == month)] for month in range(1, 13)]
+
+        # Filter data based on the date range
+        filtered_data = {
+            date: daily_temps
+            for date, daily_temps in self.weather_data.items()
+                if start_year <= int(date[:4]) <= end_year
+        }
+
+        # Extract mean temperatures for each month
+        monthly_data = {month: [] for month in range(1, 13)}
+
+        for date, daily_temps in filtered_data.items():
+            month = int(date[5:7])  # Extract the month from the date
+            mean_temp = daily_temps["Mean"]
+            if mean_temp is not None:
+                monthly_data[month].append(mean_temp)
+
+        return [monthly_data[month] for month in range(1, 13)]
+
+    def month_mean_temps(self, year_month):
+        """
+        Collect the daily mean temperatures of one "YYYY-MM" month.
+        Returns:
+            The list of dates and the list of mean temperatures.
+        """
+        if isinstance(self.weather_data, WeatherFrame):
+            year, month = year_month.split("-")
+            frame = self.weather_data.month_slice(year, month)
+            return list(np.datetime_as_string(frame.dates)), list(frame.mean_temps)
+
+        # Filter data based on Year and Month.
+        month_data = {key: value for key, value in self.weather_data.items() if key.startswith(year_month)}
+        dates_data = []
+        mean_temps = []
+        for date, daily_temps in month_data.items():
+            dates_data.append(date)
+            mean_temps.append(daily_temps["Mean"])
+        return dates_data, mean_temps
+
     def create_lineplot(self, year, month):
         """
         Create a line plot of daily mean temperatures for a specific year and month.
@@ -82,29 +166,161 @@ class PlotOperations:
             date (str): The date to plot data for in "YYYY-MM-DD" format.
         """
         try:
-            # Filter data based on Year and Month.
-            month_data = {key: value for key, value in self.weather_data.items() if key.startswith(year_month)}
-            dates_data = []
-            mean_temps = []
-
-            if month_data:
-                for date, daily_temps in month_data.items():
-                    dates_data.append(date)
-                    mean_temps.append(daily_temps["Mean"])
+            import matplotlib.pyplot as plt  # pylint: disable=import-outside-toplevel
 
             # Create and display the line plot
-                plt.plot(dates_data, mean_temps, marker='o', linestyle='-')
-                plt.xlabel("Day")
-                plt.ylabel("Mean Temperature (°C)")
-                plt.title(f"Mean Temperatures for {year_month}")
-                plt.xticks(rotation=45)
-                plt.grid(True)
+            with INSTRUMENTATION.span("plot.draw"):
+                drawn = self.draw_lineplot(plt.gca(), year_month)
+            if drawn:
                 plt.show()
             else:
                 print(f"Data for the date {year_month} not found.")
         except Exception as lineplot_date_error:
             print(f"Error creating line plot by date: {lineplot_date_error}")
 
+    def render_lineplot(self, path, year, month, figsize=(8, 6), dpi=100, overlays=(),
+                        image_format=None):
+        """
+        Render the line plot of create_lineplot off-screen into an image file,
+        without the global pyplot state.
+        Args:
+            path (str): The image file to write, PNG or SVG by its extension.
+            image_format (str): "png" or "svg", by the path extension if None.
+            overlays (tuple): Names of LINE_OVERLAYS to draw over the means.
+        Returns:
+            True if the image was written, False if there is no data or it failed.
+        """
+        try:
+            year_month = f"{year}-{str(month).zfill(2)}"
+            figure = Figure(figsize=figsize, dpi=dpi)
+            with INSTRUMENTATION.span("plot.draw"):
+                drawn = self.draw_lineplot(figure.add_subplot(), year_month, overlays)
+            if not drawn:
+                print(f"Data for the date {year_month} not found.")
+                return False
+            with INSTRUMENTATION.span("plot.render"):
+                figure.savefig(path, format=image_format)
+            return True
+        except Exception as lineplot_error:
+            print(f"Error rendering line plot to {path}: {lineplot_error}")
+            return False
+
+    def draw_lineplot(self, axes, year_month, overlays=()):
+        """
+        Draw the line plot of daily mean temperatures of a "YYYY-MM" month
+        on the given axes, with the named LINE_OVERLAYS over them.
+        Returns:
+            False if there is no data for the month.
+        """
+        dates_data, mean_temps = self.month_mean_temps(year_month)
+        if not dates_data:
+            return False
+        axes.plot(dates_data, mean_temps, marker='o', linestyle='-',
+                  label="Mean" if overlays else None)
+        if overlays:
+            self.draw_overlays(axes, year_month, overlays)
+        axes.set_xlabel("Day")
+        axes.set_ylabel("Mean Temperature (°C)")
+        axes.set_title(f"Mean Temperatures for {year_month}")
+        axes.tick_params(axis='x', labelrotation=45)
+        axes.grid(True)
+        return True
+
+    def draw_overlays(self, axes, year_month, overlays):
+        """Draw the derived statistics of a "YYYY-MM" month over its line plot."""
+        if self.derived_stats is None:
+            raise ValueError("Line plot overlays need the DerivedStats of the station")
+        frame = self.derived_stats.frame
+        year, month = map(int, year_month.split("-"))
+        in_month = (frame.years() == year) & (frame.months() == month)
+        dates_data = list(np.datetime_as_string(frame.dates[in_month]))
+        for overlay in overlays:
+            label, values = LINE_OVERLAYS[overlay]
+            axes.plot(dates_data, values(self.derived_stats)[in_month], linestyle='--',
+                      label=label)
+        axes.legend()
+
+    def create_range_lineplot(self, start_year, end_year):
+        """
+        Create a line plot of daily mean temperatures over a year range. The
+        points are picked again for the visible days whenever the plot is
+        zoomed or resized.
+        """
+        try:
+            import matplotlib.pyplot as plt  # pylint: disable=import-outside-toplevel
+
+            axes = plt.gca()
+            with INSTRUMENTATION.span("plot.draw"):
+                line = self.draw_range_lineplot(axes, start_year, end_year)
+            if line is None:
+                print(f"No weather data from {start_year} to {end_year}.")
+                return
+
+            def redraw(changed_axes):
+                first, last = changed_axes.get_xlim()
+                days, values = self.range_points(int(np.floor(first)), int(np.ceil(last)),
+                                                 changed_axes)
+                line.set_data(days.astype("datetime64[D]"), values)
+            axes.callbacks.connect("xlim_changed", redraw)
+            plt.show()
+        except Exception as lineplot_error:
+            print(f"Error creating line plot: {lineplot_error}")
+
+    def render_range_lineplot(self, path, start_year, end_year, figsize=(8, 6), dpi=100,
+                              pyramid_key=None, image_format=None):
+        """
+        Render the line plot of create_range_lineplot off-screen into an
+        image file.
+        Args:
+            path (str): The image file to write, PNG or SVG by its extension.
+            image_format (str): "png" or "svg", by the path extension if None.
+            pyramid_key: Key of the downsampling of the data, see downsample.pyramid.
+        Returns:
+            True if the image was written, False if there is no data or it failed.
+        """
+        try:
+            figure = Figure(figsize=figsize, dpi=dpi)
+            with INSTRUMENTATION.span("plot.draw"):
+                line = self.draw_range_lineplot(figure.add_subplot(), start_year, end_year,
+                                                pyramid_key)
+            if line is None:
+                print(f"No weather data from {start_year} to {end_year}.")
+                return False
+            with INSTRUMENTATION.span("plot.render"):
+                figure.savefig(path, format=image_format)
+            return True
+        except Exception as lineplot_error:
+            print(f"Error rendering line plot to {path}: {lineplot_error}")
+            return False
+
+    def draw_range_lineplot(self, axes, start_year, end_year, pyramid_key=None):
+        """
+        Draw the daily mean temperatures of a year range on the given axes,
+        reduced to two points per pixel across by a MinMaxPyramid, so the
+        lowest and highest days stay visible. The weather data must be a
+        WeatherFrame.
+        Returns:
+            The line, or None if there is no data in the range.
+        """
+        start_day = np.datetime64(f"{int(start_year):04d}-01-01", "D").astype(np.int64)
+        end_day = np.datetime64(f"{int(end_year):04d}-12-31", "D").astype(np.int64)
+        self.mean_pyramid = pyramid(self.weather_data.days, self.weather_data.mean_temps,
+                                    pyramid_key)
+        days, values = self.range_points(start_day, end_day, axes)
+        if not len(days):
+            return None
+        line, = axes.plot(days.astype("datetime64[D]"), values, linewidth=0.8)
+        axes.set_xlabel("Date")
+        axes.set_ylabel("Mean Temperature (°C)")
+        axes.set_title(f"Mean Temperatures from {start_year} to {end_year}")
+        axes.grid(True)
+        return line
+
+    def range_points(self, start_day, end_day, axes):
+        """The downsampled points of the days an axes shows, for its width in pixels."""
+        width = max(int(axes.get_window_extent().width), 1)
+        return self.mean_pyramid.points(start_day, end_day, width)
+
     def days_in_month(self, year_month):
         """Get the number of days of month."""
         try:
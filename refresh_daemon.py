@@ -0,0 +1,155 @@
+#################################################################
+# Description: Project - Scheduled refresh
+# Usage: This module keep the database up to date by waking on a
+#        schedule and syncing only the open and incomplete months of
+#        each station, with a request rate limit and a backoff for
+#        stations whose requests fail.
+#################################################################
+"""This module keep the database up to date by waking on a schedule and
+   syncing only the open and incomplete months of each station, with a
+   request rate limit and a backoff for stations whose requests fail."""
+import threading
+import time
+from csv_scraper import BulkCsvScraper
+from response_cache import ResponseCache
+from station_scraper import sync_station
+
+
+class RateLimiter:
+    """ Class for space requests at most requests_per_second apart. It is
+        shared by the threads of a scraper, each acquire() reserves the
+        next free slot and sleeps until it comes."""
+    def __init__(self, requests_per_second=1.0):
+        """ Constructor for initialize the spacing of the requests."""
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Wait until the next request is allowed."""
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class RefreshDaemon:
+    """ Class for refresh the registered stations on a schedule. A
+        station is only scraped when its last scrape was interrupted, or
+        it has months to sync and was not synced for resync_after seconds,
+        so a refresh with nothing to do only runs a few queries."""
+    def __init__(self, weather_db, interval=3600, requests_per_second=1.0,
+                 retry_delay=60, max_backoff=6 * 3600, cache_dir="weather_cache",
+                 max_workers=2, base_url=None, recheck_months=2, resync_after=6 * 3600):
+        """
+        Constructor for initialize the schedule.
+        Args:
+            weather_db: The DBOperations of the database to keep up to date.
+            interval: Seconds between two refreshes.
+            requests_per_second: Request rate limit shared by all stations.
+            retry_delay: Seconds before the first retry of a failed station,
+                doubled after every further failure.
+            max_backoff: Longest delay between the retries of a station.
+            cache_dir: Directory of the page cache, no cache if None.
+            max_workers: Number of months fetched in parallel.
+            recheck_months: Months before the latest one checked for late values.
+            resync_after: Seconds before a synced station with days still
+                missing, like yesterday before it is published, is tried again.
+        """
+        self.weather_db = weather_db
+        self.interval = interval
+        self.rate_limiter = RateLimiter(requests_per_second)
+        self.retry_delay = retry_delay
+        self.max_backoff = max_backoff
+        self.cache = ResponseCache(cache_dir) if cache_dir is not None else None
+        self.max_workers = max_workers
+        self.base_url = base_url
+        self.recheck_months = recheck_months
+        self.resync_after = resync_after
+        # Station id to failed refreshes in a row and monotonic time of the next try.
+        self.failures = {}
+        self.next_attempts = {}
+        # Station id to the monotonic time of its last successful sync.
+        self.synced_at = {}
+        self.stop_event = threading.Event()
+
+    def due_stations(self):
+        """
+        Find the stations which need a scrape now.
+        Returns:
+            A list of station ids.
+        """
+        now = time.monotonic()
+        due_stations = []
+        for station_id, (_, interrupted) in self.weather_db.get_refresh_states().items():
+            if self.next_attempts.get(station_id, 0.0) > now:
+                continue
+            if interrupted:
+                due_stations.append(station_id)
+            elif now - self.synced_at.get(station_id, -self.resync_after) >= self.resync_after \
+                    and self.weather_db.months_to_sync(station_id, self.recheck_months) != []:
+                due_stations.append(station_id)
+        return due_stations
+
+    def refresh_once(self):
+        """
+        Sync the due stations, each one only fetching its months to sync.
+        Returns:
+            A dictionary of station id to the number of days scraped.
+        """
+        return {station_id: self.refresh_station(station_id)
+                for station_id in self.due_stations()}
+
+    def refresh_station(self, station_id):
+        """
+        Sync one station, and schedule its retry with an exponential
+        backoff if a request failed.
+        Returns:
+            The number of days scraped.
+        """
+        scraper = BulkCsvScraper(station_id)
+        scraper.rate_limiter = self.rate_limiter
+        scraper.cache = self.cache
+        if self.base_url is not None:
+            scraper.base_url = self.base_url
+        scraped_days = sync_station(self.weather_db, scraper, max_workers=self.max_workers,
+                                    recheck_months=self.recheck_months)
+        if scraper.fetch_errors:
+            failures = self.failures.get(station_id, 0) + 1
+            self.failures[station_id] = failures
+            backoff = min(self.max_backoff, self.retry_delay * 2 ** (failures - 1))
+            self.next_attempts[station_id] = time.monotonic() + backoff
+            print(f"Station {station_id} will be retried in {backoff:.0f}s.")
+        else:
+            self.failures.pop(station_id, None)
+            self.next_attempts.pop(station_id, None)
+            self.synced_at[station_id] = time.monotonic()
+        return scraped_days
+
+    def seconds_to_next_wake(self):
+        """Sleep until the next refresh, or earlier for a station retry."""
+        now = time.monotonic()
+        retries = [next_attempt - now for next_attempt in self.next_attempts.values()]
+        return max(1.0, min([self.interval] + retries))
+
+    def run(self, max_refreshes=None):
+        """
+        Refresh on the schedule until stop() is called, or max_refreshes
+        refreshes were done.
+        """
+        refreshes = 0
+        while not self.stop_event.is_set():
+            scraped_days = self.refresh_once()
+            refreshes += 1
+            if scraped_days:
+                print(f"Refreshed {len(scraped_days)} stations, "
+                      f"{sum(scraped_days.values())} days scraped.")
+            if max_refreshes is not None and refreshes >= max_refreshes:
+                break
+            self.stop_event.wait(self.seconds_to_next_wake())
+
+    def stop(self):
+        """Stop run() after the current refresh."""
+        self.stop_event.set()
@@ -0,0 +1,243 @@
+#################################################################
+# Description: Project - Scraping - Response cache
+# Usage: This module create a persistent on-disk cache of the
+#        monthly daily data pages, keyed by station and month,
+#        so closed months are never downloaded twice.
+#################################################################
+"""This module create a persistent on-disk cache of the monthly daily
+   data pages, keyed by station and month, so closed months are never
+   downloaded twice."""
+import json
+import os
+import threading
+import time
+
+
+class CachedPage:
+    """A cached page of one month with the validators of its response."""
+    def __init__(self, body, etag=None, last_modified=None, fetched_on=None):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_on = fetched_on
+
+    def conditional_headers(self):
+        """Headers for revalidating this page with a conditional request."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+def page_meta(page):
+    """The metadata file content of a CachedPage."""
+    return json.dumps({"etag": page.etag, "last_modified": page.last_modified,
+                       "fetched_on": page.fetched_on})
+
+
+def remove_file(path):
+    """Delete a file if it exists."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class PageWriter:
+    """ Class for write a page into the cache a chunk at a time while it
+        downloads. The chunks go to a temporary file, which replaces the
+        cached page on commit and is deleted on abort."""
+    def __init__(self, cache, key):
+        """ Constructor - initiate with the cache and the key of the page."""
+        self.cache = cache
+        self.key = key
+        self.temp_path = f"{cache.page_path(key, 'html')}.{os.getpid()}." \
+                         f"{threading.get_ident()}.tmp"
+        self.page_file = None
+        self.failed = False
+
+    def write(self, text):
+        """
+        Add a chunk of the page.
+        Returns:
+            False if the page can no longer be cached.
+        """
+        if self.failed:
+            return False
+        try:
+            if self.page_file is None:
+                self.page_file = open(self.temp_path, "w", encoding="utf-8")
+            self.page_file.write(text)
+            return True
+        except OSError as write_error:
+            print(f"Error writing cached page {self.key}: {write_error}")
+            self.abort()
+            self.failed = True
+            return False
+
+    def commit(self, page):
+        """Store the written page with the validators of page, then evict over the size cap."""
+        if self.failed or not self.write(""):
+            return
+        cache = self.cache
+        with cache.lock:
+            try:
+                self.page_file.close()
+                if not cache.write_file(self.key, "json", page_meta(page)):
+                    raise OSError("metadata not written")
+                os.replace(self.temp_path, cache.page_path(self.key, "html"))
+            except OSError as write_error:
+                print(f"Error writing cached page {self.key}: {write_error}")
+                self.abort()
+                return
+            self.page_file = None
+            cache.entries[self.key] = [os.path.getsize(cache.page_path(self.key, "html")),
+                                       time.time()]
+            cache.evict()
+
+    def abort(self):
+        """Drop the written chunks."""
+        if self.page_file is not None:
+            self.page_file.close()
+            self.page_file = None
+        remove_file(self.temp_path)
+
+
+class ResponseCache:
+    """ Class for store the monthly pages on disk. The least recently used
+        pages are evicted when the cache grows over max_bytes."""
+    def __init__(self, cache_dir="weather_cache", max_bytes=64 * 1024 * 1024):
+        """ Constructor for initialize the cache directory and size cap."""
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.lock = threading.Lock()
+        self.entries = {}
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.load_index()
+
+    def load_index(self):
+        """Scan the cache directory for the size and last use of each page."""
+        for file_name in os.listdir(self.cache_dir):
+            if file_name.endswith(".html"):
+                path = os.path.join(self.cache_dir, file_name)
+                stat = os.stat(path)
+                self.entries[file_name[:-len(".html")]] = [stat.st_size, stat.st_mtime]
+
+    def page_path(self, key, extension):
+        """Path of the page or metadata file of a cache key."""
+        return os.path.join(self.cache_dir, f"{key}.{extension}")
+
+    def get(self, station_id, year, month, read_body=True):
+        """
+        Read the cached page of a month. Without read_body only its
+        validators are read, and the page is read by open_page.
+        Returns:
+            A CachedPage, or None if the month is not cached.
+        """
+        key = f"{station_id}_{year:04d}_{month:02d}"
+        body = None
+        with self.lock:
+            if key not in self.entries:
+                return None
+            try:
+                if read_body:
+                    with open(self.page_path(key, "html"), encoding="utf-8") as page_file:
+                        body = page_file.read()
+                with open(self.page_path(key, "json"), encoding="utf-8") as meta_file:
+                    meta = json.load(meta_file)
+            except (OSError, ValueError) as read_error:
+                print(f"Error reading cached page {key}: {read_error}")
+                self.remove(key)
+                return None
+            self.entries[key][1] = time.time()
+            os.utime(self.page_path(key, "html"))
+        return CachedPage(body, meta.get("etag"), meta.get("last_modified"),
+                          meta.get("fetched_on"))
+
+    def open_page(self, station_id, year, month):
+        """
+        Open the cached page of a month for reading a chunk at a time.
+        Returns:
+            The open text file, or None if the page cannot be read.
+        """
+        key = f"{station_id}_{year:04d}_{month:02d}"
+        try:
+            return open(self.page_path(key, "html"), encoding="utf-8")
+        except OSError as read_error:
+            print(f"Error reading cached page {key}: {read_error}")
+            with self.lock:
+                self.remove(key)
+            return None
+
+    def put(self, station_id, year, month, page):
+        """Store the page of a month, then evict pages over the size cap."""
+        page_writer = self.page_writer(station_id, year, month)
+        if page_writer.write(page.body):
+            page_writer.commit(page)
+
+    def page_writer(self, station_id, year, month):
+        """Start writing the page of a month as it downloads, see PageWriter."""
+        return PageWriter(self, f"{station_id}_{year:04d}_{month:02d}")
+
+    def put_validators(self, station_id, year, month, page):
+        """Store new validators of a cached page, after it was revalidated."""
+        key = f"{station_id}_{year:04d}_{month:02d}"
+        with self.lock:
+            if key in self.entries:
+                self.write_file(key, "json", page_meta(page))
+
+    def write_file(self, key, extension, content):
+        """
+        Write a page or metadata file through a temporary file, so a crash
+        never leaves half of one.
+        Returns:
+            True if the file was written.
+        """
+        temp_path = f"{self.page_path(key, extension)}.{os.getpid()}." \
+                    f"{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as temp_file:
+                temp_file.write(content)
+            os.replace(temp_path, self.page_path(key, extension))
+            return True
+        except OSError as write_error:
+            print(f"Error writing cached page {key}: {write_error}")
+            remove_file(temp_path)
+            return False
+
+    def evict(self):
+        """Remove the least recently used pages until the cache fits max_bytes."""
+        total_bytes = sum(size for size, _ in self.entries.values())
+        for key, (size, _) in sorted(self.entries.items(), key=lambda item: item[1][1]):
+            if total_bytes <= self.max_bytes:
+                break
+            self.remove(key)
+            total_bytes -= size
+
+    def remove(self, key):
+        """Delete the files of one cache key."""
+        self.entries.pop(key, None)
+        for extension in ("html", "json"):
+            remove_file(self.page_path(key, extension))
+
+    def clear(self):
+        """Delete every cached page."""
+        with self.lock:
+            for key in list(self.entries):
+                self.remove(key)
+
+    def count(self, counter):
+        """Add one to the hits, misses or revalidated counter."""
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self):
+        """Hit and miss counts of this cache."""
+        return {"hits": self.hits, "misses": self.misses,
+                "revalidated": self.revalidated, "pages": len(self.entries),
+                "bytes": sum(size for size, _ in self.entries.values())}
@@ -8,17 +8,61 @@
 
 """This module create a HTML Parser class to scrape Winnipeg weather 
 data from the Environment Canada website"""
-import urllib.request
+import calendar
+import codecs
+import http.client
+import threading
+import urllib.error
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from html.parser import HTMLParser
 from datetime import datetime
+from urllib.parse import urlsplit
 from dateutil.relativedelta import relativedelta
+from http_session import HttpSession
+from instrumentation import INSTRUMENTATION
+from response_cache import CachedPage
+from stations import DEFAULT_STATION_ID
+
+NO_DATA_MESSAGE = "We're sorry we were unable to satisfy your request."
+# Returned by scrape_month for a month whose page could not be fetched, so
+# it is not taken for a month without data.
+FETCH_FAILED = object()
+MONTH_NUMBERS = {name: number for number, name in enumerate(calendar.month_name) if name}
+
+
+def parse_title_date(title_date):
+    """
+    Convert a "MMM dd, YYYY" title into a "YYYY-MM-DD" string.
+    Returns:
+        The date string, or None if the title is not a valid date.
+    """
+    try:
+        month_name, day, year = title_date.replace(",", "").split()
+        month = MONTH_NUMBERS[month_name]
+        day, year = int(day), int(year)
+    except (KeyError, ValueError):
+        return None
+    if year < 1 or not 1 <= day <= calendar.monthrange(year, month)[1]:
+        return None
+    return f"{year:04d}-{month:02d}-{day:02d}"
+
+
+def to_float(str_data):
+    """Convert a table cell into a float, or None if it is not a number."""
+    try:
+        return float(str_data)
+    except ValueError:
+        return None
+
 
 class WeatherScraper(HTMLParser):
     """
-    A class to scrape Winnipeg weather data from the Environment Canada website.
+    A class to scrape the daily weather data of a station from the
+    Environment Canada website. The default station is Winnipeg.
     """
 
-    def __init__(self):
+    def __init__(self, station_id=DEFAULT_STATION_ID, session=None):
         super().__init__()
         self.in_date = False
         self.in_max_temp = False
@@ -32,16 +76,33 @@ class WeatherScraper(HTMLParser):
         self.base_url = "http://climate.weather.gc.ca/climate_data/daily_data_e.html"
         self.current_date = datetime.now().date()
         self.col_count=0
+        self.station_id = station_id
+        self.cache = None
+        # Kept-alive connections, shared by the threads fetching months.
+        self.session = session or HttpSession()
+        # Shared object with an acquire() method called before each request.
+        self.rate_limiter = None
+        # Revalidate cached closed months too, to pick up late corrections.
+        self.revalidate = False
+        # Failed requests, counted by the threads fetching months.
+        self.fetch_errors = 0
+        self.fetch_errors_lock = threading.Lock()
+        # Failed months in a row after which a scrape gives up until next time.
+        self.max_failed_months = 12
 
     def fetch_weather_data(self, url):
         """
         Fetch weather data HTML content from the given URL.
         """
         try:
-            with urllib.request.urlopen(url) as response:
-                return response.read().decode('utf-8')
+            self.start_request()
+            with INSTRUMENTATION.span("scrape.fetch"), self.session.get(url) as response:
+                body = response.read()
+            INSTRUMENTATION.count("scrape.bytes", len(body))
+            return body.decode('utf-8')
         except urllib.error.URLError as url_exception:
             print(f"Error fetching data from {url}: {url_exception}")
+            self.record_fetch_error()
             return None
 
     def handle_starttag(self, tag, attrs):
@@ -117,26 +178,246 @@ class WeatherScraper(HTMLParser):
         else:
             latest_date = datetime.strptime("1950-01-01", date_format).date()
 
+        failed_months = 0
         while True:
             if latest_date >= self.current_date:
                 break
-            url = f"{self.base_url}?StationID=27174&timeframe=2&StartYear=1840" \
-                  f"&EndYear={self.current_date.year}&Day=1" \
-                  f"&Year={self.current_date.year}&Month={self.current_date.month}#"
-
-            html_data = self.fetch_weather_data(url)
-
-            # Check if the "We're sorry we were unable to satisfy your request."
-            # exists (indicating no data)
-            if "We're sorry we were unable to satisfy your request." in html_data:
+            fed = self.feed_month_page(self, self.current_date.year, self.current_date.month)
+            # A month without data is the end, a failed one is skipped.
+            if fed is False:
+                break
+            failed_months = failed_months + 1 if fed is None else 0
+            if failed_months >= self.max_failed_months:
                 break
-
-            self.feed(html_data)
             # Subtract one month from the current date
             self.current_date -= relativedelta(months=1)
 
         return self.weather
 
+    def month_url(self, year, month):
+        """
+        Build the daily data URL for the given year and month.
+        """
+        return f"{self.base_url}?StationID={self.station_id}&timeframe=2&StartYear=1840" \
+               f"&EndYear={year}&Day=1&Year={year}&Month={month}#"
+
+    def months_to_scrape(self, latest_date_str=None):
+        """
+        List the (year, month) pairs scrape_weather would visit, newest first.
+        """
+        date_format = "%Y-%m-%d"
+        if latest_date_str is not None:
+            latest_date = datetime.strptime(latest_date_str, date_format).date()
+        else:
+            latest_date = datetime.strptime("1950-01-01", date_format).date()
+
+        months = []
+        walk_date = self.current_date
+        while latest_date < walk_date:
+            months.append((walk_date.year, walk_date.month))
+            walk_date -= relativedelta(months=1)
+        return months
+
+    def scrape_month(self, year, month):
+        """
+        Fetch and parse a single month with a fresh parser.
+        Returns:
+            The weather dictionary of the month, None if the site has no
+            data, or FETCH_FAILED if the page could not be fetched.
+        """
+        month_parser = self.new_month_parser()
+        fed = self.feed_month_page(month_parser, year, month)
+        if fed is None:
+            return FETCH_FAILED
+        if not fed:
+            return None
+        return month_parser.weather
+
+    def feed_month_page(self, month_parser, year, month):
+        """
+        Fetch the page of one month and feed it into the given parser.
+        Returns:
+            True if the page was parsed, False if it has no data, or None
+            if it could not be fetched.
+        """
+        html_data = self.fetch_month(year, month)
+        if html_data is None:
+            return None
+
+        # Check if the "We're sorry we were unable to satisfy your request."
+        # exists (indicating no data)
+        if NO_DATA_MESSAGE in html_data:
+            return False
+        parsed_days = len(month_parser.weather)
+        with INSTRUMENTATION.span("parse.feed"):
+            month_parser.feed(html_data)
+            month_parser.close()
+        INSTRUMENTATION.count("parse.rows", len(month_parser.weather) - parsed_days)
+        return True
+
+    def fetch_month(self, year, month):
+        """
+        Fetch the page of one month, through the response cache if one is set.
+        A month cached after it was closed is served from disk without a
+        request, other cached months are revalidated with a conditional request.
+        """
+        url = self.month_url(year, month)
+        if self.cache is None:
+            return self.fetch_weather_data(url)
+
+        cached_page = self.cache.get(self.station_id, year, month)
+        if cached_page is not None and not self.revalidate \
+                and self.is_closed_month(year, month, cached_page.fetched_on):
+            self.cache.count("hits")
+            return cached_page.body
+
+        headers = cached_page.conditional_headers() if cached_page is not None else {}
+        fetched_on = datetime.now().date().isoformat()
+        try:
+            self.start_request()
+            with INSTRUMENTATION.span("scrape.fetch"), \
+                    self.session.get(url, headers) as response:
+                body = response.read()
+                page = CachedPage(body.decode('utf-8'),
+                                  response.headers.get("ETag"),
+                                  response.headers.get("Last-Modified"), fetched_on)
+            INSTRUMENTATION.count("scrape.bytes", len(body))
+        except urllib.error.HTTPError as http_error:
+            if http_error.code == 304 and cached_page is not None:
+                self.cache.count("revalidated")
+                self.cache.count("hits")
+                cached_page.fetched_on = fetched_on
+                self.cache.put(self.station_id, year, month, cached_page)
+                return cached_page.body
+            print(f"Error fetching data from {url}: {http_error}")
+            self.record_fetch_error()
+            return None
+        except urllib.error.URLError as url_exception:
+            print(f"Error fetching data from {url}: {url_exception}")
+            self.record_fetch_error()
+            return None
+        self.cache.count("misses")
+        self.cache.put(self.station_id, year, month, page)
+        return page.body
+
+    def is_closed_month(self, year, month, fetched_on):
+        """Check the month had ended when its page was fetched on fetched_on."""
+        if not fetched_on:
+            return False
+        fetched_date = datetime.strptime(fetched_on, "%Y-%m-%d").date()
+        return (year, month) < (fetched_date.year, fetched_date.month)
+
+    def wait_for_rate_limit(self):
+        """Wait for the rate limiter, if one is set, before a request."""
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+
+    def start_request(self):
+        """
+        Wait for the rate limiter and count the request in scrape.requests,
+        just before every page or CSV request whether it succeeds or not.
+        """
+        self.wait_for_rate_limit()
+        INSTRUMENTATION.count("scrape.requests")
+
+    def record_fetch_error(self):
+        """Count a failed request, from any of the threads fetching months."""
+        with self.fetch_errors_lock:
+            self.fetch_errors += 1
+
+    def new_month_parser(self):
+        """Create an empty parser of the same kind for parsing one month."""
+        return type(self)(self.station_id, self.session)
+
+    def scrape_weather_concurrent(self, latest_date_str=None, max_workers=8, per_host_limit=4):
+        """
+        Scrape weather data with several months fetched in parallel.
+        The result is merged in the same order as scrape_weather, so the
+        returned dictionary is the same as the sequential one.
+        Args:
+            latest_date_str: Latest date already stored, in "YYYY-MM-DD" format.
+            max_workers: Number of worker threads fetching months.
+            per_host_limit: Maximum number of requests in flight to one host.
+        """
+        for _, _, month_weather in self.scrape_weather_batches(
+                latest_date_str, max_workers=max_workers, per_host_limit=per_host_limit):
+            self.weather.update(month_weather)
+        return self.weather
+
+    def scrape_weather_batches(self, latest_date_str=None, skip_months=(), max_workers=8,
+                               per_host_limit=4):
+        """
+        Generate the months scrape_weather would visit, newest first, as
+        (year, month, weather) tuples without keeping them. Months are
+        fetched in parallel, but only a small window of them is read ahead,
+        so memory stays flat however far back the scrape goes.
+        Args:
+            latest_date_str: Latest date already stored, in "YYYY-MM-DD" format.
+            skip_months: (year, month) pairs which are already stored.
+            max_workers: Number of worker threads fetching months.
+            per_host_limit: Maximum number of requests in flight to one host.
+        """
+        return self.scrape_months([year_month for year_month
+                                   in self.months_to_scrape(latest_date_str)
+                                   if year_month not in skip_months],
+                                  max_workers, per_host_limit, stop_at_missing=True)
+
+    def scrape_months(self, year_months, max_workers=8, per_host_limit=4,
+                      stop_at_missing=False):
+        """
+        Generate the given months in order as (year, month, weather) tuples,
+        fetched in parallel with a small window read ahead.
+        Args:
+            year_months: The (year, month) pairs to scrape.
+            stop_at_missing: Stop at the first month without data instead
+                of skipping it, for walking back to the start of the data.
+                Months which could not be fetched are skipped either way,
+                and counted in fetch_errors so the scrape is resumed, until
+                max_failed_months fail in a row.
+        """
+        months = iter(year_months)
+        host_limits = {}
+        host_limits_lock = threading.Lock()
+
+        def scrape_task(year, month):
+            host = urlsplit(self.month_url(year, month)).netloc
+            with host_limits_lock:
+                if host not in host_limits:
+                    host_limits[host] = threading.BoundedSemaphore(per_host_limit)
+            with host_limits[host]:
+                return self.scrape_month(year, month)
+
+        pending = deque()
+        failed_months = 0
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            def submit_next():
+                for year, month in months:
+                    pending.append((year, month, executor.submit(scrape_task, year, month)))
+                    return
+
+            try:
+                for _ in range(max_workers * 2):
+                    submit_next()
+                while pending:
+                    year, month, future = pending.popleft()
+                    month_weather = future.result()
+                    if month_weather is FETCH_FAILED:
+                        failed_months += 1
+                        if failed_months >= self.max_failed_months:
+                            return
+                        submit_next()
+                        continue
+                    failed_months = 0
+                    # Older months than the first one without data are not wanted.
+                    if month_weather is None and stop_at_missing:
+                        return
+                    submit_next()
+                    if month_weather is not None:
+                        yield year, month, month_weather
+            finally:
+                for _, _, future in pending:
+                    future.cancel()
+
     def is_float(self, str_data):
         """ Function for check data is float number."""
         try:
@@ -153,6 +434,171 @@ class WeatherScraper(HTMLParser):
         except ValueError:
             return False
 
+class StreamingWeatherScraper(WeatherScraper):
+    """
+    A faster parser mode of WeatherScraper. The row date is converted once
+    when the row starts, each row is stored once when its third cell
+    ends, and pages are fed chunk by chunk while the response is still
+    downloading or the cached page is read. Rows without a valid date,
+    such as the summary rows, are skipped.
+    """
+    chunk_size = 16384
+
+    def __init__(self, station_id=DEFAULT_STATION_ID, session=None):
+        super().__init__(station_id, session)
+        self.row_date = None
+        self.row_values = []
+        self.in_cell = False
+        self.cell_text = []
+
+    def handle_starttag(self, tag, attrs):
+        """
+        Handle the start of an HTML tag.
+        """
+        if self.cell_text:
+            self.finish_cell()
+        if tag == 'div' and ('id', 'dynamicDataTable') in attrs:
+            self.in_dynamic_data_table = True
+        elif not self.in_dynamic_data_table:
+            return
+        elif tag == 'tbody':
+            self.in_tbody = True
+        elif tag == 'abbr' and self.in_tbody:
+            for name, value in attrs:
+                if name == 'title':
+                    self.row_date = parse_title_date(value)
+                    self.row_values = []
+        elif tag == 'td' and self.row_date is not None:
+            self.in_cell = True
+
+    def handle_endtag(self, tag):
+        """
+        Handle the end of an HTML tag.
+        """
+        if self.cell_text:
+            self.finish_cell()
+
+    def handle_data(self, data):
+        """
+        Handle the data content within an HTML tag. A text node may arrive
+        in pieces when it is split between two chunks, so it is collected
+        until the next tag.
+        """
+        if self.in_cell:
+            self.cell_text.append(data)
+
+    def finish_cell(self):
+        """Convert the collected cell text and emit the row after 3 cells."""
+        self.row_values.append(to_float("".join(self.cell_text)))
+        self.cell_text = []
+        self.in_cell = False
+        if len(self.row_values) == 3:
+            self.emit_row()
+
+    def emit_row(self):
+        """Store the finished row and wait for the next row date."""
+        max_temp, min_temp, mean_temp = self.row_values
+        self.weather[self.row_date] = {"Max": max_temp, "Min": min_temp, "Mean": mean_temp}
+        self.row_date = None
+
+    def feed_month_page(self, month_parser, year, month):
+        """
+        Stream the page of one month into the given parser while it
+        downloads, or while it is read from the response cache.
+        Returns:
+            True if the page was parsed, False if it has no data, or None
+            if it could not be fetched.
+        """
+        parsed_days = len(month_parser.weather)
+        tail = ""
+        chunks = self.month_chunks(year, month)
+        for text in chunks:
+            if text is None:
+                return None
+            # Keep the end of the previous chunk, the message may be split.
+            if NO_DATA_MESSAGE in tail + text:
+                # Read the rest so the page is cached and the connection kept.
+                for _ in chunks:
+                    pass
+                return False
+            with INSTRUMENTATION.span("parse.feed"):
+                month_parser.feed(text)
+            tail = text[-len(NO_DATA_MESSAGE):]
+        with INSTRUMENTATION.span("parse.feed"):
+            month_parser.close()
+        INSTRUMENTATION.count("parse.rows", len(month_parser.weather) - parsed_days)
+        return True
+
+    def month_chunks(self, year, month):
+        """
+        Generate the page of one month as text chunks, through the response
+        cache if one is set. A month cached after it was closed is read from
+        disk without a request, other months are fetched, with a conditional
+        request if cached, and written to the cache as they download.
+        Yields:
+            The chunks of the page, then None if it could not be fetched.
+        """
+        url = self.month_url(year, month)
+        cached_page = None
+        if self.cache is not None:
+            cached_page = self.cache.get(self.station_id, year, month, read_body=False)
+            if cached_page is not None and not self.revalidate \
+                    and self.is_closed_month(year, month, cached_page.fetched_on):
+                page_file = self.cache.open_page(self.station_id, year, month)
+                if page_file is not None:
+                    self.cache.count("hits")
+                    with page_file:
+                        yield from iter(lambda: page_file.read(self.chunk_size), "")
+                    return
+                cached_page = None
+
+        headers = cached_page.conditional_headers() if cached_page is not None else {}
+        fetched_on = datetime.now().date().isoformat()
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        page_writer = None
+        try:
+            self.start_request()
+            with INSTRUMENTATION.span("scrape.fetch"), \
+                    self.session.get(url, headers) as response:
+                if self.cache is not None:
+                    page_writer = self.cache.page_writer(self.station_id, year, month)
+                while True:
+                    chunk = response.read(self.chunk_size)
+                    INSTRUMENTATION.count("scrape.bytes", len(chunk))
+                    text = decoder.decode(chunk, final=not chunk)
+                    if page_writer is not None:
+                        page_writer.write(text)
+                    yield text
+                    if not chunk:
+                        break
+                page = CachedPage(None, response.headers.get("ETag"),
+                                  response.headers.get("Last-Modified"), fetched_on)
+            if page_writer is not None:
+                page_writer.commit(page)
+                page_writer = None
+                self.cache.count("misses")
+        except urllib.error.HTTPError as http_error:
+            if http_error.code == 304 and cached_page is not None:
+                self.cache.count("revalidated")
+                cached_page.fetched_on = fetched_on
+                self.cache.put_validators(self.station_id, year, month, cached_page)
+                page_file = self.cache.open_page(self.station_id, year, month)
+                if page_file is not None:
+                    self.cache.count("hits")
+                    with page_file:
+                        yield from iter(lambda: page_file.read(self.chunk_size), "")
+                    return
+            print(f"Error fetching data from {url}: {http_error}")
+            self.record_fetch_error()
+            yield None
+        except (OSError, http.client.HTTPException) as url_exception:
+            print(f"Error fetching data from {url}: {url_exception}")
+            self.record_fetch_error()
+            yield None
+        finally:
+            if page_writer is not None:
+                page_writer.abort()
+
 if __name__ == '__main__':
     scraper = WeatherScraper()
     weather = scraper.scrape_weather()
@@ -0,0 +1,137 @@
+#################################################################
+# Description: Project - Multi-station scraping
+# Usage: This module scrape several stations in parallel, one
+#        station per worker process. Each station streams its
+#        months into the database in batches, and records its
+#        progress so an interrupted scrape resumes where it stopped.
+#################################################################
+"""This module scrape several stations in parallel, one station per
+   worker process. Each station streams its months into the database in
+   batches, and records its progress so an interrupted scrape resumes
+   where it stopped."""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+from db_operations import open_database
+from instrumentation import INSTRUMENTATION
+from csv_scraper import BulkCsvScraper
+from response_cache import ResponseCache
+
+
+def stream_station(weather_db, scraper, batch_months=12, max_workers=4):
+    """
+    Scrape the station of the scraper into the database, batch_months
+    months per transaction. Closed months are recorded as done with their
+    batch, the progress is cleared once the scrape reaches its end.
+    Returns:
+        The number of days scraped.
+    """
+    station_id = scraper.station_id
+    latest_date, done_months = weather_db.start_scrape(station_id)
+    open_month = (date.today().year, date.today().month)
+    batch_weather = {}
+    batch_year_months = []
+    scraped_days = 0
+    for year, month, month_weather in scraper.scrape_weather_batches(
+            latest_date, done_months, max_workers, max_workers):
+        batch_weather.update(month_weather)
+        batch_year_months.append((year, month))
+        scraped_days += len(month_weather)
+        if len(batch_year_months) >= batch_months:
+            weather_db.save_batch(batch_weather, [year_month for year_month in batch_year_months
+                                                  if year_month < open_month], station_id)
+            batch_weather = {}
+            batch_year_months = []
+    weather_db.save_batch(batch_weather, [year_month for year_month in batch_year_months
+                                          if year_month < open_month], station_id)
+    if scraper.fetch_errors == 0:
+        weather_db.finish_scrape(station_id)
+    else:
+        print(f"Station {station_id} stopped after {scraper.fetch_errors} failed requests, "
+              "the next download resumes it.")
+    return scraped_days
+
+
+def sync_station(weather_db, scraper, batch_months=12, max_workers=4, recheck_months=2):
+    """
+    Bring the station of the scraper up to date with the fewest requests.
+    A station without data, or with an interrupted scrape, is streamed
+    from the site. Otherwise only the months of months_to_sync are
+    fetched, and only their new or corrected days are written.
+    Returns:
+        The number of days scraped.
+    """
+    station_id = scraper.station_id
+    if weather_db.get_refresh_states().get(station_id, (None, False))[1]:
+        return stream_station(weather_db, scraper, batch_months, max_workers)
+    year_months = weather_db.months_to_sync(station_id, recheck_months)
+    if year_months is None:
+        return stream_station(weather_db, scraper, batch_months, max_workers)
+    # Months checked again for late values may be cached after they closed.
+    scraper.revalidate = True
+    weather = {}
+    for _, _, month_weather in scraper.scrape_months(year_months, max_workers, max_workers):
+        weather.update(month_weather)
+    weather_db.save_data(weather, station_id)
+    return len(weather)
+
+
+def scrape_station(db_name, station_id, cache_dir=None, max_workers=4, base_url=None,
+                   batch_months=12):
+    """
+    Scrape one station into the database in a worker process.
+    Returns:
+        The station id, the number of days scraped, the page cache and HTTP
+        session statistics and the instrumentation summary of the worker.
+    """
+    # A forked or reused worker starts with the spans of its previous work.
+    INSTRUMENTATION.reset()
+    scraper = BulkCsvScraper(station_id)
+    if base_url is not None:
+        scraper.base_url = base_url
+    if cache_dir is not None:
+        scraper.cache = ResponseCache(cache_dir)
+    with INSTRUMENTATION.span("scrape.station"):
+        scraped_days = sync_station(open_database(db_name), scraper, batch_months, max_workers)
+    scraper.session.close()
+    stats = scraper.cache.stats() if scraper.cache is not None else {}
+    stats.update({f"http_{name}": value for name, value in scraper.session.stats().items()})
+    return station_id, scraped_days, stats, INSTRUMENTATION.take()
+
+
+def scrape_stations(weather_db, station_ids=None, processes=None, cache_dir="weather_cache",
+                    max_workers=4, base_url=None, batch_months=12):
+    """
+    Scrape the given stations, or all registered stations, across a process
+    pool. Every worker writes its own station, WAL mode lets them share
+    the database.
+    Args:
+        weather_db: The DBOperations of the database to update.
+        station_ids: Stations to scrape, all registered stations if None.
+        processes: Number of worker processes, the CPU count if None.
+        cache_dir: Directory of the page cache, no cache if None.
+        max_workers: Number of months each station fetches in parallel.
+        batch_months: Number of months saved per transaction.
+    Returns:
+        A dictionary of station id to the number of days scraped, and the
+        page cache statistics summed over the stations, with the HTTP session
+        ones prefixed by "http_".
+    """
+    if station_ids is None:
+        station_ids = list(weather_db.get_stations())
+    scraped_days = {}
+    cache_totals = {}
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = {executor.submit(scrape_station, weather_db.db_name, station_id,
+                                   cache_dir, max_workers, base_url, batch_months): station_id
+                   for station_id in station_ids}
+        for future in as_completed(futures):
+            try:
+                station_id, days, cache_stats, summary = future.result()
+            except Exception as scrape_error:
+                print(f"Error scraping station {futures[future]}: {scrape_error}")
+                continue
+            scraped_days[station_id] = days
+            INSTRUMENTATION.merge(summary)
+            for name, value in cache_stats.items():
+                cache_totals[name] = cache_totals.get(name, 0) + value
+    return scraped_days, cache_totals
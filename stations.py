@@ -0,0 +1,14 @@
+#################################################################
+# Description: Project - Stations
+# Usage: This module keep the default weather station and the
+#        stations registered in a new database.
+#################################################################
+"""This module keep the default weather station and the stations
+   registered in a new database."""
+
+# Winnipeg Richardson Int'l A, the station of the original project.
+DEFAULT_STATION_ID = 27174
+
+DEFAULT_STATIONS = {
+    DEFAULT_STATION_ID: 'Winnipeg, MB',
+}
@@ -0,0 +1,267 @@
+#################################################################
+# Description: Project - Command line
+# Usage: This module run the actions of the menu without asking
+#        anything, so they can be scheduled from cron, and keep the
+#        database fresh with the refresh subcommand.
+#        python weather_processor.py download|plot|export|import|purge|
+#                                    refresh|serve
+#        python weather_processor.py  (opens the menu)
+#################################################################
+"""This module run the actions of the menu without asking anything, so
+   they can be scheduled from cron, and keep the database fresh with the
+   refresh subcommand."""
+import argparse
+import sys
+from db_operations import BACKENDS, open_database
+from instrumentation import INSTRUMENTATION, PROFILE_MODES
+from stations import DEFAULT_STATION_ID
+
+DB_NAME = "weather_data"
+
+
+def download(weather_db, args):
+    """Download the new data of the given or all registered stations."""
+    # Imported here so the other commands start without loading the scraper.
+    from station_scraper import scrape_stations  # pylint: disable=import-outside-toplevel
+    for station_id in args.station or ():
+        if station_id not in weather_db.get_stations():
+            weather_db.add_station(station_id, f"Station {station_id}")
+    scraped_days, cache_stats = scrape_stations(
+        weather_db, args.station, args.processes, None if args.no_cache else args.cache_dir,
+        args.workers)
+    for station_id, days in sorted(scraped_days.items()):
+        print(f"Station {station_id}: {days} days scraped.")
+    print(f"Page cache: {cache_stats.get('hits', 0)} hits, "
+          f"{cache_stats.get('misses', 0)} misses.")
+    print(f"HTTP: {cache_stats.get('http_requests', 0)} requests over "
+          f"{cache_stats.get('http_connections', 0)} connections, "
+          f"{cache_stats.get('http_reused', 0)} reused, "
+          f"{cache_stats.get('http_wire_bytes', 0)} bytes transferred for "
+          f"{cache_stats.get('http_body_bytes', 0)} bytes of pages, "
+          f"{cache_stats.get('http_retries', 0)} retries.")
+    return 0 if len(scraped_days) == len(args.station or weather_db.get_stations()) else 1
+
+
+def plot(weather_db, args):
+    """Render a box plot of a year range, or a line plot of a month or a year range, into a file."""
+    # Imported here so the other commands start without loading matplotlib.
+    from plot_operations import PlotOperations  # pylint: disable=import-outside-toplevel
+    if args.kind == "box":
+        if args.end_year is None or args.start_year > args.end_year:
+            print("A box plot needs --start-year and a --end-year after it.")
+            return 2
+        monthly_stats = weather_db.fetch_monthly_stats(args.start_year, args.end_year,
+                                                       args.station)
+        if not monthly_stats.rows:
+            print(f"No weather data from {args.start_year} to {args.end_year}.")
+            return 1
+        rendered = PlotOperations(monthly_stats).render_boxplot(
+            args.output, args.start_year, args.end_year)
+    elif args.month is None and args.end_year is not None:
+        if args.start_year > args.end_year:
+            print("A multi-year line plot needs a --end-year after --start-year.")
+            return 2
+        # The downsampling is built from the whole history of the station.
+        frame = weather_db.fetch_frame(station_id=args.station)
+        rendered = PlotOperations(frame).render_range_lineplot(
+            args.output, args.start_year, args.end_year)
+    else:
+        if args.month is None or not 1 <= args.month <= 12:
+            print("A line plot needs a --month between 1 and 12, or a --end-year.")
+            return 2
+        year_month = f"{args.start_year:04d}-{args.month:02d}"
+        if args.overlay:
+            # Overlays look at the whole history of the station.
+            from derived_stats import DerivedStats  # pylint: disable=import-outside-toplevel
+            frame = weather_db.fetch_frame(station_id=args.station)
+            derived_stats = DerivedStats(frame)
+        else:
+            frame = weather_db.fetch_frame(f"{year_month}-01", f"{year_month}-31", args.station)
+            derived_stats = None
+        rendered = PlotOperations(frame, derived_stats).render_lineplot(
+            args.output, args.start_year, args.month, overlays=args.overlay or ())
+    if rendered:
+        print(f"Plot written to {args.output}.")
+    return 0 if rendered else 1
+
+
+def export(weather_db, args):
+    """Stream the daily data of the given or all stations into a CSV or columnar file."""
+    # Imported here so the other commands start without loading NumPy.
+    import bulk_transfer  # pylint: disable=import-outside-toplevel
+    export_function = bulk_transfer.export_columnar if args.format == "columnar" \
+        else bulk_transfer.export_csv
+    try:
+        row_count = export_function(weather_db, args.output, args.station, args.start, args.end)
+    except OSError as export_error:
+        print(f"Error exporting to {args.output}: {export_error}")
+        return 1
+    print(f"{row_count} days written to {args.output}.")
+    return 0
+
+
+def import_data(weather_db, args):
+    """Load a CSV or columnar file written by export into the database."""
+    import bulk_transfer  # pylint: disable=import-outside-toplevel
+    try:
+        row_count, complete = bulk_transfer.import_file(weather_db, args.input)
+    except (OSError, ValueError) as import_error:
+        print(f"Error importing {args.input}: {import_error}")
+        return 1
+    if not complete:
+        print(f"Import of {args.input} stopped after {row_count} days saved.")
+        return 1
+    print(f"{row_count} days saved from {args.input}.")
+    return 0
+
+
+def purge(weather_db, args):
+    """Delete the data of one or all stations, only with --yes."""
+    if not args.yes:
+        print("Purging deletes the data, run it again with --yes to confirm.")
+        return 2
+    weather_db.purge_data(args.station)
+    print("Database has been purged.")
+    return 0
+
+
+def refresh(weather_db, args):
+    """Keep the database up to date, once or on a schedule until interrupted."""
+    # Imported here so the other commands start without loading the scraper.
+    from refresh_daemon import RefreshDaemon  # pylint: disable=import-outside-toplevel
+    daemon = RefreshDaemon(weather_db, args.interval, args.rate, args.retry_delay,
+                           args.max_backoff, None if args.no_cache else args.cache_dir,
+                           args.workers, recheck_months=args.recheck_months)
+    try:
+        daemon.run(1 if args.once else None)
+    except KeyboardInterrupt:
+        print("Refresh stopped.")
+    return 0
+
+
+def serve(weather_db, args):
+    """Serve the database over HTTP until interrupted."""
+    # Imported here so the other commands start without loading asyncio.
+    import asyncio  # pylint: disable=import-outside-toplevel
+    from weather_service import WeatherService  # pylint: disable=import-outside-toplevel
+    service = WeatherService(weather_db.db_name, args.host, args.port, args.workers,
+                             args.render_processes, plot_cache_dir=args.plot_cache_dir)
+    try:
+        asyncio.run(service.serve_forever())
+    except KeyboardInterrupt:
+        print("Service stopped.")
+    return 0
+
+
+def build_parser():
+    """Build the parser of the subcommands."""
+    parser = argparse.ArgumentParser(
+        prog="weather_processor", description="Weather Data Processor, "
+        "opens the menu when no command is given.")
+    parser.add_argument("--db", default=DB_NAME, help="database file, weather_data by default")
+    parser.add_argument("--backend", choices=BACKENDS,
+                        help="storage of the daily data of a new database, or binary to "
+                        "convert a SQLite one; sqlite by default")
+    parser.add_argument("--profile", choices=PROFILE_MODES,
+                        help="record the stages of every action, also set by WEATHER_PROFILE")
+    parser.add_argument("--profile-dir", help="directory of the profiles, profiles by default")
+    commands = parser.add_subparsers(dest="command")
+
+    download_parser = commands.add_parser("download", help="download the latest data")
+    download_parser.add_argument("--station", type=int, action="append",
+                                 help="station to download, repeatable, all registered if none")
+    download_parser.add_argument("--processes", type=int, help="stations scraped in parallel")
+    download_parser.add_argument("--workers", type=int, default=4,
+                                 help="months fetched in parallel per station")
+    download_parser.add_argument("--cache-dir", default="weather_cache")
+    download_parser.add_argument("--no-cache", action="store_true", help="skip the page cache")
+    download_parser.set_defaults(action=download)
+
+    plot_parser = commands.add_parser("plot", help="render a plot into an image file")
+    plot_parser.add_argument("kind", choices=("box", "line"))
+    plot_parser.add_argument("--start-year", "--year", type=int, required=True,
+                             help="first year of a box plot, or the year of a line plot")
+    plot_parser.add_argument("--end-year", type=int, help="last year of a box plot or a multi-year line plot")
+    plot_parser.add_argument("--month", type=int, help="month of a line plot")
+    plot_parser.add_argument("--station", type=int, default=DEFAULT_STATION_ID)
+    plot_parser.add_argument("--overlay", action="append", choices=("rolling", "normal"),
+                             help="draw the 30 day mean or the normals over a line plot")
+    plot_parser.add_argument("--output", required=True, help="PNG or SVG file to write")
+    plot_parser.set_defaults(action=plot)
+
+    export_parser = commands.add_parser("export", help="export daily data")
+    export_parser.add_argument("--station", type=int, action="append",
+                               help="station to export, repeatable, all stations if none")
+    export_parser.add_argument("--start", help="first date, YYYY-MM-DD")
+    export_parser.add_argument("--end", help="last date, YYYY-MM-DD")
+    export_parser.add_argument("--format", choices=("csv", "columnar"), default="csv")
+    export_parser.add_argument("--output", required=True, help="file to write")
+    export_parser.set_defaults(action=export)
+
+    import_parser = commands.add_parser("import", help="import a file written by export")
+    import_parser.add_argument("input", help="CSV or columnar file to read")
+    import_parser.set_defaults(action=import_data)
+
+    purge_parser = commands.add_parser("purge", help="delete stored data")
+    purge_parser.add_argument("--station", type=int, help="station to purge, all if none")
+    purge_parser.add_argument("--yes", action="store_true", help="confirm the purge")
+    purge_parser.set_defaults(action=purge)
+
+    refresh_parser = commands.add_parser("refresh", help="keep the data up to date")
+    refresh_parser.add_argument("--once", action="store_true",
+                                help="refresh once and exit, for cron")
+    refresh_parser.add_argument("--interval", type=float, default=3600,
+                                help="seconds between refreshes, 3600 by default")
+    refresh_parser.add_argument("--rate", type=float, default=1.0,
+                                help="most requests per second, 1 by default")
+    refresh_parser.add_argument("--retry-delay", type=float, default=60,
+                                help="first retry delay of a failed station in seconds")
+    refresh_parser.add_argument("--max-backoff", type=float, default=6 * 3600,
+                                help="longest retry delay of a failed station in seconds")
+    refresh_parser.add_argument("--recheck-months", type=int, default=2,
+                                help="months before the latest one checked for late values")
+    refresh_parser.add_argument("--workers", type=int, default=2,
+                                help="months fetched in parallel")
+    refresh_parser.add_argument("--cache-dir", default="weather_cache")
+    refresh_parser.add_argument("--no-cache", action="store_true", help="skip the page cache")
+    refresh_parser.set_defaults(action=refresh)
+
+    serve_parser = commands.add_parser("serve", help="serve the data over HTTP")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8080)
+    serve_parser.add_argument("--workers", type=int, default=8,
+                              help="threads reading the database")
+    serve_parser.add_argument("--render-processes", type=int,
+                              help="processes rendering plots, the CPU count by default")
+    serve_parser.add_argument("--plot-cache-dir", default="plot_cache")
+    serve_parser.set_defaults(action=serve)
+    return parser
+
+
+def main(argv=None, run_menu=None):
+    """
+    Run the command of the arguments, or open the menu without one.
+    Args:
+        argv: The arguments, sys.argv if None.
+        run_menu: Function opening the menu with the database name and
+            backend, weather_processor.run_menu if None. weather_processor.py
+            passes its own when it runs as the main script, so it is not
+            imported a second time.
+    Returns:
+        The exit status, 0 on success.
+    """
+    args = build_parser().parse_args(argv)
+    if args.profile:
+        INSTRUMENTATION.enable(args.profile, args.profile_dir)
+    if args.command is None:
+        if run_menu is None:
+            # Imported here so the commands start without loading the menu.
+            from weather_processor import run_menu  # pylint: disable=import-outside-toplevel
+        run_menu(args.db, args.backend)
+        return 0
+    action = INSTRUMENTATION.profiled(args.command, args.action)
+    return action(open_database(args.db, args.backend), args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
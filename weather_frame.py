@@ -0,0 +1,117 @@
+#################################################################
+# Description: Project - Columnar weather data
+# Usage: This module create a compact column based container of
+#        daily weather data backed by NumPy arrays, which is used
+#        in place of the dictionary of dictionaries for large data.
+#################################################################
+"""This module create a compact column based container of daily weather
+   data backed by NumPy arrays, which is used in place of the dictionary
+   of dictionaries for large data."""
+import numpy as np
+
+
+class WeatherFrame:
+    """ Class for hold the daily weather data of one station as columns.
+        days holds the day number since 1970-01-01 as int32, sorted in
+        ascending order, and min_temps, max_temps and mean_temps hold the
+        temperatures as float32 with NaN for missing values."""
+    def __init__(self, days, min_temps, max_temps, mean_temps):
+        """ Constructor for initiate with the column arrays."""
+        self.days = np.asarray(days, dtype=np.int32)
+        self.min_temps = np.asarray(min_temps, dtype=np.float32)
+        self.max_temps = np.asarray(max_temps, dtype=np.float32)
+        self.mean_temps = np.asarray(mean_temps, dtype=np.float32)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Build a frame from (sample_date, min_temp, max_temp, avg_temp) rows,
+        as returned by SQLite. None values become NaN.
+        """
+        rows = list(rows)
+        if not rows:
+            return cls.empty()
+        dates, min_temps, max_temps, mean_temps = zip(*rows)
+        frame = cls(np.array(dates, dtype="datetime64[D]").astype(np.int32),
+                    np.array(min_temps, dtype=np.float32),
+                    np.array(max_temps, dtype=np.float32),
+                    np.array(mean_temps, dtype=np.float32))
+        return frame.sorted()
+
+    @classmethod
+    def from_dict(cls, weather):
+        """
+        Build a frame from a dictionary of "YYYY-MM-DD" to daily temperatures.
+        """
+        return cls.from_rows((date, daily_temps.get("Min"), daily_temps.get("Max"),
+                              daily_temps.get("Mean"))
+                             for date, daily_temps in weather.items())
+
+    @classmethod
+    def empty(cls):
+        """Build a frame without any day."""
+        return cls(np.empty(0, np.int32), np.empty(0, np.float32),
+                   np.empty(0, np.float32), np.empty(0, np.float32))
+
+    def sorted(self):
+        """Return the frame ordered by day."""
+        if np.all(self.days[1:] > self.days[:-1]):
+            return self
+        order = np.argsort(self.days, kind="stable")
+        return self.take(order)
+
+    def take(self, index):
+        """Return the days selected by an index array, slice or boolean mask."""
+        return WeatherFrame(self.days[index], self.min_temps[index],
+                            self.max_temps[index], self.mean_temps[index])
+
+    def __len__(self):
+        return len(self.days)
+
+    @property
+    def dates(self):
+        """The days as a datetime64[D] array."""
+        return self.days.astype("datetime64[D]")
+
+    @property
+    def nbytes(self):
+        """Memory used by the column arrays."""
+        return (self.days.nbytes + self.min_temps.nbytes +
+                self.max_temps.nbytes + self.mean_temps.nbytes)
+
+    def years(self):
+        """The calendar year of every day."""
+        return self.dates.astype("datetime64[Y]").astype(np.int32) + 1970
+
+    def months(self):
+        """The month (1-12) of every day."""
+        return self.dates.astype("datetime64[M]").astype(np.int32) % 12 + 1
+
+    def date_slice(self, start_date, end_date):
+        """
+        Return the days from start_date to end_date inclusive, given as
+        "YYYY-MM-DD" strings. The columns are views of this frame.
+        """
+        first = np.datetime64(start_date, "D").astype(np.int32)
+        last = np.datetime64(end_date, "D").astype(np.int32)
+        start, end = np.searchsorted(self.days, [first, last + 1])
+        return self.take(slice(start, end))
+
+    def year_slice(self, start_year, end_year):
+        """Return the days from the start of start_year to the end of end_year."""
+        return self.date_slice(f"{int(start_year):04d}-01-01", f"{int(end_year):04d}-12-31")
+
+    def month_slice(self, year, month):
+        """Return the days of one month."""
+        first = np.datetime64(f"{int(year):04d}-{int(month):02d}", "M")
+        return self.date_slice(first.astype("datetime64[D]"),
+                               (first + 1).astype("datetime64[D]") - 1)
+
+    def to_dict(self):
+        """Convert back to a dictionary of "YYYY-MM-DD" to daily temperatures."""
+        def value(temp):
+            return None if np.isnan(temp) else round(float(temp), 1)
+        return {str(date): {"Max": value(max_temp), "Min": value(min_temp),
+                            "Mean": value(mean_temp)}
+                for date, min_temp, max_temp, mean_temp in zip(
+                    self.dates, self.min_temps, self.max_temps, self.mean_temps)}
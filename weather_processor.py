@@ -8,24 +8,33 @@
 #################################################################
 """Main module for initiate the main menu and interact with
    other modules."""
+import multiprocessing
+import sys
 from menu import Menu
-from db_operations import DBOperations
-from scrape_weather import WeatherScraper
-from plot_operations import PlotOperations
+from db_operations import open_database
+from instrumentation import INSTRUMENTATION
 
 class WeatherProcessor:
     """ Main system class to consturct the system menu and
         and interact with other modules.
     """
-    def __init__(self):
-        """ Constructor for initiate the main menu. """
+    def __init__(self, db_name="weather_data", backend=None):
+        """ Constructor for initiate the main menu and the database. With
+        profiling enabled, every action writes its profile when it ends."""
+        self.weather_db = open_database(db_name, backend)
         self.main_menu = Menu(
             title="Weather Data Processor Menu:",
             options=[
-                ("Download a latest weather data", self.download_weather_data),
-                ("Generate a box plot", self.generate_box_plot),
-                ("Generate a line plot", self.generate_line_plot),
-                ("Purge data from the database", self.purge_data),
+                ("Download a latest weather data",
+                 INSTRUMENTATION.profiled("download", self.download_weather_data)),
+                ("Generate a box plot",
+                 INSTRUMENTATION.profiled("box_plot", self.generate_box_plot)),
+                ("Generate a line plot",
+                 INSTRUMENTATION.profiled("line_plot", self.generate_line_plot)),
+                ("Generate a multi-year line plot",
+                 INSTRUMENTATION.profiled("range_line_plot", self.generate_range_line_plot)),
+                ("Purge data from the database",
+                 INSTRUMENTATION.profiled("purge", self.purge_data)),
                 ("Quit", Menu.CLOSE),
             ],
             
@@ -38,46 +47,68 @@ class WeatherProcessor:
 
 
     def download_weather_data(self):
-        """ Function for download the latest weather data and update into database."""
-        weather_db = DBOperations("weather_data")
-        scraper = WeatherScraper()
+        """ Function for download the latest weather data of every registered
+        station and update into database."""
+        # Imported here so the menu starts without loading the scraper.
+        from station_scraper import scrape_stations  # pylint: disable=import-outside-toplevel
+        scraped_days, cache_stats = scrape_stations(self.weather_db, cache_dir="weather_cache")
 
-        weather_data = scraper.scrape_weather(weather_db.get_lastest_date())
-
-        if weather_data:
-            weather_db.save_data(weather_data)
+        if any(scraped_days.values()):
             print("Weather data has been downloaded and saved to the database.")
         else:
             print("Failed to download weather data.")
+        print(f"Page cache: {cache_stats.get('hits', 0)} hits, "
+              f"{cache_stats.get('misses', 0)} misses.")
         input("Press Enter to continue...")
 
     def generate_box_plot(self):
         """ Function for generate the box plot. """
         from_year, to_year = self.input_year_range()
         if from_year and to_year:
-            weather_db = DBOperations("weather_data")
-            weather_data = weather_db.fetch_data()
-            if weather_data:
+            weather_data = self.weather_db.fetch_monthly_stats(from_year, to_year)
+            if weather_data.rows:
+                # Imported here so the menu starts without loading matplotlib.
+                from plot_operations import PlotOperations  # pylint: disable=import-outside-toplevel
                 plotter = PlotOperations(weather_data)
                 plotter.create_boxplot(from_year, to_year)
+            else:
+                print(f"No weather data from {from_year} to {to_year}.")
+                input("Press Enter to continue...")
 
     def generate_line_plot(self):
         """ Function for generate the line plot. """
         selected_year, selected_month = self.input_year_month()
         if selected_year and selected_month:
-            weather_db = DBOperations("weather_data")
-            weather_data = weather_db.fetch_data()
-            if weather_data:
+            year_month = f"{selected_year:04d}-{selected_month:02d}"
+            weather_data = self.weather_db.fetch_frame(f"{year_month}-01", f"{year_month}-31")
+            if len(weather_data):
+                from plot_operations import PlotOperations  # pylint: disable=import-outside-toplevel
                 plotter = PlotOperations(weather_data)
                 plotter.create_lineplot(str(selected_year), str(selected_month))
+            else:
+                print(f"No weather data for {year_month}.")
+                input("Press Enter to continue...")
+
+    def generate_range_line_plot(self):
+        """ Function for generate the line plot of a year range, drawn with
+        about as many points as the plot is wide. """
+        from_year, to_year = self.input_year_range()
+        if from_year and to_year:
+            weather_data = self.weather_db.fetch_frame()
+            if len(weather_data.year_slice(from_year, to_year)):
+                from plot_operations import PlotOperations  # pylint: disable=import-outside-toplevel
+                plotter = PlotOperations(weather_data)
+                plotter.create_range_lineplot(from_year, to_year)
+            else:
+                print(f"No weather data from {from_year} to {to_year}.")
+                input("Press Enter to continue...")
 
     def purge_data(self):
         """ After user selected the purge database option from the menu, 
         this is the question to confirm to purge data from the database."""
         confirm = input("Are you sure you want to purge all data from the database? (Y/N): ")
         if confirm.lower() == 'y':
-            weather_db = DBOperations("weather_data")
-            weather_db.purge_data()
+            self.weather_db.purge_data()
             print("Database has been purged.")
         else:
             print("No data was purged.")
@@ -121,6 +152,14 @@ class WeatherProcessor:
             return None, None
         return int(selected_year), int(selected_month)
 
+def run_menu(db_name="weather_data", backend=None):
+    """ Function for open the main menu on the database."""
+    WeatherProcessor(db_name, backend).run()
+
 if __name__ == "__main__":
-    processor = WeatherProcessor()
-    processor.run()
+    # Needed by the process pool of the station scraper in the frozen build.
+    multiprocessing.freeze_support()
+    # Subcommands run without the menu, see weather_cli.py. The menu of this
+    # module is passed in, importing it again would run it a second time.
+    from weather_cli import main  # pylint: disable=import-outside-toplevel
+    sys.exit(main(run_menu=run_menu))
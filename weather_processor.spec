@@ -10,7 +10,31 @@ a = Analysis(
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    # Packages found by the analysis but never used by the application.
+    excludes=[
+        'IPython',
+        'jedi',
+        'parso',
+        'traitlets',
+        'prompt_toolkit',
+        'pygments',
+        'zmq',
+        'tornado',
+        'jupyter_client',
+        'jupyter_core',
+        'ipykernel',
+        'lib2to3',
+        'pydoc_data',
+        'pytest',
+        'PyQt5',
+        'PyQt6',
+        'PySide2',
+        'PySide6',
+        'wx',
+        'gi',
+        'pandas',
+        'scipy',
+    ],
     noarchive=False,
 )
 pyz = PYZ(a.pure)
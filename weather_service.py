@@ -0,0 +1,393 @@
+#################################################################
+# Description: Project - Local HTTP query service
+# Usage: This module serve the weather data as JSON and rendered
+#        plots over HTTP with asyncio, reading the database on a
+#        worker pool and keeping hot responses in memory until new
+#        data is saved.
+#        python weather_processor.py serve [--host h] [--port p]
+#################################################################
+"""This module serve the weather data as JSON and rendered plots over HTTP
+   with asyncio, reading the database on a worker pool and keeping hot
+   responses in memory until new data is saved.
+
+   GET /stations
+   GET /daily?station=27174&start=2020-01-01&end=2020-12-31
+   GET /boxplot?station=27174&start_year=2000&end_year=2020
+   GET /plot/box?station=27174&start_year=2000&end_year=2020&format=png
+   GET /plot/line?station=27174&year=2020&month=5&format=svg&overlay=rolling,normal
+   GET /plot/line?station=27174&start_year=1925&end_year=2024&format=png
+   GET /derived?station=27174&start=2020-01-01&end=2020-12-31&window=30&base=18
+   GET /health
+"""
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+import numpy as np
+from db_operations import open_database
+from derived_stats import DerivedStats
+from stations import DEFAULT_STATION_ID
+
+CONTENT_TYPES = {"json": "application/json", "png": "image/png", "svg": "image/svg+xml"}
+# Renders of a plot when another render process evicts it before it is read,
+# like plot_cache.IMAGE_ATTEMPTS, which is not imported here to keep
+# matplotlib out of the service process.
+PLOT_ATTEMPTS = 3
+
+
+class BadRequest(Exception):
+    """ Raised for a request with a missing or invalid parameter."""
+
+
+def render_plot(db_name, cache_dir, plot_type, parameters, image_format):
+    """
+    Render a plot through the plot cache in a worker process.
+    Returns:
+        The path of the image, or None if there is no data.
+    """
+    # Imported here so only the render processes load matplotlib.
+    from plot_cache import process_cache  # pylint: disable=import-outside-toplevel
+    weather_db = open_database(db_name)
+    plot_cache = process_cache(cache_dir)
+    if plot_type == "box":
+        return plot_cache.boxplot(weather_db, parameters["start_year"], parameters["end_year"],
+                                  parameters["station"], image_format)
+    if plot_type == "line_range":
+        return plot_cache.range_lineplot(weather_db, parameters["start_year"],
+                                         parameters["end_year"], parameters["station"],
+                                         image_format)
+    return plot_cache.lineplot(weather_db, parameters["year"], parameters["month"],
+                               parameters["station"], image_format, parameters["overlays"])
+
+
+def json_value(value, decimals=None):
+    """
+    Convert NumPy numbers and arrays of statistics for JSON, NaN as null,
+    rounded to decimals if given.
+    """
+    if decimals is not None:
+        value = np.round(value, decimals)
+    if hasattr(value, "tolist"):
+        value = value.tolist()
+    if isinstance(value, list):
+        return [json_value(item) for item in value]
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+class WeatherService:
+    """ Class for serve the database over HTTP. Responses are cached in
+        memory by path and database version, the version is polled every
+        version_poll seconds and a change empties the cache."""
+    def __init__(self, db_name="weather_data", host="127.0.0.1", port=8080, workers=8,
+                 render_processes=None, cache_bytes=64 * 1024 * 1024, version_poll=0.5,
+                 plot_cache_dir="plot_cache"):
+        """ Constructor for initialize the database, pools and cache."""
+        self.weather_db = open_database(db_name)
+        self.host = host
+        self.port = port
+        self.db_pool = ThreadPoolExecutor(max_workers=workers)
+        self.render_processes = render_processes
+        self.render_pool = None
+        self.cache_bytes = cache_bytes
+        self.version_poll = version_poll
+        self.plot_cache_dir = plot_cache_dir
+        self.cache = OrderedDict()
+        self.cached_bytes = 0
+        self.in_flight = {}
+        self.db_version = None
+        self.hits = 0
+        self.misses = 0
+        self.server = None
+        self.version_task = None
+        self.routes = {"/stations": self.stations, "/daily": self.daily,
+                       "/boxplot": self.boxplot, "/plot/box": self.plot,
+                       "/plot/line": self.plot, "/derived": self.derived,
+                       "/health": self.health}
+
+    async def start(self):
+        """Start listening, the port is updated when 0 was asked for."""
+        self.db_version = await self.run_in_pool(self.weather_db.get_database_version)
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.version_task = asyncio.get_running_loop().create_task(self.watch_version())
+
+    async def serve_forever(self):
+        """Start the service and serve until cancelled."""
+        await self.start()
+        print(f"Serving weather data on http://{self.host}:{self.port}/")
+        try:
+            async with self.server:
+                await self.server.serve_forever()
+        finally:
+            self.db_pool.shutdown(wait=False)
+            if self.render_pool is not None:
+                self.render_pool.shutdown(wait=False)
+
+    async def run_in_pool(self, function, *args):
+        """Run a blocking database read on the worker pool."""
+        return await asyncio.get_running_loop().run_in_executor(self.db_pool, function, *args)
+
+    async def watch_version(self):
+        """Empty the cache whenever the database version changes."""
+        while True:
+            await asyncio.sleep(self.version_poll)
+            db_version = await self.run_in_pool(self.weather_db.get_database_version)
+            if db_version is not None and db_version != self.db_version:
+                self.db_version = db_version
+                self.cache.clear()
+                self.cached_bytes = 0
+
+    async def handle_connection(self, reader, writer):
+        """Serve the requests of one connection, kept alive as HTTP/1.1 asks."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    header_line = await reader.readline()
+                    if header_line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = header_line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip().lower()
+                if method != "GET":
+                    status, content_type, body = self.error(HTTPStatus.METHOD_NOT_ALLOWED,
+                                                            "Only GET is supported.")
+                else:
+                    status, content_type, body = await self.respond(target)
+                keep_alive = headers.get("connection") == "keep-alive" \
+                    if version == "HTTP/1.0" else headers.get("connection") != "close"
+                writer.write(f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                             f"Content-Type: {content_type}\r\n"
+                             f"Content-Length: {len(body)}\r\n"
+                             f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+                             "\r\n".encode("latin-1") + body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, target):
+        """
+        Answer one GET request from the cache, or through its route.
+        Returns:
+            The HTTP status, content type and body.
+        """
+        url = urlsplit(target)
+        route = self.routes.get(url.path)
+        if route is None:
+            return self.error(HTTPStatus.NOT_FOUND, f"No such endpoint {url.path}.")
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        if url.path in ("/stations", "/health"):
+            return await route(url.path, query)
+        key = (self.db_version, url.path, tuple(sorted(query.items())))
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return cached
+        self.misses += 1
+        # Identical requests arriving together share one computation.
+        pending = self.in_flight.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(self.compute(key, route, url.path, query))
+            self.in_flight[key] = pending
+        return await asyncio.shield(pending)
+
+    async def compute(self, key, route, path, query):
+        """Run a route and cache a successful response."""
+        try:
+            response = await route(path, query)
+        except BadRequest as bad_request:
+            return self.error(HTTPStatus.BAD_REQUEST, str(bad_request))
+        except Exception as route_error:
+            print(f"Error serving {path}: {route_error}")
+            return self.error(HTTPStatus.INTERNAL_SERVER_ERROR, "The request failed.")
+        finally:
+            self.in_flight.pop(key, None)
+        if response[0] == HTTPStatus.OK and key[0] == self.db_version:
+            self.cache[key] = response
+            self.cached_bytes += len(response[2])
+            while self.cached_bytes > self.cache_bytes and self.cache:
+                _, evicted = self.cache.popitem(last=False)
+                self.cached_bytes -= len(evicted[2])
+        return response
+
+    def error(self, status, message):
+        """Build a JSON error response."""
+        return status, CONTENT_TYPES["json"], json.dumps({"error": message}).encode("utf-8")
+
+    def json_response(self, data):
+        """Build a JSON response."""
+        return HTTPStatus.OK, CONTENT_TYPES["json"], json.dumps(data).encode("utf-8")
+
+    def int_parameter(self, query, name, default=None, low=None, high=None):
+        """Read an integer parameter, raising BadRequest when it is missing or invalid."""
+        value = query.get(name, default)
+        try:
+            value = int(value)
+        except (TypeError, ValueError) as int_error:
+            raise BadRequest(f"{name} must be an integer.") from int_error
+        if (low is not None and value < low) or (high is not None and value > high):
+            raise BadRequest(f"{name} must be between {low} and {high}.")
+        return value
+
+    def date_parameter(self, query, name):
+        """Read an optional "YYYY-MM-DD" parameter, raising BadRequest when it is invalid."""
+        value = query.get(name)
+        if value is None:
+            return None
+        try:
+            valid = date.fromisoformat(value).isoformat() == value
+        except ValueError:
+            valid = False
+        if not valid:
+            raise BadRequest(f"{name} must be a YYYY-MM-DD date.")
+        return value
+
+    async def stations(self, _path, _query):
+        """The registered stations."""
+        return self.json_response(await self.run_in_pool(self.weather_db.get_stations))
+
+    async def health(self, _path, _query):
+        """The database version and cache statistics."""
+        return self.json_response({"db_version": self.db_version, "hits": self.hits,
+                                   "misses": self.misses, "cached": len(self.cache),
+                                   "cached_bytes": self.cached_bytes})
+
+    async def daily(self, _path, query):
+        """The daily temperatures of a station between two optional dates."""
+        station_id = self.int_parameter(query, "station", DEFAULT_STATION_ID)
+        start = self.date_parameter(query, "start")
+        end = self.date_parameter(query, "end")
+        if start is not None and end is not None and start > end:
+            raise BadRequest("start must not be after end.")
+        weather = await self.run_in_pool(self.weather_db.fetch_range, start, end, station_id)
+        return self.json_response({"station": station_id, "weather": weather})
+
+    async def boxplot(self, _path, query):
+        """The box plot statistics of each month of a year range."""
+        station_id = self.int_parameter(query, "station", DEFAULT_STATION_ID)
+        start_year = self.int_parameter(query, "start_year", low=1800, high=2200)
+        end_year = self.int_parameter(query, "end_year", low=start_year, high=2200)
+
+        def read_stats():
+            monthly_stats = self.weather_db.fetch_monthly_stats(start_year, end_year, station_id)
+            return [{name: json_value(value) for name, value in stats.items()}
+                    for stats in monthly_stats.boxplot_stats(start_year, end_year)]
+        months = await self.run_in_pool(read_stats)
+        return self.json_response({"station": station_id, "start_year": start_year,
+                                   "end_year": end_year, "months": months})
+
+    async def plot(self, path, query):
+        """A box plot or line plot image, rendered on the render process pool."""
+        image_format = query.get("format", "png")
+        if image_format not in ("png", "svg"):
+            raise BadRequest("format must be png or svg.")
+        parameters = {"station": self.int_parameter(query, "station", DEFAULT_STATION_ID)}
+        if path == "/plot/box" or "month" not in query:
+            plot_type = "box" if path == "/plot/box" else "line_range"
+            parameters["start_year"] = self.int_parameter(query, "start_year", low=1800,
+                                                          high=2200)
+            parameters["end_year"] = self.int_parameter(query, "end_year",
+                                                        low=parameters["start_year"], high=2200)
+        else:
+            plot_type = "line"
+            parameters["year"] = self.int_parameter(query, "year", low=1800, high=2200)
+            parameters["month"] = self.int_parameter(query, "month", low=1, high=12)
+            parameters["overlays"] = [overlay for overlay in query.get("overlay", "").split(",")
+                                      if overlay]
+            if not set(parameters["overlays"]) <= {"rolling", "normal"}:
+                raise BadRequest("overlay must be rolling, normal or both.")
+        if self.render_pool is None:
+            # The database threads are running by now, forking them could
+            # leave a lock held in the child, so the workers start fresh.
+            self.render_pool = ProcessPoolExecutor(
+                self.render_processes, mp_context=multiprocessing.get_context("spawn"))
+
+        def read_image(image_path):
+            try:
+                with open(image_path, "rb") as image_file:
+                    return image_file.read()
+            except FileNotFoundError:
+                return None
+
+        # Another render process may evict the image before it is read,
+        # looking it up again renders it.
+        for _ in range(PLOT_ATTEMPTS):
+            image_path = await asyncio.get_running_loop().run_in_executor(
+                self.render_pool, render_plot, self.weather_db.db_name,
+                os.path.abspath(self.plot_cache_dir), plot_type, parameters, image_format)
+            if image_path is None:
+                return self.error(HTTPStatus.NOT_FOUND, "No weather data for this plot.")
+            image = await self.run_in_pool(read_image, image_path)
+            if image is not None:
+                return HTTPStatus.OK, CONTENT_TYPES[image_format], image
+        raise RuntimeError(f"{image_path} was evicted from the plot cache before it was read")
+
+    async def derived(self, _path, query):
+        """
+        The rolling means, normals and anomalies of the days between two
+        optional dates, and the degree days and extremes of their years.
+        Every value looks at the whole history of the station.
+        """
+        station_id = self.int_parameter(query, "station", DEFAULT_STATION_ID)
+        window = self.int_parameter(query, "window", 30, low=1, high=3660)
+        try:
+            base = float(query.get("base", 18.0))
+        except ValueError as base_error:
+            raise BadRequest("base must be a number.") from base_error
+        baseline_start = query.get("baseline_start")
+        baseline_end = query.get("baseline_end")
+        if baseline_start is not None:
+            baseline_start = self.int_parameter(query, "baseline_start", low=1800, high=2200)
+        if baseline_end is not None:
+            baseline_end = self.int_parameter(query, "baseline_end", low=1800, high=2200)
+        start = self.date_parameter(query, "start")
+        end = self.date_parameter(query, "end")
+        if start is not None and end is not None and start > end:
+            raise BadRequest("start must not be after end.")
+        start = np.datetime64(start or "0001-01-01", "D")
+        end = np.datetime64(end or "9999-12-31", "D")
+
+        def compute_stats():
+            data_version = self.weather_db.get_data_version(station_id=station_id)
+            derived_stats = DerivedStats(self.weather_db.fetch_frame(station_id=station_id),
+                                         (self.weather_db.db_name, station_id, data_version))
+            dates = derived_stats.frame.dates
+            in_range = (dates >= start) & (dates <= end)
+            normals = derived_stats.normals(baseline_start, baseline_end)
+            daily = {"date": np.datetime_as_string(dates[in_range]).tolist(),
+                     "mean": json_value(derived_stats.column("mean")[in_range], 1),
+                     "rolling_mean": json_value(derived_stats.rolling_mean(window)[in_range], 2),
+                     "normal": json_value(normals[in_range], 2),
+                     "anomaly": json_value((derived_stats.column("mean") - normals)[in_range], 2)}
+            years, heating, cooling = derived_stats.degree_days(base)
+            extremes = derived_stats.yearly_extremes()
+            in_years = (years >= start.astype("datetime64[Y]").astype(int) + 1970) & \
+                (years <= end.astype("datetime64[Y]").astype(int) + 1970)
+            yearly = {"year": json_value(years[in_years]),
+                      "heating_degree_days": json_value(heating[in_years], 1),
+                      "cooling_degree_days": json_value(cooling[in_years], 1)}
+            for name in ("max", "min"):
+                days = extremes[f"{name}_day"][in_years]
+                yearly[f"{name}_temp"] = json_value(extremes[f"{name}_temp"][in_years], 1)
+                yearly[f"{name}_date"] = [None if day < 0 else str(np.datetime64(int(day), "D"))
+                                          for day in days.tolist()]
+            return daily, yearly
+        daily, yearly = await self.run_in_pool(compute_stats)
+        return self.json_response({"station": station_id, "window": window, "base": base,
+                                   "daily": daily, "years": yearly})